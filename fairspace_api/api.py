@@ -1,18 +1,29 @@
 import json
 import logging
 import os
+import threading
 import time
 from dataclasses import dataclass
-from typing import Optional, Sequence, Dict
+from typing import Optional, Sequence, Dict, List, Iterator, TYPE_CHECKING
+from urllib.parse import urlparse, unquote
+from xml.etree import ElementTree
 
 import requests
 import sys
 
-from rdflib import Graph
 from requests import Response
 
+from fairspace_api.compression import TransferStats, parse_encoding, default_accept_encoding
+from fairspace_api.token_cache import CachedToken, TokenCache
+
+if TYPE_CHECKING:
+    # rdflib is slow to import and only needed by callers that build graphs
+    from rdflib import Graph
+
 log = logging.getLogger('fairspace_api')
 
+DAV = '{DAV:}'
+
 
 def report_duration(task, start):
     duration = time.time() - start
@@ -49,7 +60,49 @@ class Page:
     size: Optional[int] = None
 
 
+@dataclass
+class EstimatedCount:
+    """ An estimated number of rows, with an interval [lower, upper]: bounds of the exact count found
+    with page requests, or a confidence interval of a sample. The upper bound is None if it is unknown.
+    """
+    estimate: float
+    lower: float
+    upper: Optional[float]
+    method: str
+    duration_ms: float
+    requests: int = 1
+
+    @property
+    def exact(self) -> bool:
+        return self.upper is not None and self.lower == self.upper
+
+    def contains(self, count: int) -> bool:
+        return self.lower <= count and (self.upper is None or count <= self.upper)
+
+
+@dataclass
+class ReindexResult:
+    duration: float
+    counts: Dict[str, int]
+    converged: bool
+
+    def rows_per_second(self, view: str) -> float:
+        return self.counts[view] / self.duration if self.duration > 0 else 0.0
+
+
+@dataclass
+class DavEntry:
+    path: str
+    is_dir: bool
+    size: Optional[int] = None
+    last_modified: Optional[str] = None
+
+
 class FairspaceApi:
+    # Refresh tokens in the background this many seconds before they expire (at most a quarter of their lifetime)
+    token_refresh_margin = 60
+    token_expiration_buffer = 5
+
     def __init__(self,
                  url=None,
                  keycloak_url=None,
@@ -57,7 +110,8 @@ class FairspaceApi:
                  client_id=None,
                  client_secret=None,
                  username=None,
-                 password=None
+                 password=None,
+                 token_cache_dir=None
                  ):
         self.url = use_or_read_value(url, 'FAIRSPACE_URL')
         self.keycloak_url = use_or_read_value(keycloak_url, 'KEYCLOAK_URL')
@@ -68,19 +122,25 @@ class FairspaceApi:
         self.password = use_or_read_value(password, 'KEYCLOAK_PASSWORD')
         self.current_token: Optional[str] = None
         self.token_expiry = None
+        self.token: Optional[CachedToken] = None
+        self.token_lock = threading.RLock()
+        self.refresh_timer: Optional[threading.Timer] = None
+        if token_cache_dir is None:
+            token_cache_dir = os.environ.get('KEYCLOAK_TOKEN_CACHE', '~/.cache/fairspace-testdata')
+        self.token_cache: Optional[TokenCache] = None
+        if token_cache_dir.lower() not in ['', 'off', 'none']:
+            self.token_cache = TokenCache(token_cache_dir, self.keycloak_url, self.realm,
+                                          self.client_id, self.username)
+        # Content encoding of metadata uploads, e.g., 'gzip:6' or 'zstd:3', and accepted encodings of responses
+        self.compression = parse_encoding(os.environ.get('METADATA_COMPRESSION', 'identity'))
+        self.accept_encoding = os.environ.get('ACCEPT_ENCODING') or default_accept_encoding()
+        self.transfer_stats = TransferStats()
 
-    def fetch_token(self) -> str:
-        """
-
-        :return:
-        """
-        # Fetch access token
+    def request_token(self, grant_params) -> Optional[CachedToken]:
         params = {
             'client_id': self.client_id,
             'client_secret': self.client_secret,
-            'username': self.username,
-            'password': self.password,
-            'grant_type': 'password'
+            **grant_params
         }
         headers = {
             'Content-type': 'application/x-www-form-urlencoded',
@@ -90,20 +150,102 @@ class FairspaceApi:
                                  data=params,
                                  headers=headers)
         if not response.ok:
-            log.error('Error fetching token!')
+            log.error(f"Error fetching token ({grant_params['grant_type']} grant)!")
             log.error(f'{response.status_code} {response.reason}')
+            return None
+        return CachedToken.from_response(response.json())
+
+    def use_token(self, token: CachedToken, store=True) -> str:
+        with self.token_lock:
+            self.token = token
+            self.current_token = token.access_token
+            self.token_expiry = token.expires_at
+            if store and self.token_cache is not None:
+                self.token_cache.save(token)
+            self.schedule_token_refresh()
+        return token.access_token
+
+    def fetch_token(self) -> str:
+        """ Fetches a new access token using the password grant.
+
+        :return: the access token.
+        """
+        token = self.request_token({
+            'username': self.username,
+            'password': self.password,
+            'grant_type': 'password'
+        })
+        if token is None:
             sys.exit(1)
-        data = response.json()
-        token = data['access_token']
-        self.current_token = token
-        self.token_expiry = time.time() + data['expires_in']
-        return token
+        return self.use_token(token)
+
+    def refresh_token(self) -> Optional[str]:
+        """ Fetches a new access token using the refresh token grant,
+        falling back to the password grant if there is no usable refresh token.
+
+        :return: the access token, or None if refreshing failed.
+        """
+        with self.token_lock:
+            if self.token is not None and self.token.can_refresh(self.token_expiration_buffer):
+                token = self.request_token({
+                    'refresh_token': self.token.refresh_token,
+                    'grant_type': 'refresh_token'
+                })
+                if token is not None:
+                    return self.use_token(token)
+            token = self.request_token({
+                'username': self.username,
+                'password': self.password,
+                'grant_type': 'password'
+            })
+            if token is None:
+                return None
+            return self.use_token(token)
+
+    def schedule_token_refresh(self):
+        """ Schedules a background refresh of the token ahead of its expiry,
+        so that requests do not have to wait for Keycloak.
+        """
+        if self.refresh_timer is not None:
+            self.refresh_timer.cancel()
+        lifetime = self.token.expires_at - time.time()
+        delay = lifetime - min(self.token_refresh_margin, lifetime / 4)
+        if delay <= 0:
+            self.refresh_timer = None
+            return
+        self.refresh_timer = threading.Timer(delay, self.refresh_in_background)
+        self.refresh_timer.daemon = True
+        self.refresh_timer.start()
+
+    def refresh_in_background(self):
+        with self.token_lock:
+            # Another process may have refreshed the token already
+            cached = self.token_cache.load() if self.token_cache is not None else None
+            if cached is not None and cached.expires_at > self.token.expires_at:
+                log.debug('Using token refreshed by another process.')
+                self.use_token(cached, store=False)
+                return
+            if self.refresh_token() is None:
+                log.warning('Background refresh of the token failed.')
 
     def get_token(self) -> str:
-        token_expiration_buffer = 5
-        if self.token_expiry is None or self.token_expiry <= time.time() + token_expiration_buffer:
-            return self.fetch_token()
-        return self.current_token
+        token = self.token
+        if token is not None and token.is_valid(self.token_expiration_buffer):
+            return token.access_token
+        with self.token_lock:
+            if self.token is not None and self.token.is_valid(self.token_expiration_buffer):
+                return self.token.access_token
+            if self.token is None and self.token_cache is not None:
+                cached = self.token_cache.load()
+                if cached is not None:
+                    self.token = cached
+                    if cached.is_valid(self.token_expiration_buffer):
+                        log.debug('Using cached token.')
+                        return self.use_token(cached, store=False)
+            token = self.refresh_token()
+            if token is None:
+                sys.exit(1)
+            return token
 
     def find_or_create_workspace(self, code):
         # Fetch existing workspaces
@@ -131,6 +273,58 @@ class FairspaceApi:
         log.info('Workspace created.')
         return response.json()
 
+    def current_user(self) -> Dict[str, any]:
+        """ Fetches the user of the access token. Fairspace registers users on their first request.
+        """
+        headers = {
+            'Accept': 'application/json',
+            'Authorization': 'Bearer ' + self.get_token()
+        }
+        response = requests.get(f'{self.url}/api/users/current', headers=headers)
+        if not response.ok:
+            log.error('Error fetching current user!')
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+        return response.json()
+
+    def list_users(self) -> Sequence[Dict[str, any]]:
+        headers = {
+            'Accept': 'application/json',
+            'Authorization': 'Bearer ' + self.get_token()
+        }
+        response = requests.get(f'{self.url}/api/users/', headers=headers)
+        if not response.ok:
+            log.error('Error fetching users!')
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+        return response.json()
+
+    def update_user_roles(self, user_id: str, **roles: bool):
+        """ Grants or revokes user roles, e.g., `canQueryMetadata=True`.
+        """
+        headers = {
+            'Content-type': 'application/json',
+            'Authorization': 'Bearer ' + self.get_token()
+        }
+        response = requests.patch(f'{self.url}/api/users/', data=json.dumps({'id': user_id, **roles}), headers=headers)
+        if not response.ok:
+            log.error(f"Error updating roles of user '{user_id}'!")
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+
+    def set_workspace_role(self, workspace_iri: str, user_iri: str, role='Member'):
+        headers = {
+            'Content-type': 'application/json',
+            'Authorization': 'Bearer ' + self.get_token()
+        }
+        response = requests.patch(f'{self.url}/api/workspaces/users/',
+                                  data=json.dumps({'workspace': workspace_iri, 'user': user_iri, 'role': role}),
+                                  headers=headers)
+        if not response.ok:
+            log.error(f"Error adding user '{user_iri}' to workspace '{workspace_iri}'!")
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+
     def exists(self, path):
         """ Check if a path exists
         """
@@ -141,6 +335,62 @@ class FairspaceApi:
         response = requests.request('PROPFIND', f'{self.url}/api/webdav/{path}/', headers=headers)
         return response.ok
 
+    def list_dir(self, path, depth='1') -> Iterator[DavEntry]:
+        """ Lists the contents of a directory (PROPFIND).
+        The response is parsed while it is being received, so large directories are not buffered as a whole.
+
+        :param depth: '1' for the direct children, 'infinity' for all descendants.
+        :return: the entries, excluding the directory itself, with paths relative to the WebDAV root.
+        """
+        headers = {
+            'Depth': depth,
+            'Authorization': 'Bearer ' + self.get_token()
+        }
+        root = urlparse(f'{self.url}/api/webdav/').path
+        url = f'{self.url}/api/webdav/' + (f'{path.strip("/")}/' if path.strip('/') else '')
+        response = requests.request('PROPFIND', url, headers=headers, stream=True)
+        if not response.ok:
+            log.error(f"Error listing directory '{path}'!")
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+        response.raw.decode_content = True
+        try:
+            for _, element in ElementTree.iterparse(response.raw):
+                if element.tag != f'{DAV}response':
+                    continue
+                href = unquote(urlparse(element.findtext(f'{DAV}href', '')).path)
+                entry_path = href[len(root):].strip('/') if href.startswith(root) else href.strip('/')
+                if entry_path != path.strip('/'):
+                    size = element.findtext(f'.//{DAV}getcontentlength')
+                    yield DavEntry(entry_path,
+                                   element.find(f'.//{DAV}resourcetype/{DAV}collection') is not None,
+                                   int(size) if size else None,
+                                   element.findtext(f'.//{DAV}getlastmodified'))
+                element.clear()
+        finally:
+            response.close()
+
+    def download(self, path, start: int = None, end: int = None, chunk_size=1 << 20) -> Iterator[bytes]:
+        """ Downloads a file in chunks, without holding it in memory.
+
+        :param start: first byte to download (HTTP range request), defaults to the start of the file.
+        :param end: last byte to download (inclusive), defaults to the end of the file.
+        """
+        headers = {'Authorization': 'Bearer ' + self.get_token()}
+        if start is not None or end is not None:
+            headers['Range'] = f'bytes={start or 0}-{end if end is not None else ""}'
+        response = requests.get(f'{self.url}/api/webdav/{path}', headers=headers, stream=True)
+        if not response.ok:
+            log.error(f"Error downloading '{path}'!")
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+        if 'Range' in headers and response.status_code != 206:
+            log.warning(f"The server ignored the range of '{path}', downloading the whole file.")
+        try:
+            yield from response.iter_content(chunk_size)
+        finally:
+            response.close()
+
     def ensure_dir(self, path, workspace=None):
         if self.exists(path):
             return
@@ -176,7 +426,10 @@ class FairspaceApi:
     def upload_empty_files(self, path, filenames):
         self.upload_files(path, {filename: '' for filename in filenames})
 
-    def upload_metadata(self, fmt, data):
+    def upload_metadata(self, fmt, data, method='PUT'):
+        """ Sends metadata: PUT adds the triples, PATCH replaces the values of the subject-predicate pairs
+        in the data and DELETE removes the triples.
+        """
         start = time.time()
         if fmt == 'turtle':
             content_type = 'text/turtle'
@@ -189,23 +442,63 @@ class FairspaceApi:
             'Content-type': content_type,
             'Authorization': 'Bearer ' + self.get_token()
         }
-        response = requests.put(f"{self.url}/api/metadata/",
-                                data=data if fmt == 'turtle' else json.dumps(data),
-                                headers=headers)
+        body = (data if fmt == 'turtle' else json.dumps(data)).encode('utf-8')
+        encoding, level = self.compression
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+            body = self.transfer_stats.compress(body, encoding, level)
+        else:
+            self.transfer_stats.record_sent(len(body), len(body))
+        response = requests.request(method, f"{self.url}/api/metadata/", data=body, headers=headers)
+        if not response.ok:
+            log.error(f'Error uploading metadata ({method})!')
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+        report_duration(f'Uploading metadata ({method})' if method != 'PUT' else 'Uploading metadata', start)
+
+    def delete(self, path, purge=False):
+        """ Deletes a file or directory. Fairspace marks it as deleted (fs:dateDeleted) instead of removing it.
+
+        :param purge: permanently delete a path that is already marked as deleted (requires administrator rights).
+        """
+        headers = {'Authorization': 'Bearer ' + self.get_token()}
+        if purge:
+            headers['Show-Deleted'] = 'on'
+        response = requests.delete(f'{self.url}/api/webdav/{path}', headers=headers)
+        if not response.ok:
+            log.error(f"Error deleting '{path}'!")
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+
+    def delete_metadata_subject(self, subject: str):
+        """ Marks a metadata entity as deleted (fs:dateDeleted).
+        """
+        headers = {'Authorization': 'Bearer ' + self.get_token()}
+        response = requests.delete(f'{self.url}/api/metadata/', params={'subject': subject}, headers=headers)
         if not response.ok:
-            log.error('Error uploading metadata!')
+            log.error(f"Error deleting metadata entity '{subject}'!")
             log.error(f'{response.status_code} {response.reason}')
             sys.exit(1)
-        report_duration('Uploading metadata', start)
 
-    def upload_metadata_graph(self, graph: Graph):
-        self.upload_metadata('turtle', graph.serialize(format='turtle').decode('utf-8'))
+    def upload_metadata_graph(self, graph: 'Graph', method='PUT'):
+        self.upload_metadata('turtle', graph.serialize(format='turtle').decode('utf-8'), method)
+
+    def patch_metadata_graph(self, graph: 'Graph'):
+        """ Replaces the values of the subject-predicate pairs in the graph.
+        """
+        self.upload_metadata_graph(graph, 'PATCH')
+
+    def delete_metadata_graph(self, graph: 'Graph'):
+        """ Removes the triples in the graph.
+        """
+        self.upload_metadata_graph(graph, 'DELETE')
 
     def query_sparql(self, query: str):
         start = time.time()
         headers = {
             'Content-Type': 'application/sparql-query',
             'Accept': 'application/json',
+            'Accept-Encoding': self.accept_encoding,
             'Authorization': 'Bearer ' + self.get_token()
         }
         response = requests.post(f"{self.url}/api/rdf/query", data=query, headers=headers)
@@ -213,6 +506,7 @@ class FairspaceApi:
             log.error('Error querying metadata!')
             log.error(f'{response.status_code} {response.reason}')
             sys.exit(1)
+        self.transfer_stats.record_response(response)
         report_duration('Querying', start)
         return response.json()
 
@@ -234,7 +528,8 @@ class FairspaceApi:
                            size=20,
                            include_counts=False,
                            include_joined_views=False,
-                           filters=None) -> Page:
+                           filters=None,
+                           timeout: float = None) -> Page:
         data = {
             'view': view,
             'page': page,
@@ -247,19 +542,18 @@ class FairspaceApi:
         headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json',
+            'Accept-Encoding': self.accept_encoding,
             'Authorization': 'Bearer ' + self.get_token()
         }
-        response = requests.post(f"{self.url}/api/views/", data=json.dumps(data), headers=headers)
+        response = requests.post(f"{self.url}/api/views/", data=json.dumps(data), headers=headers, timeout=timeout)
         if not response.ok:
             log.error(f'Error retrieving {view} view page!')
             log.error(f'{response.status_code} {response.reason}')
             sys.exit(1)
-        print(response.json())
+        self.transfer_stats.record_response(response)
         return Page(**response.json())
 
-    def count(self,
-              view: str,
-              filters=None) -> Count:
+    def count_request(self, view: str, filters=None, timeout: float = None) -> Response:
         data = {
             'view': view
         }
@@ -268,16 +562,73 @@ class FairspaceApi:
         headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json',
+            'Accept-Encoding': self.accept_encoding,
             'Authorization': 'Bearer ' + self.get_token()
         }
-        response = requests.post(f"{self.url}/api/views/count", data=json.dumps(data), headers=headers)
+        response = requests.post(f"{self.url}/api/views/count", data=json.dumps(data), headers=headers,
+                                 timeout=timeout)
+        self.transfer_stats.record_response(response)
+        return response
+
+    def count(self,
+              view: str,
+              filters=None,
+              timeout: float = None) -> Count:
+        response = self.count_request(view, filters, timeout)
         if not response.ok:
             log.error(f'Error retrieving count for {view} view!')
             log.error(f'{response.status_code} {response.reason}')
             sys.exit(1)
         return Count(**response.json())
 
-    def reindex(self):
+    def estimate_count(self, view: str, filters=None, budget_ms: float = 1000,
+                       exact_fraction: float = 0.5) -> EstimatedCount:
+        """ Counts the rows of a view within a latency budget. The exact count is requested first,
+        with `exact_fraction` of the budget. If it is not available in time, the count is bounded
+        with pages of a single row for the rest of the budget: first doubling the row number until
+        a page is empty, then bisecting between the last row found and the first row not found.
+        """
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000
+        requests_sent = 1
+        try:
+            count = self.count(view, filters, timeout=exact_fraction * budget_ms / 1000)
+            if not count.timeout:
+                return EstimatedCount(count.totalElements, count.totalElements, count.totalElements, 'exact',
+                                      1000 * (time.perf_counter() - start))
+        except requests.Timeout:
+            log.debug(f'Count of {view} view not available within {exact_fraction * budget_ms:.0f}ms.')
+        # At least `lower` rows exist and at most `upper`
+        lower, upper = 0, None
+        while upper is None or lower < upper:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            index = (2 * lower - 1 if lower > 0 else 0) if upper is None else (lower + upper - 1) // 2
+            try:
+                page = self.retrieve_view_page(view, page=index + 1, size=1, filters=filters, timeout=remaining)
+            except requests.Timeout:
+                break
+            requests_sent += 1
+            if len(page.rows) > 0:
+                lower = index + 1
+            else:
+                upper = index
+        estimate = (lower + upper) / 2 if upper is not None else lower
+        return EstimatedCount(estimate, lower, upper, 'pages', 1000 * (time.perf_counter() - start), requests_sent)
+
+    def reindex(self, wait=False, views: Sequence[str] = None, **wait_options) -> Optional[ReindexResult]:
+        """ Triggers recreation of the view database.
+
+        :param wait: wait until the view database is consistent, see `wait_for_reindex`.
+        """
+        baseline = None
+        if wait:
+            if views is None:
+                views = self.view_names()
+            # The counts of the previous view database, to recognise when it has been replaced
+            baseline = self.try_counts(views)
+        start = time.time()
         headers = {
             'Accept': 'application/json',
             'Authorization': 'Bearer ' + self.get_token()
@@ -287,4 +638,99 @@ class FairspaceApi:
             log.error(f'Error reindexing!')
             log.error(f'{response.status_code} {response.reason}')
             sys.exit(1)
+        if wait:
+            return self.wait_for_reindex(start, views, baseline=baseline, **wait_options)
+        return None
+
+    def maintenance_status(self) -> Optional[str]:
+        """ Fetches the maintenance status ('active' while reindexing),
+        or None if the server does not provide it.
+        """
+        headers = {'Authorization': 'Bearer ' + self.get_token()}
+        try:
+            response = requests.get(f"{self.url}/api/maintenance/status", headers=headers)
+        except requests.RequestException:
+            return None
+        if not response.ok:
+            return None
+        return response.text.strip().strip('"').lower()
+
+    def try_counts(self, views: Sequence[str]) -> Optional[Dict[str, int]]:
+        """ Counts the rows of the views, or returns None if a count fails or times out.
+        """
+        counts = {}
+        for view in views:
+            try:
+                response = self.count_request(view)
+            except requests.RequestException:
+                return None
+            if not response.ok:
+                return None
+            count = Count(**response.json())
+            if count.timeout:
+                return None
+            counts[view] = count.totalElements
+        return counts
+
+    def view_names(self) -> List[str]:
+        return [view['name'] for view in self.retrieve_view_config()['views']]
+
+    def wait_for_reindex(self,
+                         start: float = None,
+                         views: Sequence[str] = None,
+                         baseline: Dict[str, int] = None,
+                         poll_interval=5.0,
+                         stable_polls=3,
+                         grace_period=60.0,
+                         timeout=3600.0) -> ReindexResult:
+        """ Waits until reindexing has finished.
+
+        If the server reports a maintenance status, reindexing has finished when the status is no longer active.
+        Otherwise, reindexing has finished when the view counts are unchanged for `stable_polls` consecutive polls
+        and non-zero for the views that were non-zero before. During the first `grace_period` seconds,
+        the counts also have to differ from the `baseline` counts (or fail while the views are recreated),
+        so that the previous view database is not mistaken for the new one. After that, counts equal to
+        the baseline are accepted as well, as reindexing an unchanged dataset reproduces them.
+
+        :param start: the time reindexing was triggered, defaults to now.
+        :param views: the views to count, defaults to all views in the view config.
+        :param baseline: the view counts before reindexing was triggered; if unknown, the counts only have to be
+            stable and not all zero.
+        """
+        start = start or time.time()
+        if views is None:
+            views = self.view_names()
+        changed = baseline is None
+        previous = None
+        stable = 0
+        stable_since = 0.0
+        while True:
+            time.sleep(poll_interval)
+            elapsed = time.time() - start
+            status = self.maintenance_status()
+            counts = self.try_counts(views) if status != 'active' else None
+            if counts is not None:
+                log.info(f'After {elapsed:.0f}s: ' + ', '.join(f'{view} {count:,}' for view, count in counts.items()))
+            if status is not None and status != 'active' and counts is not None:
+                return ReindexResult(time.time() - start, counts, True)
+            if status is None:
+                changed = changed or counts != baseline
+                if baseline is None:
+                    complete = counts is not None and any(count > 0 for count in counts.values())
+                else:
+                    complete = counts is not None and all(counts.get(view, 0) > 0
+                                                          for view, count in baseline.items() if count > 0)
+                if complete:
+                    if counts == previous:
+                        stable += 1
+                    else:
+                        stable = 0
+                        stable_since = elapsed
+                    if stable >= stable_polls - 1 and (changed or elapsed >= grace_period):
+                        # The view database was complete at the first of the stable polls
+                        return ReindexResult(stable_since, counts, True)
+            previous = counts
+            if elapsed > timeout:
+                log.warning(f'Reindexing did not finish within {timeout:.0f}s.')
+                return ReindexResult(elapsed, counts or {}, False)
 
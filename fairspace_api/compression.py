@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, Tuple, Dict
+
+from requests import Response
+
+log = logging.getLogger('fairspace_api')
+
+ENCODINGS = ['identity', 'gzip', 'zstd']
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+CHUNK_SIZE = 1 << 20
+
+
+def parse_encoding(spec: str) -> Tuple[str, Optional[int]]:
+    """ Parses a content encoding with an optional compression level, e.g., 'gzip', 'gzip:9' or 'zstd:3'.
+    'none' and '' mean no compression ('identity').
+    """
+    name, _, level = (spec or '').strip().lower().partition(':')
+    if name in ['', 'none', 'off']:
+        name = 'identity'
+    if name not in ENCODINGS:
+        raise Exception(f'Unsupported content encoding: {spec}. Choose one of {", ".join(ENCODINGS)}.')
+    if name == 'identity':
+        return name, None
+    return name, int(level) if level else DEFAULT_LEVELS[name]
+
+
+def format_encoding(encoding: str, level: Optional[int]) -> str:
+    return encoding if level is None else f'{encoding}:{level}'
+
+
+def compressor(encoding: str, level: int):
+    """ A streaming compressor with `compress(data)` and `flush()` methods.
+    """
+    if encoding == 'gzip':
+        # wbits 31: deflate with a gzip header and trailer
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if encoding == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception('zstd compression requires the zstandard package. '
+                            'Install it with `pip install fairspace-metadata-testdata[zstd]`.')
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise Exception(f'Unsupported content encoding: {encoding}')
+
+
+def default_accept_encoding() -> str:
+    """ The encodings the installed urllib3 can decode, e.g., 'gzip,deflate' (plus 'br' and 'zstd'
+    if brotli and zstandard are installed).
+    """
+    from urllib3.util.request import ACCEPT_ENCODING
+    return ACCEPT_ENCODING
+
+
+@dataclass
+class TransferStats:
+    """ Bytes sent and received, before (raw) and after (wire) compression,
+    and the CPU time spent on compressing request bodies.
+    """
+    requests: int = 0
+    sent_bytes: int = 0
+    sent_wire_bytes: int = 0
+    compress_seconds: float = 0
+    responses: int = 0
+    received_bytes: int = 0
+    received_wire_bytes: int = 0
+    response_encodings: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_sent(self, raw: int, wire: int, cpu_seconds: float = 0):
+        with self.lock:
+            self.requests += 1
+            self.sent_bytes += raw
+            self.sent_wire_bytes += wire
+            self.compress_seconds += cpu_seconds
+
+    def compress(self, data: bytes, encoding: str, level: int, chunk_size=CHUNK_SIZE) -> Iterator[bytes]:
+        """ Compresses the data chunk by chunk while it is being sent (chunked transfer encoding),
+        so that the compressed body is never held in memory as a whole.
+        The statistics are recorded when the last chunk has been produced.
+        """
+        cpu = 0.0
+        wire = 0
+        compress = compressor(encoding, level)
+        for offset in range(0, len(data), chunk_size):
+            start = time.thread_time()
+            chunk = compress.compress(data[offset:offset + chunk_size])
+            cpu += time.thread_time() - start
+            if len(chunk) > 0:
+                wire += len(chunk)
+                yield chunk
+        start = time.thread_time()
+        chunk = compress.flush()
+        cpu += time.thread_time() - start
+        wire += len(chunk)
+        self.record_sent(len(data), wire, cpu)
+        yield chunk
+
+    def record_response(self, response: Response):
+        """ Records the size of the (decoded) response body and the number of bytes read from the wire.
+        """
+        decoded = len(response.content)
+        try:
+            wire = response.raw.tell()
+        except (AttributeError, OSError):
+            wire = int(response.headers.get('Content-Length', decoded))
+        encoding = response.headers.get('Content-Encoding', 'identity')
+        with self.lock:
+            self.responses += 1
+            self.received_bytes += decoded
+            self.received_wire_bytes += wire
+            self.response_encodings[encoding] = self.response_encodings.get(encoding, 0) + 1
+
+    @property
+    def sent_ratio(self) -> Optional[float]:
+        return self.sent_bytes / self.sent_wire_bytes if self.sent_wire_bytes > 0 else None
+
+    @property
+    def received_ratio(self) -> Optional[float]:
+        return self.received_bytes / self.received_wire_bytes if self.received_wire_bytes > 0 else None
+
+    def summary(self) -> str:
+        def ratio(value):
+            return f'{value:.1f}x' if value is not None else '-'
+        encodings = ', '.join(f'{encoding} {count:,}' for encoding, count in self.response_encodings.items())
+        return f'Sent {self.requests:,} metadata bodies: {self.sent_bytes / 1e6:,.1f} MB, ' \
+               f'{self.sent_wire_bytes / 1e6:,.1f} MB on the wire ({ratio(self.sent_ratio)}), ' \
+               f'compression CPU {self.compress_seconds:.1f}s. ' \
+               f'Received {self.responses:,} query responses: {self.received_bytes / 1e6:,.1f} MB, ' \
+               f'{self.received_wire_bytes / 1e6:,.1f} MB on the wire ({ratio(self.received_ratio)})' + \
+               (f'; encodings: {encodings}.' if encodings else '.')
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'requests': self.requests,
+            'sent_bytes': self.sent_bytes,
+            'sent_wire_bytes': self.sent_wire_bytes,
+            'compress_seconds': self.compress_seconds,
+            'responses': self.responses,
+            'received_bytes': self.received_bytes,
+            'received_wire_bytes': self.received_wire_bytes,
+            'response_encodings': self.response_encodings
+        }
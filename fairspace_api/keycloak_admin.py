@@ -0,0 +1,79 @@
+import logging
+import sys
+from typing import Optional, Dict
+
+import requests
+
+from fairspace_api.api import use_or_read_value
+
+log = logging.getLogger('fairspace_api')
+
+
+class KeycloakAdmin:
+    """ Creates users in the Fairspace realm with the Keycloak admin REST API,
+    as an administrator of the master realm (KEYCLOAK_ADMIN_USERNAME and KEYCLOAK_ADMIN_PASSWORD).
+    """
+    def __init__(self,
+                 keycloak_url=None,
+                 realm=None,
+                 username=None,
+                 password=None,
+                 client_id='admin-cli',
+                 admin_realm='master'):
+        self.keycloak_url = use_or_read_value(keycloak_url, 'KEYCLOAK_URL')
+        self.realm = use_or_read_value(realm, 'KEYCLOAK_REALM')
+        self.username = use_or_read_value(username, 'KEYCLOAK_ADMIN_USERNAME')
+        self.password = use_or_read_value(password, 'KEYCLOAK_ADMIN_PASSWORD')
+        self.client_id = client_id
+        self.admin_realm = admin_realm
+
+    def get_token(self) -> str:
+        response = requests.post(f'{self.keycloak_url}/auth/realms/{self.admin_realm}/protocol/openid-connect/token',
+                                 data={'client_id': self.client_id,
+                                       'username': self.username,
+                                       'password': self.password,
+                                       'grant_type': 'password'})
+        if not response.ok:
+            log.error('Error fetching Keycloak admin token!')
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+        return response.json()['access_token']
+
+    def find_user(self, username: str, token: str = None) -> Optional[Dict[str, any]]:
+        headers = {'Authorization': 'Bearer ' + (token or self.get_token())}
+        response = requests.get(f'{self.keycloak_url}/auth/admin/realms/{self.realm}/users',
+                                params={'username': username, 'exact': 'true'},
+                                headers=headers)
+        if not response.ok:
+            log.error(f"Error fetching user '{username}'!")
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+        matches = [user for user in response.json() if user['username'] == username]
+        return matches[0] if len(matches) > 0 else None
+
+    def ensure_user(self, username: str, password: str, token: str = None) -> str:
+        """ Creates a user with the password, unless it already exists.
+
+        :return: the Keycloak id of the user.
+        """
+        token = token or self.get_token()
+        user = self.find_user(username, token)
+        if user is not None:
+            return user['id']
+        headers = {
+            'Content-type': 'application/json',
+            'Authorization': 'Bearer ' + token
+        }
+        response = requests.post(f'{self.keycloak_url}/auth/admin/realms/{self.realm}/users',
+                                 json={'username': username,
+                                       'firstName': username,
+                                       'lastName': 'Test',
+                                       'email': f'{username}@example.com',
+                                       'enabled': True,
+                                       'credentials': [{'type': 'password', 'value': password, 'temporary': False}]},
+                                 headers=headers)
+        if not response.ok:
+            log.error(f"Error creating user '{username}'!")
+            log.error(f'{response.status_code} {response.reason}')
+            sys.exit(1)
+        return self.find_user(username, token)['id']
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+log = logging.getLogger('fairspace_api')
+
+
+@dataclass
+class CachedToken:
+    access_token: str
+    expires_at: float
+    refresh_token: Optional[str] = None
+    refresh_expires_at: Optional[float] = None
+
+    @staticmethod
+    def from_response(data, now: float = None) -> 'CachedToken':
+        """ Creates a token from a Keycloak token endpoint response.
+        A `refresh_expires_in` of 0 (e.g., for offline tokens) means that the refresh token does not expire.
+        """
+        now = now or time.time()
+        refresh_expires_in = data.get('refresh_expires_in')
+        return CachedToken(
+            access_token=data['access_token'],
+            expires_at=now + data['expires_in'],
+            refresh_token=data.get('refresh_token'),
+            refresh_expires_at=now + refresh_expires_in if refresh_expires_in else None
+        )
+
+    def is_valid(self, buffer: float = 0) -> bool:
+        return self.expires_at > time.time() + buffer
+
+    def can_refresh(self, buffer: float = 0) -> bool:
+        if self.refresh_token is None:
+            return False
+        return self.refresh_expires_at is None or self.refresh_expires_at > time.time() + buffer
+
+
+class TokenCache:
+    """ Stores tokens on disk, readable only by the current user, so that they can be reused across processes.
+
+    There is one cache file per Keycloak server, realm, client and user.
+    """
+    def __init__(self, directory: str, keycloak_url: str, realm: str, client_id: str, username: str):
+        self.directory = os.path.expanduser(directory)
+        key = hashlib.sha256('|'.join([keycloak_url, realm, client_id, username]).encode('utf-8')).hexdigest()
+        self.path = os.path.join(self.directory, f'token-{key[:16]}.json')
+
+    def load(self) -> Optional[CachedToken]:
+        try:
+            if os.stat(self.path).st_mode & 0o077:
+                log.warning(f'Ignoring token cache {self.path}, it is accessible by other users.')
+                return None
+            with open(self.path, 'r') as f:
+                return CachedToken(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            log.warning(f'Could not read token cache {self.path}: {e}')
+            return None
+
+    def save(self, token: CachedToken):
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            # Write to a private temporary file and rename it, so that readers never see a partial file.
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.token-')
+            try:
+                os.chmod(temp_path, 0o600)
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(asdict(token), f)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            log.warning(f'Could not write token cache {self.path}: {e}')
+
+    def clear(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
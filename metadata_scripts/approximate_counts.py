@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import math
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+from fairspace_api.api import FairspaceApi, EstimatedCount
+from metadata_scripts.benchmark import format_ms, format_table, write_results
+from metadata_scripts.parity_benchmark import LOGICAL_QUERIES
+from metadata_scripts.sql_benchmark import connect, read_queries
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('approximate_counts')
+
+# The first table of a count query, with an optional alias: TABLESAMPLE goes after the alias
+COUNT_TABLE = re.compile(r'^\s*select\s+count\(\*\)\s+from\s+(\w+)'
+                         r'(\s+(?:as\s+)?'
+                         r'(?!(?:where|join|left|right|inner|full|cross|natural|group|order|limit)\b)\w+)?',
+                         re.IGNORECASE)
+# Counts of distinct ids, which a Bernoulli sample of the rows cannot be scaled up to,
+# as count(distinct ...) or as count(*) of a distinct or grouped subquery (on queries with normalised whitespace)
+DISTINCT_COLUMN = re.compile(r'^select count\(distinct (?:(\w+)\.)?(\w+)\) (from .+)$', re.IGNORECASE)
+DISTINCT_SUBQUERY = re.compile(r'^select count\(\*\) from \( ?select distinct (?:(\w+)\.)?(\w+) (from .+?) ?\)'
+                               r' (?:as )?\w+$', re.IGNORECASE)
+GROUPED_SUBQUERY = re.compile(r'^select count\(\*\) from \( ?select (?:(\w+)\.)?(\w+) (from .+?) '
+                              r'group by (?:\w+\.)?\2 ?\) (?:as )?\w+$', re.IGNORECASE)
+UNSUPPORTED_CLAUSE = re.compile(r'\b(group by|order by|having|limit|union)\b', re.IGNORECASE)
+# Alias of the table of the counted ids in the rewritten query
+ENTITY_ALIAS = 'counted'
+# SQLSTATE of a query canceled by the statement timeout
+QUERY_CANCELED = '57014'
+
+
+def sampled_sql(sql: str, percent: float, seed: int = 0) -> Optional[str]:
+    """ The count query on a Bernoulli sample of `percent` percent of the rows of its first table,
+    or None if the query does not count the rows of a table.
+    """
+    match = COUNT_TABLE.match(sql)
+    if match is None:
+        return None
+    return f'{sql[:match.end()]} tablesample bernoulli ({percent:g}) repeatable ({seed}){sql[match.end():]}'
+
+
+def entity_table(alias: Optional[str], column: str, source: str) -> Optional[str]:
+    """ The table with the ids in `alias.column`: `<table>` for a `<table>_id` column,
+    the table with that alias in the from clause for an `id` column.
+    """
+    if column.lower().endswith('_id'):
+        return column[:-3]
+    if column.lower() != 'id':
+        return None
+    if alias is None:
+        match = re.match(r'from (\w+)', source, re.IGNORECASE)
+    else:
+        match = re.search(rf'\b(?:from|join) (\w+) (?:as )?{alias}\b', source, re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def exists_sql(sql: str) -> Optional[str]:
+    """ Rewrites a count of distinct ids into a count of the rows of their table for which a matching row exists,
+    `select count(*) from <table> where exists (...)`, which can be sampled. This assumes that the counted ids
+    are foreign keys of that table, as they are in the view database. Returns None if the query has another form.
+    """
+    normalised = ' '.join(sql.split()).rstrip(';').strip()
+    match = DISTINCT_COLUMN.match(normalised) or DISTINCT_SUBQUERY.match(normalised) \
+        or GROUPED_SUBQUERY.match(normalised)
+    if match is None:
+        return None
+    alias, column, source = match.groups()
+    table = entity_table(alias, column, source)
+    if table is None or UNSUPPORTED_CLAUSE.search(source):
+        return None
+    condition = f'{f"{alias}." if alias else ""}{column} = {ENTITY_ALIAS}.id'
+    where = re.search(r'\bwhere\b', source, re.IGNORECASE)
+    if where is not None:
+        condition = f'({source[where.end():].strip()}) and {condition}'
+        source = source[:where.start()].strip()
+    return f'select count(*) from {table} {ENTITY_ALIAS} where exists (select 1 {source} where {condition})'
+
+
+def sampleable_sql(sql: str) -> Optional[str]:
+    """ The query itself if it counts the rows of a table, its rewrite with exists if it counts distinct ids,
+    or None if the query cannot be sampled.
+    """
+    if COUNT_TABLE.match(sql):
+        return sql
+    return exists_sql(sql)
+
+
+def normal_quantile(p: float) -> float:
+    """ Quantile of the standard normal distribution, by bisection (statistics.NormalDist requires Python 3.8).
+    """
+    low, high = -10.0, 10.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if 0.5 * (1 + math.erf(middle / math.sqrt(2))) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def bernoulli_interval(sampled: int, fraction: float, confidence: float) -> (float, float, float):
+    """ Estimate and confidence interval of a count from the count in a Bernoulli sample,
+    with the normal approximation of the binomial distribution (rule of three like bound if nothing was sampled).
+    """
+    if sampled == 0:
+        return 0.0, 0.0, -math.log(1 - confidence) / fraction
+    estimate = sampled / fraction
+    margin = normal_quantile(1 - (1 - confidence) / 2) * math.sqrt(sampled * (1 - fraction)) / fraction
+    return estimate, max(float(sampled), estimate - margin), estimate + margin
+
+
+def run_with_timeout(cursor, sql: str, timeout_ms: float) -> Optional[int]:
+    """ Runs a count query, or returns None if it did not finish within the timeout.
+    """
+    cursor.execute(f'set statement_timeout = {max(1, int(timeout_ms))}')
+    try:
+        cursor.execute(sql)
+        return cursor.fetchone()[0]
+    except Exception as e:
+        if getattr(e, 'pgcode', None) != QUERY_CANCELED:
+            raise
+        return None
+    finally:
+        cursor.execute('set statement_timeout = 0')
+
+
+def estimate_sql_count(connection, sql: str, budget_ms: float, exact_fraction: float = 0.5,
+                       percents: Sequence[float] = (0.1, 1, 10), confidence: float = 0.95,
+                       target_width: float = 0.05) -> EstimatedCount:
+    """ Counts on the view database within a latency budget: exactly if that takes at most `exact_fraction`
+    of the budget, otherwise on increasing Bernoulli samples (TABLESAMPLE) of the first table until
+    the budget is used or the confidence interval is narrower than `target_width` of the estimate.
+    """
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000
+    requests = 1
+    sampleable = sampleable_sql(sql)
+    with connection.cursor() as cursor:
+        count = run_with_timeout(cursor, sql, exact_fraction * budget_ms)
+        if count is not None:
+            return EstimatedCount(count, count, count, 'exact', 1000 * (time.perf_counter() - start))
+        best = None
+        for percent in percents:
+            sample = sampled_sql(sampleable, percent) if sampleable is not None else None
+            remaining = 1000 * (deadline - time.perf_counter())
+            if sample is None or remaining <= 0:
+                break
+            sampled = run_with_timeout(cursor, sample, remaining)
+            requests += 1
+            if sampled is None:
+                break
+            estimate, lower, upper = bernoulli_interval(sampled, percent / 100, confidence)
+            best = EstimatedCount(estimate, lower, upper, f'sample {percent:g}%',
+                                  1000 * (time.perf_counter() - start), requests)
+            if estimate > 0 and (upper - lower) / estimate <= target_width:
+                break
+    if best is None:
+        return EstimatedCount(0, 0, None, 'none', 1000 * (time.perf_counter() - start), requests)
+    best.duration_ms = 1000 * (time.perf_counter() - start)
+    return best
+
+
+@dataclass
+class EstimateResult:
+    name: str
+    exact: Optional[int]
+    exact_ms: Optional[float]
+    estimated: EstimatedCount
+
+    @property
+    def error(self) -> Optional[float]:
+        if self.exact is None or self.exact == 0:
+            return None
+        return (self.estimated.estimate - self.exact) / self.exact
+
+
+def exact_view_count(api: FairspaceApi, view: str, filters) -> (Optional[int], float):
+    start = time.perf_counter()
+    count = api.count(view, filters=filters)
+    return None if count.timeout else count.totalElements, 1000 * (time.perf_counter() - start)
+
+
+def exact_sql_count(connection, sql: str) -> (int, float):
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        count = cursor.fetchone()[0]
+    return count, 1000 * (time.perf_counter() - start)
+
+
+def format_count(value: Optional[float]) -> str:
+    return '-' if value is None else f'{value:,.0f}'
+
+
+def report(results: Sequence[EstimateResult], budget_ms: float):
+    rows = [[result.name,
+             format_count(result.exact),
+             format_ms(result.exact_ms),
+             format_count(result.estimated.estimate),
+             f'{format_count(result.estimated.lower)} - {format_count(result.estimated.upper)}',
+             result.estimated.method,
+             format_ms(result.estimated.duration_ms),
+             f'{result.estimated.requests:,}',
+             f'{100 * result.error:+.1f}%' if result.error is not None else '-',
+             '' if result.exact is None else 'yes' if result.estimated.contains(result.exact) else 'NO']
+            for result in results]
+    print(format_table(['Query', 'Exact', 'Time', 'Estimate', 'Interval', 'Method', 'Time', 'Requests', 'Error',
+                        'Covered'], rows))
+    over = [result.name for result in results if result.estimated.duration_ms > 1.2 * budget_ms]
+    if len(over) > 0:
+        print(f'Over the budget of {format_ms(budget_ms)}: {", ".join(over)}')
+
+
+def to_dict(result: EstimateResult) -> Dict[str, any]:
+    return {
+        'name': result.name,
+        'exact': result.exact,
+        'exact_ms': result.exact_ms,
+        'estimate': result.estimated.__dict__,
+        'error': result.error
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Estimate counts within a latency budget, with the views API or on the view database, '
+                    'and compare the estimates and their intervals with the exact counts.')
+    parser.add_argument('--budget-ms', type=float, default=500, help='latency budget per count (default: 500)')
+    parser.add_argument('--exact-fraction', type=float, default=0.5,
+                        help='fraction of the budget for trying the exact count first (default: 0.5)')
+    parser.add_argument('--database-url', default=os.environ.get('VIEW_DATABASE_URL'),
+                        help='PostgreSQL connection URL of the view database (default: $VIEW_DATABASE_URL); '
+                             'if set, the count queries in --queries are estimated with TABLESAMPLE')
+    parser.add_argument('--queries', help='SQL file with the count queries (default: queries/queries.sql)')
+    parser.add_argument('--percents', default='0.1,1,10',
+                        help='comma separated sample sizes in percent, tried in order (default: 0.1,1,10)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level of the sample intervals')
+    parser.add_argument('--skip-exact', action='store_true', help='do not run the exact counts to compare with')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    results = []
+    if args.database_url:
+        connection = connect(args.database_url)
+        percents = [float(percent) for percent in args.percents.split(',')]
+        for query in read_queries(args.queries):
+            if not query.name.startswith('count_'):
+                continue
+            if sampleable_sql(query.sql) is None:
+                log.info(f'Skipping {query.name}: it does not count the rows of a table or distinct ids, '
+                         f'so a sample of its rows cannot be scaled up to the count.')
+                continue
+            log.info(f'Estimating {query.name} ...')
+            estimated = estimate_sql_count(connection, query.sql, args.budget_ms, args.exact_fraction,
+                                           percents, args.confidence)
+            exact, exact_ms = (None, None) if args.skip_exact else exact_sql_count(connection, query.sql)
+            results.append(EstimateResult(f'sql: {query.name}', exact, exact_ms, estimated))
+        connection.close()
+    else:
+        api = FairspaceApi()
+        for query in LOGICAL_QUERIES:
+            if query.view is None:
+                continue
+            log.info(f'Estimating {query.name} ...')
+            estimated = api.estimate_count(query.view, query.filters, args.budget_ms, args.exact_fraction)
+            exact, exact_ms = (None, None) if args.skip_exact else exact_view_count(api, query.view, query.filters)
+            results.append(EstimateResult(f'view: {query.name}', exact, exact_ms, estimated))
+
+    report(results, args.budget_ms)
+    if args.output:
+        write_results(args.output, {
+            'budget_ms': args.budget_ms,
+            'exact_fraction': args.exact_fraction,
+            'confidence': args.confidence,
+            'estimates': [to_dict(result) for result in results]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
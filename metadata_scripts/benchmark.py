@@ -0,0 +1,123 @@
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Sequence, Dict, Optional
+
+
+def percentile(values: Sequence[float], p: float) -> Optional[float]:
+    """ Percentile with linear interpolation between closest ranks, p in [0, 100].
+    """
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+@dataclass
+class Summary:
+    count: int
+    mean: Optional[float]
+    median: Optional[float]
+    p95: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    stdev: Optional[float]
+
+    @staticmethod
+    def of(values: Sequence[float]) -> 'Summary':
+        if len(values) == 0:
+            return Summary(0, None, None, None, None, None, None)
+        mean = sum(values) / len(values)
+        stdev = math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1)) if len(values) > 1 else 0.0
+        return Summary(
+            count=len(values),
+            mean=mean,
+            median=percentile(values, 50),
+            p95=percentile(values, 95),
+            min=min(values),
+            max=max(values),
+            stdev=stdev
+        )
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+def format_ms(value: Optional[float]) -> str:
+    if value is None:
+        return '-'
+    if value >= 1000:
+        return f'{value / 1000:,.2f}s'
+    return f'{value:,.1f}ms'
+
+
+def format_table(header: Sequence[str], rows: Sequence[Sequence[any]], left_columns: Sequence[int] = (0,)) -> str:
+    """ Formats rows as a plain text table, with the left columns (by default only the first)
+    left aligned and the other columns right aligned.
+    """
+    cells = [[str(cell) for cell in row] for row in [header] + list(rows)]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(header))]
+    lines = ['  '.join(cell.ljust(widths[i]) if i in left_columns else cell.rjust(widths[i])
+                       for i, cell in enumerate(row)).rstrip()
+             for row in cells]
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
+
+
+def timed(fn, *args, **kwargs):
+    """ Calls the function and returns its result and the duration in milliseconds.
+    """
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, 1000 * (time.perf_counter() - start)
+
+
+def write_results(path: str, results: Dict[str, any]):
+    results = {'timestamp': datetime.now().isoformat(timespec='seconds'), **results}
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+
+
+def read_results(path: str) -> Dict[str, any]:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def relative_change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if old is None or new is None or old == 0:
+        return None
+    return (new - old) / old
+
+
+def bootstrap_change(old: Sequence[float], new: Sequence[float], confidence=0.95, resamples=2000,
+                     seed: int = None) -> (Optional[float], Optional[float]):
+    """ Bootstrap confidence interval of the relative change of the median from `old` to `new`.
+
+    :return: the lower and upper bound, or None if either sample is empty.
+    """
+    if len(old) == 0 or len(new) == 0:
+        return None, None
+    rng = random.Random(seed)
+    changes = []
+    for _ in range(resamples):
+        old_median = percentile(rng.choices(old, k=len(old)), 50)
+        new_median = percentile(rng.choices(new, k=len(new)), 50)
+        if old_median > 0:
+            changes.append((new_median - old_median) / old_median)
+    alpha = (1 - confidence) / 2
+    return percentile(changes, 100 * alpha), percentile(changes, 100 * (1 - alpha))
+
+
+def format_change(change: Optional[float]) -> str:
+    if change is None:
+        return '-'
+    return f'{100 * change:+.0f}%'
+
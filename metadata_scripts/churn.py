@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Set
+
+from dotenv import load_dotenv
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import DCAT
+
+from metadata_scripts.benchmark import format_ms, format_table, percentile, write_results
+from metadata_scripts.load_generator import ARRIVALS, arrival_times
+from metadata_scripts.upload_test_data import TestData, CURIE, FS, SAMPLE, EVENT, SUBJECT
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('churn')
+
+CHANGE_KINDS = ['keyword', 'analysis_type', 'sample']
+# delta: DELETE the removed and PUT the added triples; patch: PATCH the new values of the changed predicates
+METHODS = ['delta', 'patch']
+PREDICATES = {
+    'keyword': [DCAT.keyword],
+    'analysis_type': [CURIE.analysisType],
+    'sample': [CURIE.sample, CURIE.aboutEvent, CURIE.aboutSubject]
+}
+
+
+@dataclass
+class Change:
+    file: URIRef
+    kind: str
+    removed: Graph
+    added: Graph
+    # Unique keyword added to the file to measure when the change is visible in the views
+    marker: Optional[str] = None
+
+
+@dataclass
+class ChurnResult:
+    target_rate: float
+    duration: float
+    method: str
+    sent: int = 0
+    errors: int = 0
+    requests: int = 0
+    removed_triples: int = 0
+    added_triples: int = 0
+    latencies_ms: Dict[str, List[float]] = field(default_factory=dict)
+    # Time from the completed update until its marker keyword was counted by the views API
+    freshness_ms: List[float] = field(default_factory=list)
+    stale: int = 0
+    completed_at: float = 0
+
+    @property
+    def updates(self) -> int:
+        return sum(len(latencies) for latencies in self.latencies_ms.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.updates / self.completed_at if self.completed_at > 0 else 0
+
+
+class ChurnWorkload:
+    """ Changes the keywords, analysis types and sample links of existing files with minimal deltas.
+    The current annotations of the files are fetched once and then tracked locally.
+    """
+    def __init__(self, testdata: TestData, method: str, kinds: List[str], probe_every: int,
+                 freshness_timeout: float, poll_interval: float):
+        self.testdata = testdata
+        self.api = testdata.api
+        self.method = method
+        self.kinds = kinds
+        self.probe_every = probe_every
+        self.freshness_timeout = freshness_timeout
+        self.poll_interval = poll_interval
+        self.annotations: Dict[URIRef, Dict[URIRef, Set[any]]] = {}
+        self.in_flight: Set[URIRef] = set()
+        self.marker_prefix = f'churn {uuid.uuid4().hex[:8]}'
+        self.lock = threading.Lock()
+        # Notified when a file is no longer in flight
+        self.released = threading.Condition(self.lock)
+
+    def load_files(self, limit: int):
+        predicates = ', '.join(f'<{predicate}>' for predicates in PREDICATES.values() for predicate in predicates)
+        bindings = self.testdata.query_all('?file ?p ?o', f"""
+            {{
+                SELECT ?file WHERE {{
+                    ?file a <{FS.File}> .
+                    FILTER NOT EXISTS {{ ?file <{FS.dateDeleted}> ?deleted }}
+                }}
+                ORDER BY ?file
+                LIMIT {limit}
+            }}
+            OPTIONAL {{ ?file ?p ?o FILTER(?p IN ({predicates})) }}
+            """, '?file')
+        for binding in bindings:
+            values = self.annotations.setdefault(URIRef(binding['file']['value']), {})
+            if 'p' in binding:
+                value = binding['o']
+                node = URIRef(value['value']) if value['type'] == 'uri' else Literal(value['value'])
+                values.setdefault(URIRef(binding['p']['value']), set()).add(node)
+        log.info(f'Loaded the annotations of {len(self.annotations):,} files.')
+
+    def acquire_file(self) -> URIRef:
+        """ A random file that is not being changed by another update,
+        waiting for an update to finish if all files are being changed.
+        """
+        with self.released:
+            while len(self.in_flight) >= len(self.annotations):
+                self.released.wait()
+            file = random.choice([file for file in self.annotations if file not in self.in_flight])
+            self.in_flight.add(file)
+            return file
+
+    def release_file(self, file: URIRef):
+        """ Must be called with the lock held.
+        """
+        self.in_flight.discard(file)
+        self.released.notify()
+
+    def sample_links(self, values: Dict[URIRef, Set[any]], sample_id: str) -> List[tuple]:
+        event_id = self.testdata.sample_event.get(sample_id)
+        links = [(CURIE.sample, SAMPLE[sample_id])]
+        if event_id is not None:
+            links += [(CURIE.aboutEvent, EVENT[event_id]),
+                      (CURIE.aboutSubject, SUBJECT[self.testdata.event_subject[event_id]])]
+        # Only the links that the file has
+        return [(p, o) for p, o in links if o in values.get(p, set())]
+
+    def generate(self, file: URIRef, kind: str, marker: Optional[str] = None) -> Change:
+        values = self.annotations[file]
+        change = Change(file, kind, Graph(), Graph(), marker)
+        if kind == 'keyword':
+            current = values.get(DCAT.keyword, set())
+            if len(current) > 0:
+                change.removed.add((file, DCAT.keyword, random.choice(sorted(current))))
+            candidates = [keyword for keyword in self.testdata.keyword_vocabulary()
+                          if Literal(keyword) not in current]
+            if len(candidates) > 0:
+                change.added.add((file, DCAT.keyword, Literal(random.choice(candidates))))
+        elif kind == 'analysis_type':
+            current = values.get(CURIE.analysisType, set())
+            if len(current) > 0:
+                change.removed.add((file, CURIE.analysisType, random.choice(sorted(current))))
+            candidates = [URIRef(a) for a in self.testdata.analysis_ids if URIRef(a) not in current]
+            if len(candidates) > 0:
+                change.added.add((file, CURIE.analysisType, random.choice(candidates)))
+        else:
+            current = sorted(values.get(CURIE.sample, set()))
+            if len(current) > 0:
+                removed = str(random.choice(current))[len(str(SAMPLE)):]
+                remaining = [str(sample)[len(str(SAMPLE)):] for sample in current
+                             if str(sample) != str(SAMPLE[removed])]
+                # Keep the event and subject links that other samples of the file still imply
+                implied = {link for sample_id in remaining for link in self.sample_links(values, sample_id)}
+                for p, o in self.sample_links(values, removed):
+                    if (p, o) not in implied:
+                        change.removed.add((file, p, o))
+            self.testdata.link_sample_to_file(change.added, file)
+        if marker is not None:
+            change.added.add((file, DCAT.keyword, Literal(marker)))
+        # Triples that are removed and added again need not be sent
+        common = change.removed & change.added
+        change.removed -= common
+        change.added -= common
+        return change
+
+    def new_values(self, change: Change) -> Dict[URIRef, Set[any]]:
+        """ The values of the changed predicates of the file after the change.
+        """
+        values = self.annotations[change.file]
+        predicates = {p for _, p, _ in change.removed} | {p for _, p, _ in change.added}
+        return {p: (values.get(p, set()) - set(change.removed.objects(change.file, p)))
+                | set(change.added.objects(change.file, p))
+                for p in predicates}
+
+    def apply(self, change: Change) -> int:
+        """ Sends the change and returns the number of requests.
+        """
+        requests = 0
+        if self.method == 'delta':
+            if len(change.removed) > 0:
+                self.api.delete_metadata_graph(change.removed)
+                requests += 1
+            if len(change.added) > 0:
+                self.api.upload_metadata_graph(change.added)
+                requests += 1
+            return requests
+        patch = Graph()
+        emptied = Graph()
+        for p, values in self.new_values(change).items():
+            if len(values) > 0:
+                for value in values:
+                    patch.add((change.file, p, value))
+            else:
+                # PATCH cannot remove all values of a predicate
+                for triple in change.removed.triples((change.file, p, None)):
+                    emptied.add(triple)
+        if len(patch) > 0:
+            self.api.patch_metadata_graph(patch)
+            requests += 1
+        if len(emptied) > 0:
+            self.api.delete_metadata_graph(emptied)
+            requests += 1
+        return requests
+
+    def wait_until_visible(self, marker: str, updated: float, result: ChurnResult):
+        filters = [{'field': 'Collection.keywords', 'values': [marker]}]
+        while time.perf_counter() - updated < self.freshness_timeout:
+            try:
+                if self.api.count('Collection', filters=filters).totalElements > 0:
+                    with self.lock:
+                        result.freshness_ms.append(1000 * (time.perf_counter() - updated))
+                    return
+            except (Exception, SystemExit) as e:
+                log.warning(f'Freshness probe failed: {e}')
+            time.sleep(self.poll_interval)
+        log.warning(f'Change with marker {marker} not visible in the views after {self.freshness_timeout:g}s.')
+        with self.lock:
+            result.stale += 1
+
+    def update(self, n: int, result: ChurnResult, start: float, probes: ThreadPoolExecutor):
+        file = self.acquire_file()
+        kind = random.choice(self.kinds)
+        marker = f'{self.marker_prefix} {n}' if self.probe_every > 0 and n % self.probe_every == 0 else None
+        try:
+            change = self.generate(file, kind, marker)
+            sent = time.perf_counter()
+            requests = self.apply(change)
+            done = time.perf_counter()
+        except (Exception, SystemExit) as e:
+            log.warning(f'Changing the {kind} of {file} failed: {e}')
+            with self.lock:
+                result.errors += 1
+                self.release_file(file)
+            return
+        with self.lock:
+            self.annotations[file].update(self.new_values(change))
+            self.release_file(file)
+            result.requests += requests
+            result.removed_triples += len(change.removed)
+            result.added_triples += len(change.added)
+            result.latencies_ms.setdefault(kind, []).append(1000 * (done - sent))
+            result.completed_at = max(result.completed_at, done - start)
+        if marker is not None:
+            probes.submit(self.wait_until_visible, marker, done, result)
+
+    def run(self, rate: float, duration: float, arrival: str, concurrency: int) -> ChurnResult:
+        result = ChurnResult(rate, duration, self.method)
+        with ThreadPoolExecutor(max_workers=concurrency) as probes:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                start = time.perf_counter()
+                for n, intended in enumerate(arrival_times(rate, duration, arrival)):
+                    delay = start + intended - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    executor.submit(self.update, n, result, start, probes)
+                    result.sent += 1
+        return result
+
+
+def report(result: ChurnResult):
+    rows = [[kind, f'{len(latencies):,}', format_ms(percentile(latencies, 50)), format_ms(percentile(latencies, 95)),
+             format_ms(percentile(latencies, 99))]
+            for kind, latencies in sorted(result.latencies_ms.items())]
+    print(format_table(['Change', 'Updates', 'p50', 'p95', 'p99'], rows))
+    print()
+    print(f'Method {result.method}: {result.updates:,} of {result.sent:,} updates completed '
+          f'({result.errors:,} errors) at {result.throughput:.1f}/s (target {result.target_rate:g}/s), '
+          f'{result.requests / result.updates if result.updates > 0 else 0:.2f} requests per update, '
+          f'{result.removed_triples:,} triples removed and {result.added_triples:,} added.')
+    if len(result.freshness_ms) > 0 or result.stale > 0:
+        print(f'Freshness of the views ({len(result.freshness_ms):,} probes): '
+              f'p50 {format_ms(percentile(result.freshness_ms, 50))}, '
+              f'p95 {format_ms(percentile(result.freshness_ms, 95))}, '
+              f'max {format_ms(max(result.freshness_ms) if len(result.freshness_ms) > 0 else None)}, '
+              f'{result.stale:,} not visible in time.')
+
+
+def to_dict(result: ChurnResult) -> Dict[str, any]:
+    return {
+        'method': result.method,
+        'target_rate': result.target_rate,
+        'duration': result.duration,
+        'sent': result.sent,
+        'errors': result.errors,
+        'requests': result.requests,
+        'removed_triples': result.removed_triples,
+        'added_triples': result.added_triples,
+        'throughput': result.throughput,
+        'latencies_ms': result.latencies_ms,
+        'freshness_ms': result.freshness_ms,
+        'stale': result.stale
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Change the keywords, analysis types and sample links of existing files at a fixed rate, '
+                    'with minimal deltas, and measure update throughput and how soon the views reflect changes.')
+    parser.add_argument('--method', choices=METHODS, default='delta',
+                        help='delta: DELETE removed and PUT added triples; '
+                             'patch: PATCH the new values of the changed predicates (default: delta)')
+    parser.add_argument('--kinds', default=','.join(CHANGE_KINDS),
+                        help=f'comma separated kinds of changes (default: {",".join(CHANGE_KINDS)})')
+    parser.add_argument('--rate', type=float, default=5, help='updates per second (default: 5)')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to send updates (default: 60)')
+    parser.add_argument('--arrival', choices=ARRIVALS, default='constant', help='arrival schedule of the updates')
+    parser.add_argument('--concurrency', type=int, default=8, help='maximum number of updates in flight')
+    parser.add_argument('--files', type=int, default=10000, help='number of existing files to change')
+    parser.add_argument('--manifest', help='manifest of upload_test_data with the generated samples')
+    parser.add_argument('--probe-every', type=int, default=10,
+                        help='add a unique keyword to every n-th update and wait until the views count it, '
+                             '0 to not measure freshness (default: 10)')
+    parser.add_argument('--freshness-timeout', type=float, default=60,
+                        help='seconds after which a change that is not visible in the views is counted as stale')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='seconds between freshness probes')
+    parser.add_argument('--seed', type=int, help='random seed')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+    load_dotenv()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    testdata = TestData()
+    testdata.manifest_path = args.manifest
+    testdata.fetch_taxonomy_data()
+    testdata.load_existing_data()
+    testdata.prepare_samplers()
+    workload = ChurnWorkload(testdata, args.method, args.kinds.split(','), args.probe_every,
+                             args.freshness_timeout, args.poll_interval)
+    workload.load_files(args.files)
+    if len(workload.annotations) == 0:
+        log.error('No files found, please upload test data first.')
+        return
+    if len(workload.annotations) < args.concurrency:
+        log.error(f'Only {len(workload.annotations):,} files found for {args.concurrency} concurrent updates, '
+                  f'use a lower --concurrency or more --files.')
+        sys.exit(1)
+    result = workload.run(args.rate, args.duration, args.arrival, args.concurrency)
+
+    report(result)
+    if args.output:
+        write_results(args.output, to_dict(result))
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
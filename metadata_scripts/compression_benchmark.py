@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import argparse
+import importlib.resources
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Sequence
+
+from fairspace_api.api import FairspaceApi
+from fairspace_api.compression import TransferStats, parse_encoding, format_encoding
+from metadata_scripts.benchmark import Summary, format_ms, format_table, write_results
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('compression_benchmark')
+
+DEFAULT_ENCODINGS = 'identity,gzip:1,gzip:6,gzip:9,zstd:1,zstd:3,zstd:9'
+
+
+@dataclass
+class CompressionResult:
+    encoding: str
+    raw_bytes: int
+    wire_bytes: int
+    cpu_seconds: float
+    upload_ms: List[float] = field(default_factory=list)
+
+    @property
+    def ratio(self) -> float:
+        return self.raw_bytes / self.wire_bytes if self.wire_bytes > 0 else 0.0
+
+    @property
+    def cpu_mb_per_second(self) -> Optional[float]:
+        return self.raw_bytes / 1e6 / self.cpu_seconds if self.cpu_seconds > 0 else None
+
+    def estimated_seconds(self, bandwidth_mbps: float) -> float:
+        """ Estimated upload time over a link with the given bandwidth (megabits per second).
+        Compression is streamed, so it overlaps with sending: the slowest of the two determines the time.
+        """
+        return max(self.cpu_seconds, 8 * self.wire_bytes / (bandwidth_mbps * 1e6))
+
+
+def measure(data: bytes, spec: str) -> CompressionResult:
+    encoding, level = parse_encoding(spec)
+    stats = TransferStats()
+    if encoding == 'identity':
+        stats.record_sent(len(data), len(data))
+    else:
+        for _ in stats.compress(data, encoding, level):
+            pass
+    return CompressionResult(format_encoding(encoding, level), stats.sent_bytes, stats.sent_wire_bytes,
+                             stats.compress_seconds)
+
+
+def time_uploads(api: FairspaceApi, data: str, result: CompressionResult, repeat: int):
+    api.compression = parse_encoding(result.encoding)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        api.upload_metadata('turtle', data)
+        result.upload_ms.append(1000 * (time.perf_counter() - start))
+
+
+def report(results: Sequence[CompressionResult], bandwidths: Sequence[float]):
+    rows = []
+    for result in results:
+        rows.append([result.encoding,
+                     f'{result.raw_bytes / 1e6:,.1f} MB',
+                     f'{result.wire_bytes / 1e6:,.2f} MB',
+                     f'{result.ratio:.1f}x',
+                     format_ms(1000 * result.cpu_seconds),
+                     f'{result.cpu_mb_per_second:,.0f} MB/s' if result.cpu_mb_per_second is not None else '-',
+                     *[format_ms(1000 * result.estimated_seconds(bandwidth)) for bandwidth in bandwidths],
+                     format_ms(Summary.of(result.upload_ms).median)])
+    print(format_table(['Encoding', 'Raw', 'Wire', 'Ratio', 'CPU', 'CPU speed',
+                        *[f'@{bandwidth:g} Mbit/s' for bandwidth in bandwidths], 'Upload'], rows))
+    for bandwidth in bandwidths:
+        best = min(results, key=lambda result: result.estimated_seconds(bandwidth))
+        print(f'Fastest at {bandwidth:g} Mbit/s: {best.encoding}')
+
+
+def to_dict(result: CompressionResult) -> Dict[str, any]:
+    return {
+        'encoding': result.encoding,
+        'raw_bytes': result.raw_bytes,
+        'wire_bytes': result.wire_bytes,
+        'ratio': result.ratio,
+        'cpu_seconds': result.cpu_seconds,
+        'upload': Summary.of(result.upload_ms).to_dict()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure the compression ratio and CPU cost of content encodings for metadata uploads, '
+                    'and estimate the upload time for a range of link speeds.')
+    parser.add_argument('--input', action='append',
+                        help='Turtle file to compress, can be repeated (default: the taxonomies of the test data)')
+    parser.add_argument('--encodings', default=DEFAULT_ENCODINGS,
+                        help=f'comma separated encodings with optional levels (default: {DEFAULT_ENCODINGS})')
+    parser.add_argument('--bandwidth-mbps', default='10,100,1000',
+                        help='comma separated link speeds in megabits per second to estimate the upload time for')
+    parser.add_argument('--upload', action='store_true',
+                        help='also upload the metadata with each encoding and measure the upload time')
+    parser.add_argument('--repeat', type=int, default=3, help='number of uploads per encoding')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    if args.input:
+        data = ''
+        for path in args.input:
+            with open(path, 'r') as f:
+                data += f.read() + '\n'
+    else:
+        data = importlib.resources.read_text('testdata', 'taxonomies.ttl')
+    bandwidths = [float(bandwidth) for bandwidth in args.bandwidth_mbps.split(',')]
+    api = FairspaceApi() if args.upload else None
+
+    results = []
+    for spec in args.encodings.split(','):
+        try:
+            result = measure(data.encode('utf-8'), spec)
+        except Exception as e:
+            log.warning(f'Skipping {spec}: {e}')
+            continue
+        log.info(f'{result.encoding}: {result.wire_bytes:,} bytes ({result.ratio:.1f}x)')
+        if api is not None:
+            time_uploads(api, data, result, args.repeat)
+        results.append(result)
+
+    report(results, bandwidths)
+    if args.output:
+        write_results(args.output, {
+            'raw_bytes': len(data.encode('utf-8')),
+            'bandwidths_mbps': bandwidths,
+            'encodings': [to_dict(result) for result in results]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
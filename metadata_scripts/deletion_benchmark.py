@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+from fairspace_api.api import FairspaceApi
+from metadata_scripts.benchmark import Summary, format_ms, format_table, write_results, relative_change, format_change
+from metadata_scripts.sparql_query import time_queries
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('deletion_benchmark')
+
+ENTITY_TYPES = {
+    'subject': '<https://institut-curie.org/ontology#Subject>',
+    'sample': '<https://institut-curie.org/ontology#BiologicalSample>',
+    'directory': '<https://fairspace.nl/ontology#Directory>',
+    'file': '<https://fairspace.nl/ontology#File>'
+}
+
+
+@dataclass
+class Tombstones:
+    kind: str
+    total: int
+    deleted: int
+
+    @property
+    def ratio(self) -> float:
+        return self.deleted / self.total if self.total > 0 else 0.0
+
+
+def count_tombstones(api: FairspaceApi) -> List[Tombstones]:
+    """ Counts the entities of each type and the number of them that are marked as deleted.
+    """
+    tombstones = []
+    for kind, entity_type in ENTITY_TYPES.items():
+        results = api.query_sparql(f"""
+        PREFIX fs: <https://fairspace.nl/ontology#>
+        SELECT (COUNT(?entity) AS ?total) (SUM(IF(BOUND(?dateDeleted), 1, 0)) AS ?deleted)
+        WHERE {{
+          ?entity a {entity_type} .
+          OPTIONAL {{ ?entity fs:dateDeleted ?dateDeleted }}
+        }}
+        """)
+        bindings = results['results']['bindings']
+        binding = bindings[0] if len(bindings) > 0 else {}
+        tombstones.append(Tombstones(kind,
+                                     int(binding.get('total', {}).get('value', 0)),
+                                     int(binding.get('deleted', {}).get('value', 0))))
+    return tombstones
+
+
+@dataclass
+class DeletionOverhead:
+    query: str
+    count: int
+    count_including_deleted: int
+    durations_ms: List[float]
+    durations_without_filter_ms: List[float]
+
+    @property
+    def overhead(self) -> Optional[float]:
+        """ Relative latency increase caused by the filter on deleted entities.
+        """
+        return relative_change(Summary.of(self.durations_without_filter_ms).median,
+                               Summary.of(self.durations_ms).median)
+
+
+def measure_overhead(api: FairspaceApi, repeat: int, collection_iri: str = None) -> List[DeletionOverhead]:
+    log.info('Running queries with the filter on deleted entities ...')
+    filtered = time_queries(api, repeat, collection_iri)
+    log.info('Running queries without the filter on deleted entities ...')
+    unfiltered = time_queries(api, repeat, collection_iri, deletion_filter=False)
+    return [DeletionOverhead(name, count, unfiltered[name][0], durations, unfiltered[name][1])
+            for name, (count, durations) in filtered.items()]
+
+
+def report(tombstones: List[Tombstones], overheads: List[DeletionOverhead]):
+    print(format_table(['Entity', 'Total', 'Deleted', 'Ratio'],
+                       [[t.kind, f'{t.total:,}', f'{t.deleted:,}', f'{t.ratio:.1%}'] for t in tombstones]))
+    print()
+    rows = []
+    for overhead in overheads:
+        rows.append([overhead.query,
+                     f'{overhead.count:,}',
+                     f'{overhead.count_including_deleted:,}',
+                     format_ms(Summary.of(overhead.durations_ms).median),
+                     format_ms(Summary.of(overhead.durations_without_filter_ms).median),
+                     format_change(overhead.overhead)])
+    print(format_table(['Query', 'Results', 'Incl. deleted', 'Median', 'Without filter', 'Overhead'], rows))
+
+
+def to_dict(overhead: DeletionOverhead) -> Dict[str, any]:
+    return {
+        'query': overhead.query,
+        'count': overhead.count,
+        'count_including_deleted': overhead.count_including_deleted,
+        'summary': Summary.of(overhead.durations_ms).to_dict(),
+        'summary_without_filter': Summary.of(overhead.durations_without_filter_ms).to_dict(),
+        'overhead': overhead.overhead
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure the latency of the SPARQL queries with and without the filter on deleted entities.')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per query and variant')
+    parser.add_argument('--collection', help='IRI of the collection to use in the path prefix queries')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    api = FairspaceApi()
+    tombstones = count_tombstones(api)
+    overheads = measure_overhead(api, args.repeat, args.collection)
+
+    report(tombstones, overheads)
+    if args.output:
+        write_results(args.output, {
+            'repeat': args.repeat,
+            'tombstones': {t.kind: {'total': t.total, 'deleted': t.deleted, 'ratio': t.ratio} for t in tombstones},
+            'queries': [to_dict(overhead) for overhead in overheads]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import os
+import random
+from collections import Counter
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import List, Dict, Sequence, Optional, Iterable
+
+from metadata_scripts.benchmark import format_table, percentile
+
+DISTRIBUTION_KINDS = ['uniform', 'zipf']
+
+
+@dataclass
+class Distribution:
+    """ How often the values of an attribute are used: uniformly or with Zipf distributed frequencies,
+    where the k-th value is used proportionally to 1 / k^exponent.
+    The cardinality limits the number of distinct values that are used.
+    """
+    kind: str = 'uniform'
+    exponent: float = 1.0
+    cardinality: Optional[int] = None
+
+    def __post_init__(self):
+        if self.kind not in DISTRIBUTION_KINDS:
+            raise ValueError(f'Unknown distribution: {self.kind}. '
+                             f'Supported distributions: {", ".join(DISTRIBUTION_KINDS)}')
+
+    @staticmethod
+    def parse(spec: str, cardinality: Optional[int] = None) -> 'Distribution':
+        """ Parses a distribution specification: a profile name, 'uniform' or 'zipf:<exponent>'.
+        """
+        if spec in PROFILES:
+            profile = PROFILES[spec]
+            return Distribution(profile.kind, profile.exponent, cardinality)
+        kind, _, exponent = spec.partition(':')
+        return Distribution(kind, float(exponent) if exponent else 1.0, cardinality)
+
+    def __str__(self):
+        return self.kind if self.kind == 'uniform' else f'{self.kind}:{self.exponent:g}'
+
+
+PROFILES = {
+    'uniform': Distribution('uniform'),
+    'skewed': Distribution('zipf', 1.0),
+    # The most frequent value is used about 5 times as often as the third
+    'hot': Distribution('zipf', 1.5)
+}
+
+
+def distributions_from_env(attributes: Iterable[str]) -> Dict[str, Distribution]:
+    """ Reads the distribution per attribute from `<ATTRIBUTE>_DISTRIBUTION` and `<ATTRIBUTE>_CARDINALITY`,
+    defaulting to the profile in `DISTRIBUTION_PROFILE`.
+    """
+    profile = os.environ.get('DISTRIBUTION_PROFILE', 'uniform')
+    distributions = {}
+    for attribute in attributes:
+        cardinality = os.environ.get(f'{attribute.upper()}_CARDINALITY')
+        distributions[attribute] = Distribution.parse(os.environ.get(f'{attribute.upper()}_DISTRIBUTION', profile),
+                                                      int(cardinality) if cardinality else None)
+    return distributions
+
+
+def zipf_weights(count: int, exponent: float) -> List[float]:
+    """ Weights proportional to 1 / rank^exponent for ranks 1..count, normalised to sum to 1.
+    """
+    weights = [1 / (rank ** exponent) for rank in range(1, count + 1)]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+class Sampler:
+    """ Selects values from a list according to a distribution. With a Zipf distribution,
+    the first values in the list are the most frequent ones.
+    """
+    def __init__(self, values: Sequence, distribution: Distribution):
+        self.distribution = distribution
+        self.values = list(values[:distribution.cardinality] if distribution.cardinality is not None else values)
+        self.cum_weights = list(accumulate(zipf_weights(len(self.values), distribution.exponent))) \
+            if distribution.kind == 'zipf' else None
+
+    def __len__(self):
+        return len(self.values)
+
+    def choice(self):
+        if self.cum_weights is None:
+            return self.values[random.randrange(len(self.values))]
+        return random.choices(self.values, cum_weights=self.cum_weights)[0]
+
+    def sample(self, count: int) -> List:
+        """ Selects `count` distinct values (at most the number of values).
+        """
+        count = min(count, len(self.values))
+        if self.cum_weights is None:
+            return random.sample(self.values, count)
+        selected = []
+        while len(selected) < count:
+            value = self.choice()
+            if value not in selected:
+                selected.append(value)
+        return selected
+
+
+class Selectivity:
+    """ Realized selectivity of the generated data: the fraction of files that have each attribute value.
+    """
+    def __init__(self):
+        self.files = 0
+        self.counts: Dict[str, Counter] = {}
+
+    def record(self, values: Dict[str, Iterable[str]]):
+        """ Records the attribute values of a file.
+        """
+        self.files += 1
+        for attribute, attribute_values in values.items():
+            self.counts.setdefault(attribute, Counter()).update(set(attribute_values))
+
+    def fractions(self, attribute: str) -> Dict[str, float]:
+        counts = self.counts.get(attribute, Counter())
+        return {value: count / self.files for value, count in counts.most_common()} if self.files > 0 else {}
+
+    def summary(self) -> str:
+        rows = []
+        for attribute in self.counts.keys():
+            fractions = self.fractions(attribute)
+            values = list(fractions.values())
+            if len(values) == 0:
+                rows.append([attribute, '0', '-', '-', '-'])
+                continue
+            most_frequent = next(iter(fractions))
+            rows.append([attribute,
+                         f'{len(values):,}',
+                         f'{most_frequent} ({values[0]:.2%})',
+                         f'{percentile(values, 50):.3%}',
+                         f'{values[-1]:.3%}'])
+        return format_table(['Attribute', 'Values', 'Most frequent', 'Median', 'Least frequent'], rows,
+                            left_columns=(0, 2))
+
+    def to_dict(self) -> Dict[str, any]:
+        return {'files': self.files,
+                'values': {attribute: dict(counts.most_common()) for attribute, counts in self.counts.items()}}
+
+    @staticmethod
+    def from_dict(data: Dict[str, any]) -> 'Selectivity':
+        selectivity = Selectivity()
+        selectivity.files = data['files']
+        selectivity.counts = {attribute: Counter(counts) for attribute, counts in data['values'].items()}
+        return selectivity
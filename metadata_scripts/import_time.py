@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('import_time')
+
+# Entry points that are run frequently (from cron and probes) and should start fast
+ENTRY_POINT_MODULES = [
+    'metadata_scripts.sparql_query',
+    'metadata_scripts.retrieve_view'
+]
+
+# Heavy dependencies that these entry points must not load at import time
+FORBIDDEN_MODULES = [
+    'rdflib',
+    'numpy'
+]
+
+
+@dataclass
+class ImportTime:
+    module: str
+    cumulative_us: int
+    imported_modules: Sequence[str]
+
+    @property
+    def cumulative_ms(self) -> float:
+        return self.cumulative_us / 1000
+
+
+def parse_importtime(output: str) -> Dict[str, int]:
+    """ Parses the output of `python -X importtime` into cumulative import times (in microseconds) per module.
+    """
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            # header line
+            continue
+        times[parts[2].strip()] = int(parts[1].strip())
+    return times
+
+
+def measure_import_time(module: str) -> ImportTime:
+    env = dict(os.environ)
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, env=env)
+    if result.returncode != 0:
+        raise Exception(f'Importing {module} failed:\n{result.stderr}')
+    times = parse_importtime(result.stderr)
+    return ImportTime(module, times.get(module, 0), list(times.keys()))
+
+
+def check_import_time(modules: Sequence[str], budget_ms: float, repeat: int) -> List[str]:
+    """ Checks that the modules import within budget and do not load forbidden modules.
+
+    :return: the list of violations, empty if all modules pass.
+    """
+    violations = []
+    for module in modules:
+        # Take the fastest of repeated runs to reduce noise from disk caches and other processes.
+        measurements = [measure_import_time(module) for _ in range(repeat)]
+        fastest = min(measurements, key=lambda m: m.cumulative_us)
+        forbidden = sorted(set(name for name in fastest.imported_modules
+                               if name.split('.')[0] in FORBIDDEN_MODULES))
+        log.info(f'{module}: {fastest.cumulative_ms:,.0f}ms (budget {budget_ms:,.0f}ms)')
+        if fastest.cumulative_ms > budget_ms:
+            violations.append(f'{module} takes {fastest.cumulative_ms:,.0f}ms to import, '
+                              f'exceeding the budget of {budget_ms:,.0f}ms.')
+        if len(forbidden) > 0:
+            top_level = sorted(set(name.split('.')[0] for name in forbidden))
+            violations.append(f'{module} imports {", ".join(top_level)} at import time.')
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check the import time of the command line entry points against a budget.')
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINT_MODULES,
+                        help='modules to check (default: the query and view entry points)')
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('IMPORT_TIME_BUDGET_MS', 200)),
+                        help='maximum cumulative import time per module in milliseconds')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of measurements per module, the fastest is used')
+    args = parser.parse_args()
+
+    violations = check_import_time(args.modules, args.budget_ms, args.repeat)
+    for violation in violations:
+        log.error(violation)
+    if len(violations) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
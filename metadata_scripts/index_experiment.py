@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Sequence, Optional
+
+from metadata_scripts.benchmark import Summary, format_ms, format_table, write_results, relative_change, format_change
+from metadata_scripts.profiling import format_bytes
+from metadata_scripts.sql_benchmark import connect, read_queries, read_sql_file, run_queries, QueryResult
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('index_experiment')
+
+DEFAULT_INDEXES_FILE = 'indexes.sql'
+DEFAULT_INDEX_SETS_FILE = 'index_sets.sql'
+
+CREATE_INDEX = re.compile(
+    r'^\s*create\s+(unique\s+)?index\s+(concurrently\s+)?(if\s+not\s+exists\s+)?(?P<name>\w+)\s+on\s+(?P<table>\w+)',
+    re.IGNORECASE)
+SET_MARKER = re.compile(r'^--\s*set:\s*(\S+)\s*$')
+EXTENDS_MARKER = re.compile(r'^--\s*extends:\s*(\S+)\s*$')
+
+
+@dataclass
+class Index:
+    name: str
+    table: str
+    statement: str
+
+
+@dataclass
+class IndexSet:
+    name: str
+    indexes: List[Index] = field(default_factory=list)
+    extends: Optional[str] = None
+
+
+def parse_index_statements(text: str) -> List[Index]:
+    """ Parses the `create index` statements from SQL text, other statements are ignored.
+    """
+    indexes = []
+    for statement in re.sub(r'--[^\n]*', '', text).split(';'):
+        match = CREATE_INDEX.match(statement)
+        if match:
+            indexes.append(Index(match.group('name'), match.group('table'), statement.strip()))
+    return indexes
+
+
+def parse_index_sets(text: str) -> List[IndexSet]:
+    index_sets = []
+    current = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        set_marker = SET_MARKER.match(stripped)
+        if set_marker:
+            current = IndexSet(set_marker.group(1))
+            index_sets.append(current)
+            continue
+        extends_marker = EXTENDS_MARKER.match(stripped)
+        if extends_marker and current is not None:
+            current.extends = extends_marker.group(1)
+            continue
+        if current is not None:
+            current.indexes.extend(parse_index_statements(line))
+    return index_sets
+
+
+def resolve_index_sets(baseline: IndexSet, index_sets: Sequence[IndexSet]) -> Dict[str, List[Index]]:
+    """ Resolves the indexes of each set, including the indexes of the sets they extend.
+    """
+    by_name = {index_set.name: index_set for index_set in [baseline] + list(index_sets)}
+
+    def resolve(name: str, seen: Sequence[str]) -> List[Index]:
+        if name not in by_name:
+            raise Exception(f'Unknown index set: {name}')
+        if name in seen:
+            raise Exception(f'Cyclic index set extension: {" -> ".join(list(seen) + [name])}')
+        index_set = by_name[name]
+        indexes = resolve(index_set.extends, list(seen) + [name]) if index_set.extends else []
+        return indexes + index_set.indexes
+
+    return {name: resolve(name, []) for name in by_name.keys()}
+
+
+def read_index_sets(indexes_file: str = None, index_sets_file: str = None) -> Dict[str, List[Index]]:
+    baseline = IndexSet('baseline', parse_index_statements(read_sql_file(indexes_file, DEFAULT_INDEXES_FILE)))
+    index_sets = parse_index_sets(read_sql_file(index_sets_file, DEFAULT_INDEX_SETS_FILE))
+    return resolve_index_sets(baseline, index_sets)
+
+
+@dataclass
+class IndexBuild:
+    name: str
+    table: str
+    build_ms: float
+    size: int
+
+
+@dataclass
+class SetResult:
+    name: str
+    builds: List[IndexBuild]
+    queries: List[QueryResult]
+
+    @property
+    def build_ms(self) -> float:
+        return sum(build.build_ms for build in self.builds)
+
+    @property
+    def size(self) -> int:
+        return sum(build.size for build in self.builds)
+
+    def median(self, query_name: str) -> Optional[float]:
+        for query in self.queries:
+            if query.name == query_name and query.error is None:
+                return query.summary.median
+        return None
+
+
+def apply_index_set(connection, indexes: Sequence[Index], all_index_names: Sequence[str]) -> List[IndexBuild]:
+    builds = []
+    with connection.cursor() as cursor:
+        for name in all_index_names:
+            cursor.execute(f'drop index if exists {name}')
+        for index in indexes:
+            log.info(f'Creating index {index.name} ...')
+            start = time.perf_counter()
+            cursor.execute(index.statement)
+            build_ms = 1000 * (time.perf_counter() - start)
+            cursor.execute('select pg_relation_size(to_regclass(%s))', (index.name,))
+            builds.append(IndexBuild(index.name, index.table, build_ms, cursor.fetchone()[0] or 0))
+        for table in sorted(set(index.table for index in indexes)):
+            cursor.execute(f'analyze {table}')
+    return builds
+
+
+def run_experiment(connection, index_sets: Dict[str, List[Index]], set_names: Sequence[str],
+                   queries, repeat: int, warmup: int) -> List[SetResult]:
+    all_index_names = sorted(set(index.name for indexes in index_sets.values() for index in indexes))
+    results = []
+    for set_name in set_names:
+        log.info(f'Applying index set {set_name} ...')
+        builds = apply_index_set(connection, index_sets[set_name], all_index_names)
+        query_results = run_queries(connection, queries, repeat, warmup)
+        results.append(SetResult(set_name, builds, query_results))
+    return results
+
+
+def report(results: Sequence[SetResult], reference: str):
+    reference_result = next(result for result in results if result.name == reference)
+    print('Index sets')
+    rows = []
+    for result in results:
+        medians = [result.median(q.name) for q in reference_result.queries]
+        reference_medians = [reference_result.median(q.name) for q in reference_result.queries]
+        changes = [relative_change(old, new) for old, new in zip(reference_medians, medians)]
+        changes = [change for change in changes if change is not None]
+        rows.append([
+            result.name,
+            f'{len(result.builds)}',
+            format_bytes(result.size),
+            format_ms(result.build_ms),
+            format_ms(sum(m for m in medians if m is not None)),
+            f'{sum(1 for change in changes if change < -0.1)}',
+            f'{sum(1 for change in changes if change > 0.1)}'
+        ])
+    print(format_table(['Set', 'Indexes', 'Size', 'Build time', 'Total median', 'Faster', 'Slower'], rows))
+    print()
+    print(f'Median latency per query (change with respect to {reference})')
+    header = ['Query'] + [result.name for result in results] + ['Best']
+    rows = []
+    for query in reference_result.queries:
+        reference_median = reference_result.median(query.name)
+        row = [query.name]
+        medians = {}
+        for result in results:
+            median = result.median(query.name)
+            medians[result.name] = median
+            if result.name == reference:
+                row.append(format_ms(median))
+            else:
+                row.append(f'{format_ms(median)} ({format_change(relative_change(reference_median, median))})')
+        candidates = {name: median for name, median in medians.items() if median is not None}
+        row.append(min(candidates, key=candidates.get) if len(candidates) > 0 else '-')
+        rows.append(row)
+    print(format_table(header, rows))
+
+
+def to_dict(result: SetResult) -> Dict[str, any]:
+    return {
+        'name': result.name,
+        'size': result.size,
+        'build_ms': result.build_ms,
+        'indexes': [build.__dict__ for build in result.builds],
+        'queries': [{'name': query.name,
+                     'summary': Summary.of(query.execution_ms).to_dict(),
+                     'rows': query.rows,
+                     'scans': query.scans,
+                     'error': query.error} for query in result.queries]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare alternative index sets on the view database by running the query suite for each set.')
+    parser.add_argument('sets', nargs='*', help='index sets to compare (default: all)')
+    parser.add_argument('--queries', help='SQL file with the queries (default: queries/queries.sql)')
+    parser.add_argument('--query', action='append', dest='query_names', help='only run the named query (repeatable)')
+    parser.add_argument('--indexes', help='SQL file with the baseline indexes (default: queries/indexes.sql)')
+    parser.add_argument('--index-sets',
+                        help='SQL file with alternative index sets (default: queries/index_sets.sql)')
+    parser.add_argument('--reference', default='baseline', help='index set to compare with')
+    parser.add_argument('--restore', default='baseline', help='index set to apply after the experiment')
+    parser.add_argument('--database-url', default=os.environ.get('VIEW_DATABASE_URL'),
+                        help='PostgreSQL connection URL of the view database (default: $VIEW_DATABASE_URL)')
+    parser.add_argument('--repeat', type=int, default=5, help='number of measured runs per query')
+    parser.add_argument('--warmup', type=int, default=1, help='number of unmeasured runs per query')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    index_sets = read_index_sets(args.indexes, args.index_sets)
+    set_names = args.sets or list(index_sets.keys())
+    for name in set_names + [args.reference, args.restore]:
+        if name not in index_sets:
+            log.error(f'Unknown index set: {name}. Available sets: {", ".join(index_sets.keys())}')
+            sys.exit(1)
+    if args.reference not in set_names:
+        set_names = [args.reference] + set_names
+    queries = read_queries(args.queries)
+    if args.query_names:
+        queries = [query for query in queries if query.name in args.query_names]
+    if not args.database_url:
+        log.error('Please configure the VIEW_DATABASE_URL environment variable or use --database-url.')
+        sys.exit(1)
+
+    connection = connect(args.database_url)
+    try:
+        results = run_experiment(connection, index_sets, set_names, queries, args.repeat, args.warmup)
+    finally:
+        # Also restore the indexes if the experiment failed or was interrupted
+        log.info(f'Restoring index set {args.restore} ...')
+        all_index_names = sorted(set(index.name for indexes in index_sets.values() for index in indexes))
+        try:
+            apply_index_set(connection, index_sets[args.restore], all_index_names)
+        finally:
+            connection.close()
+
+    report(results, args.reference)
+    if args.output:
+        write_results(args.output, {
+            'reference': args.reference,
+            'repeat': args.repeat,
+            'sets': [to_dict(result) for result in results]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Callable, Tuple, Optional
+
+from metadata_scripts.benchmark import format_ms, format_table, percentile, write_results
+from metadata_scripts.parity_benchmark import LOGICAL_QUERIES
+from metadata_scripts.sparql_query import QUERIES
+from metadata_scripts.upload_test_data import TestData
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('interference')
+
+WRITE_KINDS = ['metadata', 'files']
+
+
+@dataclass
+class PhaseResult:
+    """ Read latencies measured while writing at a target rate (write batches per second).
+    """
+    name: str
+    target_rate: Optional[float]
+    duration: float = 0
+    writes: int = 0
+    written_items: int = 0
+    reads: Dict[str, List[float]] = field(default_factory=dict)
+    errors: int = 0
+
+    @property
+    def write_rate(self) -> float:
+        return self.writes / self.duration if self.duration > 0 else 0
+
+    def latencies(self, kind: str = None) -> List[float]:
+        return [ms for name, durations in self.reads.items() for ms in durations
+                if kind is None or name.startswith(f'{kind}:')]
+
+
+def read_workload(api) -> List[Tuple[str, Callable]]:
+    """ The SPARQL queries that are not skipped and the view counts of the parity benchmark.
+    """
+    workload = [(f'sparql: {name}', lambda query=contents['query']: api.query_sparql(query))
+                for name, contents in QUERIES.items() if not contents.get('skip', False)]
+    workload += [(f'view: {query.name}', lambda query=query: api.count(query.view, filters=query.filters))
+                 for query in LOGICAL_QUERIES if query.view is not None]
+    return workload
+
+
+class InterferenceBenchmark:
+    def __init__(self, testdata: TestData, readers: int, batch_size: int, write_kind: str):
+        self.testdata = testdata
+        self.api = testdata.api
+        self.readers = readers
+        self.batch_size = batch_size
+        self.write_kind = write_kind
+        self.workload = read_workload(self.api)
+        self.lock = threading.Lock()
+        self.files_written = 0
+        self.directory = None
+
+    def prepare(self):
+        self.testdata.fetch_taxonomy_data()
+        if self.write_kind == 'files':
+            workspace = self.api.find_or_create_workspace(self.testdata.workspace_code)
+            self.testdata.collection_names.append(f'interference {time.strftime("%Y-%m-%d_%H_%M")}')
+            self.api.ensure_dir(self.testdata.collection_names[-1], workspace)
+
+    def write(self) -> int:
+        """ Writes one batch and returns the number of items written.
+        """
+        if self.write_kind == 'metadata':
+            self.testdata.subject_count = self.batch_size
+            self.testdata.generate_and_upload_subjects()
+        else:
+            directory = self.files_written // 10000
+            path = f'{self.testdata.collection_names[-1]}/dir_{directory}'
+            if directory != self.directory:
+                self.api.ensure_dir(path)
+                self.directory = directory
+            self.api.upload_empty_files(path, [f'file_{self.files_written + n}.txt' for n in range(self.batch_size)])
+            self.files_written += self.batch_size
+        return self.batch_size
+
+    def read_loop(self, result: PhaseResult, stop: threading.Event):
+        while not stop.is_set():
+            name, query = random.choice(self.workload)
+            start = time.perf_counter()
+            try:
+                query()
+            except (Exception, SystemExit) as e:
+                log.warning(f'{name} failed: {e}')
+                with self.lock:
+                    result.errors += 1
+                continue
+            duration = 1000 * (time.perf_counter() - start)
+            with self.lock:
+                result.reads.setdefault(name, []).append(duration)
+
+    def write_loop(self, result: PhaseResult, stop: threading.Event):
+        """ Writes batches at the target rate, as far as the server keeps up.
+        """
+        start = time.perf_counter()
+        while not stop.is_set():
+            next_write = start + result.writes / result.target_rate
+            stop.wait(max(0.0, next_write - time.perf_counter()))
+            if stop.is_set():
+                break
+            try:
+                result.written_items += self.write()
+            except (Exception, SystemExit) as e:
+                log.error(f'Writing failed, continuing with reads only: {e}')
+                break
+            result.writes += 1
+
+    def run_phase(self, result: PhaseResult, duration: float, writer: Callable[[PhaseResult, threading.Event], None]):
+        stop = threading.Event()
+        threads = [threading.Thread(target=self.read_loop, args=(result, stop), daemon=True)
+                   for _ in range(self.readers)]
+        if writer is not None:
+            threads.append(threading.Thread(target=writer, args=(result, stop), daemon=True))
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        stop.wait(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        result.duration = time.perf_counter() - start
+        return result
+
+    def run(self, rates: List[float], duration: float, reindex: bool, timeout: float) -> List[PhaseResult]:
+        self.prepare()
+        results = []
+        for rate in rates:
+            log.info(f'Reading while writing {rate:g} batches per second for {duration:g}s ...')
+            results.append(self.run_phase(PhaseResult(f'{rate:g}/s', rate), duration,
+                                          self.write_loop if rate > 0 else None))
+        if reindex:
+            log.info('Reading while reindexing ...')
+            result = PhaseResult('reindex', None)
+
+            def reindex_writer(phase: PhaseResult, stop: threading.Event):
+                self.api.reindex(wait=True, timeout=timeout)
+                phase.writes = 1
+                stop.set()
+
+            results.append(self.run_phase(result, timeout, reindex_writer))
+        return results
+
+
+def report(results: List[PhaseResult], write_kind: str):
+    unit = 'subjects' if write_kind == 'metadata' else 'files'
+    rows = []
+    for result in results:
+        for kind in ['sparql', 'view']:
+            latencies = result.latencies(kind)
+            rows.append([result.name,
+                         f'{result.write_rate:.2f}' if result.target_rate is not None else '-',
+                         f'{result.written_items / result.duration:,.0f}'
+                         if result.target_rate is not None and result.duration > 0 else '-',
+                         kind,
+                         f'{len(latencies):,}',
+                         format_ms(percentile(latencies, 50)),
+                         format_ms(percentile(latencies, 95)),
+                         format_ms(percentile(latencies, 99)),
+                         format_ms(max(latencies) if len(latencies) > 0 else None),
+                         f'{result.errors:,}' if kind == 'sparql' else ''])
+    print(format_table(['Phase', 'Writes/s', f'{unit.capitalize()}/s', 'Reads', 'Count', 'p50', 'p95', 'p99', 'Max',
+                        'Errors'], rows, left_columns=(0, 3)))
+
+
+def to_dict(result: PhaseResult) -> Dict[str, any]:
+    return {
+        'name': result.name,
+        'target_rate': result.target_rate,
+        'duration': result.duration,
+        'writes': result.writes,
+        'written_items': result.written_items,
+        'errors': result.errors,
+        'percentiles': {kind: {f'p{p}': percentile(result.latencies(kind), p) for p in [50, 95, 99]}
+                        for kind in ['sparql', 'view']},
+        'reads': result.reads
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure read latency while writing metadata or files at increasing rates, '
+                    'and optionally while reindexing.')
+    parser.add_argument('--rates', default='0,0.5,1,2',
+                        help='comma separated write rates in batches per second, 0 for reads only')
+    parser.add_argument('--duration', type=float, default=60, help='seconds per write rate')
+    parser.add_argument('--batch-size', type=int, default=100, help='subjects or files per write batch')
+    parser.add_argument('--write-kind', choices=WRITE_KINDS, default='metadata',
+                        help='write subjects with upload_metadata or empty files with upload_files')
+    parser.add_argument('--readers', type=int, default=4, help='number of concurrent readers')
+    parser.add_argument('--reindex', action='store_true', help='also measure read latency during reindexing')
+    parser.add_argument('--timeout', type=float, default=3600, help='maximum number of seconds to wait for reindexing')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    rates = [float(rate) for rate in args.rates.split(',')]
+    benchmark = InterferenceBenchmark(TestData(), args.readers, args.batch_size, args.write_kind)
+    results = benchmark.run(rates, args.duration, args.reindex, args.timeout)
+
+    report(results, args.write_kind)
+    if args.output:
+        write_results(args.output, {
+            'write_kind': args.write_kind,
+            'batch_size': args.batch_size,
+            'readers': args.readers,
+            'phases': [to_dict(result) for result in results]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import math
+import os
+import random
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+COUNT_DISTRIBUTIONS = ['fixed', 'uniform', 'geometric', 'poisson']
+
+
+@dataclass
+class CountDistribution:
+    """ Distribution of a non-negative count: 'fixed:<n>', 'uniform:<min>-<max>',
+    'geometric:<mean>' or 'poisson:<mean>'.
+    """
+    kind: str
+    low: float
+    high: Optional[float] = None
+
+    def __post_init__(self):
+        if self.kind not in COUNT_DISTRIBUTIONS:
+            raise ValueError(f'Unknown count distribution: {self.kind}. '
+                             f'Supported distributions: {", ".join(COUNT_DISTRIBUTIONS)}')
+        if self.low < 0 or (self.high is not None and self.high < self.low):
+            raise ValueError(f'Invalid count distribution: {self}')
+
+    @staticmethod
+    def parse(spec: str) -> 'CountDistribution':
+        kind, _, value = spec.partition(':')
+        if kind == 'uniform':
+            low, _, high = value.partition('-')
+            return CountDistribution(kind, int(low), int(high or low))
+        return CountDistribution(kind, float(value) if value else 1.0)
+
+    def sample(self) -> int:
+        if self.kind == 'fixed':
+            return int(self.low)
+        if self.kind == 'uniform':
+            return random.randint(int(self.low), int(self.high))
+        if self.kind == 'geometric':
+            # Number of failures before the first success, with the given mean
+            if self.low == 0:
+                return 0
+            return int(math.log(1 - random.random()) / math.log(self.low / (1 + self.low)))
+        # Poisson, by inversion (the means used here are small)
+        limit = math.exp(-self.low)
+        count = 0
+        product = random.random()
+        while product > limit:
+            count += 1
+            product *= random.random()
+        return count
+
+    def __str__(self):
+        if self.kind == 'uniform':
+            return f'uniform:{self.low:g}-{self.high:g}'
+        return f'{self.kind}:{self.low:g}'
+
+
+@dataclass
+class LineageShape:
+    """ How generated samples derive from each other (curie:isChildOf): about `derived_fraction` of the samples
+    is derived from another sample. Each lineage tree has a number of generations below its root sample
+    drawn from `depth`, and each sample in it a number of child samples drawn from `branching`.
+    """
+    derived_fraction: float = 1 / 6
+    depth: CountDistribution = field(default_factory=lambda: CountDistribution('fixed', 1))
+    branching: CountDistribution = field(default_factory=lambda: CountDistribution('fixed', 1))
+
+    @staticmethod
+    def from_env() -> 'LineageShape':
+        return LineageShape(float(os.environ.get('LINEAGE_FRACTION', 1 / 6)),
+                            CountDistribution.parse(os.environ.get('LINEAGE_DEPTH', 'fixed:1')),
+                            CountDistribution.parse(os.environ.get('LINEAGE_BRANCHING', 'fixed:1')))
+
+
+class Lineage:
+    """ The parent of each sample as an index into the same list of samples (-1 for samples without parent),
+    and the generation of each sample in its lineage tree. Parents always precede their children.
+    """
+    def __init__(self):
+        self.parents = array('i')
+        self.depths = array('H')
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add(self, parent: int) -> int:
+        self.parents.append(parent)
+        self.depths.append(0 if parent < 0 else self.depths[parent] + 1)
+        return len(self.parents) - 1
+
+    @staticmethod
+    def generate(count: int, shape: LineageShape) -> 'Lineage':
+        """ Generates `count` samples. A new sample starts a lineage tree if less than `derived_fraction`
+        of the samples so far has a parent; the tree is generated breadth first, as sampled from the shape.
+        """
+        lineage = Lineage()
+        derived = 0
+        while len(lineage) < count:
+            frontier = [lineage.add(-1)]
+            if derived >= shape.derived_fraction * len(lineage):
+                continue
+            for _ in range(shape.depth.sample()):
+                children = []
+                for parent in frontier:
+                    for _ in range(min(shape.branching.sample(), count - len(lineage))):
+                        children.append(lineage.add(parent))
+                frontier = children
+                derived += len(children)
+                if len(frontier) == 0:
+                    break
+        return lineage
+
+    @property
+    def derived(self) -> int:
+        return sum(1 for parent in self.parents if parent >= 0)
+
+    @property
+    def max_depth(self) -> int:
+        return max(self.depths) if len(self.depths) > 0 else 0
+
+    def depth_counts(self) -> Dict[int, int]:
+        return dict(sorted(Counter(self.depths).items()))
+
+    def summary(self) -> str:
+        derived = self.derived
+        return f'{derived:,} of {len(self):,} samples derived from another sample ' \
+               f'({derived / len(self) if len(self) > 0 else 0:.1%}), max depth {self.max_depth}, ' \
+               f'samples per depth: ' + ', '.join(f'{depth}: {count:,}' for depth, count in self.depth_counts().items())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Sequence
+
+from fairspace_api.api import FairspaceApi
+from metadata_scripts.benchmark import format_ms, format_table, percentile, write_results
+from metadata_scripts.parity_benchmark import LOGICAL_QUERIES
+from metadata_scripts.view_filters import FilterCombination, facets_from_config, add_taxonomy_values, \
+    view_names, generate_combinations
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('load_generator')
+
+ARRIVALS = ['poisson', 'constant']
+
+
+def arrival_times(rate: float, duration: float, arrival: str) -> List[float]:
+    """ Intended send times in seconds from the start, at `rate` requests per second on average.
+    """
+    times = []
+    t = 0.0
+    n = 0
+    while True:
+        if arrival == 'poisson':
+            t += random.expovariate(rate)
+        else:
+            n += 1
+            t = n / rate
+        if t >= duration:
+            return times
+        times.append(t)
+
+
+def random_request(combinations: Sequence[FilterCombination] = None) -> (str, str, Optional[List[Dict[str, any]]]):
+    """ A random page or count request for one of the filter combinations, or, if there are none,
+    for one of the views of the parity benchmark with a random subset of its filters.
+    """
+    if combinations:
+        combination = random.choice(combinations)
+        return random.choice(['page', 'count']), combination.view, combination.filters
+    query = random.choice([query for query in LOGICAL_QUERIES if query.view is not None])
+    filters = [f for f in query.filters or [] if random.random() < 0.5] or None
+    return random.choice(['page', 'count']), query.view, filters
+
+
+@dataclass
+class StepResult:
+    """ Latencies of the requests sent at a target rate. The latency is measured from the intended send time,
+    so it includes the time requests wait because earlier requests are still running.
+    """
+    target_rate: float
+    duration: float
+    sent: int = 0
+    errors: int = 0
+    latencies_ms: List[float] = field(default_factory=list)
+    service_ms: List[float] = field(default_factory=list)
+    completed_at: float = 0
+
+    @property
+    def throughput(self) -> float:
+        """ Completed requests per second, until the last request completed.
+        """
+        return len(self.latencies_ms) / self.completed_at if self.completed_at > 0 else 0
+
+    @property
+    def offered_rate(self) -> float:
+        """ Requests sent per second, which varies around the target rate with Poisson arrivals.
+        """
+        return self.sent / self.duration if self.duration > 0 else 0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.sent if self.sent > 0 else 0
+
+    def p(self, p: float) -> Optional[float]:
+        return percentile(self.latencies_ms, p)
+
+    def saturated(self, slo_ms: float, max_error_rate: float) -> bool:
+        """ The server does not keep up: throughput falls behind the offered rate,
+        p99 latency exceeds the SLO or too many requests fail.
+        """
+        return self.throughput < 0.9 * self.offered_rate * (1 - self.error_rate) \
+            or (self.p(99) or 0) > slo_ms \
+            or self.error_rate > max_error_rate
+
+
+class LoadGenerator:
+    def __init__(self, api: FairspaceApi, arrival: str, max_concurrency: int, page_size: int = 20,
+                 combinations: Sequence[FilterCombination] = None):
+        self.api = api
+        self.combinations = combinations
+        self.arrival = arrival
+        self.max_concurrency = max_concurrency
+        self.page_size = page_size
+        self.lock = threading.Lock()
+
+    def send(self, result: StepResult, start: float, intended: float):
+        kind, view, filters = random_request(self.combinations)
+        sent = time.perf_counter()
+        try:
+            if kind == 'page':
+                self.api.retrieve_view_page(view, page=1, size=self.page_size, filters=filters)
+            else:
+                self.api.count(view, filters=filters)
+        except (Exception, SystemExit) as e:
+            log.warning(f'{kind} request for {view} failed: {e}')
+            with self.lock:
+                result.errors += 1
+            return
+        done = time.perf_counter()
+        with self.lock:
+            result.latencies_ms.append(1000 * (done - start - intended))
+            result.service_ms.append(1000 * (done - sent))
+            result.completed_at = max(result.completed_at, done - start)
+
+    def run_step(self, rate: float, duration: float) -> StepResult:
+        """ Sends requests at the intended times, without waiting for earlier requests to complete.
+        """
+        result = StepResult(rate, duration)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            start = time.perf_counter()
+            for intended in arrival_times(rate, duration, self.arrival):
+                delay = start + intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send, result, start, intended)
+                result.sent += 1
+        return result
+
+    def ramp(self, start_rate: float, factor: float, max_rate: float, duration: float,
+             slo_ms: float, max_error_rate: float) -> (List[StepResult], Optional[float]):
+        """ Increases the rate by `factor` until the server is saturated.
+
+        :return: the results per step and the saturation throughput:
+            the highest rate at which the server was not saturated.
+        """
+        results = []
+        saturation = None
+        rate = start_rate
+        while rate <= max_rate:
+            log.info(f'Sending {rate:g} requests per second for {duration:g}s ...')
+            result = self.run_step(rate, duration)
+            results.append(result)
+            if result.saturated(slo_ms, max_error_rate):
+                log.info(f'Saturated at {rate:g} requests per second '
+                         f'(throughput {result.throughput:.1f}/s, p99 {format_ms(result.p(99))}).')
+                break
+            saturation = rate
+            rate *= factor
+        return results, saturation
+
+
+def report(results: List[StepResult], saturation: Optional[float], slo_ms: float, max_error_rate: float):
+    rows = [[f'{result.target_rate:g}',
+             f'{result.sent:,}',
+             f'{result.offered_rate:.1f}',
+             f'{result.throughput:.1f}',
+             f'{result.error_rate:.1%}',
+             format_ms(result.p(50)),
+             format_ms(result.p(95)),
+             format_ms(result.p(99)),
+             format_ms(percentile(result.service_ms, 50)),
+             'yes' if result.saturated(slo_ms, max_error_rate) else '']
+            for result in results]
+    print(format_table(['Rate', 'Sent', 'Offered', 'Throughput', 'Errors', 'p50', 'p95', 'p99', 'Service p50',
+                        'Saturated'], rows))
+    print()
+    if saturation is None:
+        print('Saturated at the first rate, try a lower --start-rate.')
+    else:
+        print(f'Saturation throughput: {saturation:g} requests per second '
+              f'(p99 latency below {format_ms(slo_ms)}).')
+
+
+def to_dict(result: StepResult) -> Dict[str, any]:
+    return {
+        'target_rate': result.target_rate,
+        'duration': result.duration,
+        'sent': result.sent,
+        'errors': result.errors,
+        'throughput': result.throughput,
+        'percentiles': {f'p{p}': result.p(p) for p in [50, 90, 95, 99]},
+        'service_p50': percentile(result.service_ms, 50),
+        'latencies_ms': result.latencies_ms
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Send view page and count requests at increasing fixed arrival rates (open loop) '
+                    'to find the saturation throughput of the views API.')
+    parser.add_argument('--arrival', choices=ARRIVALS, default='poisson', help='arrival schedule of the requests')
+    parser.add_argument('--rate', type=float, help='only send requests at this rate (requests per second)')
+    parser.add_argument('--start-rate', type=float, default=1, help='rate of the first step of the ramp')
+    parser.add_argument('--factor', type=float, default=1.5, help='rate increase per step of the ramp')
+    parser.add_argument('--max-rate', type=float, default=1000, help='highest rate of the ramp')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per rate')
+    parser.add_argument('--slo-ms', type=float, default=1000,
+                        help='p99 latency above which the server is considered saturated')
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help='fraction of failed requests above which the server is considered saturated')
+    parser.add_argument('--max-concurrency', type=int, default=256,
+                        help='maximum number of requests in flight; should exceed rate times latency')
+    parser.add_argument('--generated-filters', type=int, metavar='N',
+                        help='use N generated filter combinations on the facets of the view config, '
+                             'instead of the filters of the parity benchmark')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    api = FairspaceApi()
+    combinations = None
+    if args.generated_filters:
+        config = api.retrieve_view_config()
+        facets = facets_from_config(config)
+        add_taxonomy_values(api, facets)
+        combinations = generate_combinations(view_names(config), facets, 3, args.generated_filters)
+    generator = LoadGenerator(api, args.arrival, args.max_concurrency, combinations=combinations)
+    if args.rate is not None:
+        results = [generator.run_step(args.rate, args.duration)]
+        saturation = None if results[0].saturated(args.slo_ms, args.max_error_rate) else args.rate
+    else:
+        results, saturation = generator.ramp(args.start_rate, args.factor, args.max_rate, args.duration,
+                                             args.slo_ms, args.max_error_rate)
+
+    report(results, saturation, args.slo_ms, args.max_error_rate)
+    if args.output:
+        write_results(args.output, {
+            'arrival': args.arrival,
+            'slo_ms': args.slo_ms,
+            'saturation_throughput': saturation,
+            'steps': [to_dict(result) for result in results]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
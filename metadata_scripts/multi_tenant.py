@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Callable, Tuple, Optional
+
+from dotenv import load_dotenv
+
+from fairspace_api.api import FairspaceApi, use_or_read_value
+from fairspace_api.keycloak_admin import KeycloakAdmin
+from metadata_scripts.benchmark import format_ms, format_table, percentile, write_results
+from metadata_scripts.interference import read_workload
+from metadata_scripts.upload_test_data import TestData
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('multi_tenant')
+
+ADMIN = 'admin'
+
+
+@dataclass
+class Tenant:
+    """ A test user and the workspace it is a member of, with the collections of that workspace.
+    """
+    username: str
+    workspace: str
+    collections: List[str]
+    api: Optional[FairspaceApi] = None
+
+
+@dataclass
+class Sample:
+    workspace: str
+    user: str
+    name: str
+    duration_ms: float
+
+
+@dataclass
+class PhaseResult:
+    name: str
+    duration: float = 0
+    samples: List[Sample] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+    # Collections of other workspaces that a user could list (should be none)
+    leaks: List[Tuple[str, str]] = field(default_factory=list)
+
+    def latencies(self, workspace: str = None, user: str = None, kind: str = None) -> List[float]:
+        return [sample.duration_ms for sample in self.samples
+                if (workspace is None or sample.workspace == workspace)
+                and (user is None or sample.user == user)
+                and (kind is None or sample.name.startswith(f'{kind}:'))]
+
+
+def setup(workspace_count: int, user_count: int, user_prefix: str, workspace_prefix: str, password: str,
+          tenants_path: str):
+    """ Creates the workspaces and users, generates metadata once and distributes the collections
+    over the workspaces, and writes the users, workspaces and collections to `tenants_path`.
+    """
+    testdata = TestData()
+    api = testdata.api
+    keycloak = KeycloakAdmin()
+    workspaces = {}
+    for m in range(workspace_count):
+        code = f'{workspace_prefix}{m}'
+        workspaces[code] = {'iri': api.find_or_create_workspace(code)['iri'], 'collections': []}
+
+    users = {}
+    admin_token = keycloak.get_token()
+    for n in range(user_count):
+        username = f'{user_prefix}{n}'
+        keycloak.ensure_user(username, password, admin_token)
+        # Fairspace registers the user on its first request
+        user = FairspaceApi(username=username, password=password).current_user()
+        code = f'{workspace_prefix}{n % workspace_count}'
+        api.set_workspace_role(workspaces[code]['iri'], user['iri'])
+        api.update_user_roles(user['id'], canQueryMetadata=True)
+        users[username] = code
+        log.info(f'User {username} is a member of workspace {code}.')
+
+    for phase in [testdata.update_taxonomies,
+                  testdata.update_collection_type_labels,
+                  testdata.fetch_taxonomy_data,
+                  testdata.generate_and_upload_subjects,
+                  testdata.generate_and_upload_events,
+                  testdata.generate_and_upload_samples]:
+        with testdata.profiler.phase(phase.__name__):
+            phase()
+    collection_count = testdata.collection_count
+    testdata.collection_count = max(1, collection_count // workspace_count)
+    for code, workspace in workspaces.items():
+        log.info(f'Uploading {testdata.collection_count:,} collections to workspace {code} ...')
+        offset = len(testdata.collection_names)
+        testdata.workspace_code = code
+        testdata.generate_and_upload_collections()
+        workspace['collections'] = testdata.collection_names[offset:]
+    testdata.collection_count = collection_count
+    testdata.reindex()
+
+    with open(tenants_path, 'w') as f:
+        json.dump({'workspaces': workspaces, 'users': users}, f, indent=2)
+    log.info(f'Tenants written to {tenants_path}.')
+
+
+def load_tenants(path: str, password: str) -> List[Tenant]:
+    with open(path, 'r') as f:
+        data = json.load(f)
+    tenants = [Tenant(username, code, data['workspaces'][code]['collections'])
+               for username, code in data['users'].items()]
+    for tenant in tenants:
+        # One client per user, each with its own token and refresh timer
+        tenant.api = FairspaceApi(username=tenant.username, password=password)
+        tenant.api.get_token()
+    return tenants
+
+
+def tenant_workload(tenant: Tenant) -> List[Tuple[str, Callable]]:
+    """ The read workload of the interference benchmark, as the user of the tenant,
+    with listings of the collections of its workspace.
+    """
+    workload = read_workload(tenant.api)
+    workload += [(f'webdav: {collection}', lambda collection=collection: list(tenant.api.list_dir(collection)))
+                 for collection in tenant.collections]
+    return workload
+
+
+class MultiTenantBenchmark:
+    def __init__(self, tenants: List[Tenant], admin: Tenant, concurrency: int):
+        self.tenants = tenants
+        self.admin = admin
+        self.concurrency = concurrency
+        self.workloads = {tenant.username: tenant_workload(tenant) for tenant in tenants + [admin]}
+        self.lock = threading.Lock()
+
+    def worker(self, tenant: Tenant, result: PhaseResult, stop: threading.Event):
+        workload = self.workloads[tenant.username]
+        while not stop.is_set():
+            name, query = random.choice(workload)
+            start = time.perf_counter()
+            try:
+                query()
+            except (Exception, SystemExit) as e:
+                log.warning(f'{name} failed for {tenant.username}: {e}')
+                with self.lock:
+                    result.errors[tenant.workspace] = result.errors.get(tenant.workspace, 0) + 1
+                continue
+            duration = 1000 * (time.perf_counter() - start)
+            with self.lock:
+                result.samples.append(Sample(tenant.workspace, tenant.username, name, duration))
+
+    def run_phase(self, name: str, workers: List[Tenant], duration: float) -> PhaseResult:
+        """ Runs one thread per entry of `workers`, each sending requests as that tenant, for `duration` seconds.
+        """
+        log.info(f'Running phase {name} with {len(workers)} concurrent clients for {duration:g}s ...')
+        result = PhaseResult(name, duration)
+        stop = threading.Event()
+        threads = [threading.Thread(target=self.worker, args=(tenant, result, stop), daemon=True)
+                   for tenant in workers]
+        for thread in threads:
+            thread.start()
+        stop.wait(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return result
+
+    def clients(self, noisy_workspace: str = None, noisy_factor: int = 1) -> List[Tenant]:
+        """ `concurrency` clients, spread round robin over the users,
+        with `noisy_factor` times as many clients for users of the noisy workspace.
+        """
+        workers = [self.tenants[n % len(self.tenants)] for n in range(self.concurrency)]
+        if noisy_workspace is not None:
+            workers += [tenant for tenant in workers if tenant.workspace == noisy_workspace] * (noisy_factor - 1)
+        return workers
+
+    def check_isolation(self, result: PhaseResult):
+        """ Checks that users cannot see the collections of workspaces they are not a member of.
+        """
+        for tenant in self.tenants:
+            for other in self.tenants:
+                if other.workspace == tenant.workspace:
+                    continue
+                for collection in other.collections:
+                    if tenant.api.exists(collection):
+                        log.error(f'User {tenant.username} can access {collection} of workspace {other.workspace}!')
+                        result.leaks.append((tenant.username, collection))
+
+    def run(self, duration: float, noisy_workspace: str = None, noisy_factor: int = 1,
+            isolation: bool = False) -> List[PhaseResult]:
+        phases = [self.run_phase(ADMIN, [self.admin] * self.concurrency, duration),
+                  self.run_phase('tenants', self.clients(), duration)]
+        if noisy_workspace is not None:
+            phases.append(self.run_phase(f'noisy {noisy_workspace}',
+                                         self.clients(noisy_workspace, noisy_factor), duration))
+        if isolation:
+            self.check_isolation(phases[1])
+        return phases
+
+
+def overhead(admin: PhaseResult, tenants: PhaseResult, kind: str) -> Optional[float]:
+    """ Relative difference of the median latency of requests of a kind as test users and as administrator.
+    """
+    baseline = percentile(admin.latencies(kind=kind), 50)
+    measured = percentile(tenants.latencies(kind=kind), 50)
+    return measured / baseline - 1 if baseline and measured is not None else None
+
+
+def report(phases: List[PhaseResult]):
+    rows = []
+    for phase in phases:
+        for workspace in sorted({sample.workspace for sample in phase.samples} | set(phase.errors)):
+            latencies = phase.latencies(workspace)
+            rows.append([phase.name, workspace, f'{len(latencies):,}', f'{phase.errors.get(workspace, 0):,}',
+                         f'{len(latencies) / phase.duration:.1f}' if phase.duration > 0 else '-',
+                         format_ms(percentile(latencies, 50)), format_ms(percentile(latencies, 95)),
+                         format_ms(percentile(latencies, 99))])
+    print(format_table(['Phase', 'Workspace', 'Requests', 'Errors', 'Req/s', 'p50', 'p95', 'p99'], rows, (0, 1)))
+    print()
+    tenants = phases[1]
+    rows = [[user, workspace, f'{len(tenants.latencies(user=user)):,}',
+             format_ms(percentile(tenants.latencies(user=user), 50)),
+             format_ms(percentile(tenants.latencies(user=user), 95))]
+            for user, workspace in sorted({(sample.user, sample.workspace) for sample in tenants.samples})]
+    print(format_table(['User', 'Workspace', 'Requests', 'p50', 'p95'], rows, (0, 1)))
+    print()
+    for kind in ['sparql', 'view', 'webdav']:
+        difference = overhead(phases[0], tenants, kind)
+        if difference is not None:
+            print(f'Authorization overhead ({kind}, p50 as test users vs. as {ADMIN}): {difference:+.0%}')
+    if len(tenants.leaks) > 0:
+        print(f'Isolation violated: {len(tenants.leaks):,} collections of other workspaces are accessible.')
+    for noisy in phases[2:]:
+        workspace = noisy.name.split(' ', 1)[1]
+        quiet = [tenant for tenant in {sample.workspace for sample in tenants.samples} if tenant != workspace]
+        before = [ms for tenant in quiet for ms in tenants.latencies(tenant)]
+        after = [ms for tenant in quiet for ms in noisy.latencies(tenant)]
+        if len(before) > 0 and len(after) > 0:
+            print(f'p95 of other workspaces with noisy {workspace}: '
+                  f'{format_ms(percentile(before, 95))} -> {format_ms(percentile(after, 95))}')
+
+
+def to_dict(phase: PhaseResult) -> Dict[str, any]:
+    workspaces = sorted({sample.workspace for sample in phase.samples})
+    users = sorted({sample.user for sample in phase.samples})
+    return {
+        'name': phase.name,
+        'duration': phase.duration,
+        'errors': phase.errors,
+        'leaks': phase.leaks,
+        'workspaces': {workspace: {f'p{p}': percentile(phase.latencies(workspace), p) for p in [50, 95, 99]}
+                       for workspace in workspaces},
+        'users': {user: {f'p{p}': percentile(phase.latencies(user=user), p) for p in [50, 95, 99]}
+                  for user in users},
+        'samples': [sample.__dict__ for sample in phase.samples]
+    }
+
+
+def setup_main():
+    parser = argparse.ArgumentParser(
+        description='Create workspaces and test users (with the Keycloak admin API) and upload test data '
+                    'with the collections distributed over the workspaces.')
+    parser.add_argument('--workspaces', type=int, default=4, help='number of workspaces (default: 4)')
+    parser.add_argument('--users', type=int, default=8,
+                        help='number of test users, assigned round robin to the workspaces (default: 8)')
+    parser.add_argument('--user-prefix', default='tenant-user-', help='prefix of the usernames')
+    parser.add_argument('--workspace-prefix', default='tenant-', help='prefix of the workspace codes')
+    parser.add_argument('--tenants', default='tenants.json',
+                        help='JSON file to write the users, workspaces and collections to')
+    args = parser.parse_args()
+    load_dotenv()
+    setup(args.workspaces, args.users, args.user_prefix, args.workspace_prefix,
+          use_or_read_value(None, 'TENANT_PASSWORD'), args.tenants)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run queries concurrently as the test users of multi_tenant_setup, '
+                    'to measure authorization overhead and isolation between workspaces.')
+    parser.add_argument('--tenants', default='tenants.json', help='JSON file written by multi_tenant_setup')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of concurrent clients per phase')
+    parser.add_argument('--duration', type=float, default=60, help='seconds per phase')
+    parser.add_argument('--noisy-workspace',
+                        help='run an extra phase with more clients for the users of this workspace')
+    parser.add_argument('--noisy-factor', type=int, default=4,
+                        help='number of clients per client of a user of the noisy workspace (default: 4)')
+    parser.add_argument('--check-isolation', action='store_true',
+                        help='check that users cannot access collections of other workspaces')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+    load_dotenv()
+
+    tenants = load_tenants(args.tenants, use_or_read_value(None, 'TENANT_PASSWORD'))
+    admin_api = FairspaceApi()
+    admin = Tenant(admin_api.username, ADMIN, [collection for tenant in tenants for collection in tenant.collections],
+                   admin_api)
+    # Every collection is listed once, not once per member of its workspace
+    admin.collections = sorted(set(admin.collections))
+    benchmark = MultiTenantBenchmark(tenants, admin, args.concurrency)
+    phases = benchmark.run(args.duration, args.noisy_workspace, args.noisy_factor, args.check_isolation)
+
+    report(phases)
+    if args.output:
+        write_results(args.output, {
+            'users': len(tenants),
+            'workspaces': len({tenant.workspace for tenant in tenants}),
+            'concurrency': args.concurrency,
+            'phases': [to_dict(phase) for phase in phases]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Set, Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from rdflib import Graph
+
+log = logging.getLogger('oracle')
+
+CURIE = 'https://institut-curie.org/ontology#'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+# Entity types of the generated metadata, by the name of their view
+TYPES = {
+    f'{CURIE}Subject': 'Subject',
+    f'{CURIE}TumorPathologyEvent': 'TumorPathologyEvent',
+    f'{CURIE}BiologicalSample': 'Sample'
+}
+
+# Attributes used in view filters, by predicate. The field of a filter is '<view>.<attribute>'.
+ATTRIBUTES = {
+    f'{CURIE}isOfGender': 'gender',
+    f'{CURIE}availableForResearch': 'availableForResearch',
+    f'{CURIE}eventType': 'eventType',
+    f'{CURIE}topography': 'topography',
+    f'{CURIE}tumorMorphology': 'morphology',
+    f'{CURIE}tumorLaterality': 'laterality',
+    f'{CURIE}isOfNature': 'nature',
+    f'{CURIE}tumorCellularity': 'tumorCellularity',
+    f'{CURIE}analysisType': 'analysisType',
+    'http://www.w3.org/ns/dcat#keyword': 'keywords'
+}
+
+# Links between entities of different types, which views are joined on
+LINKS = {f'{CURIE}{name}' for name in ['subject', 'diagnosis', 'eventSubject', 'sample', 'aboutSubject', 'aboutEvent']}
+
+
+@dataclass
+class Entity:
+    view: str
+    attributes: Dict[str, list] = field(default_factory=dict)
+    links: Set[str] = field(default_factory=set)
+    deleted: bool = False
+
+
+class CardinalityOracle:
+    """ Index of the generated entities, their filterable attributes (as labels) and the links between them,
+    to compute the expected number of rows of a view for a combination of filters.
+
+    Like the views API, a row matches the filters on another view if a linked entity of that view
+    (linked directly, in either direction) matches all of them. Deleted entities are not counted or joined.
+    """
+    def __init__(self):
+        self.entities: Dict[str, Entity] = {}
+        # False if the dataset contains entities that were generated without the oracle
+        self.complete = True
+        # Expected counts of the catalog queries, computed when the generation has finished
+        self.expected: Dict[str, int] = {}
+        self.backlinks: Optional[Dict[str, Set[str]]] = None
+        self.rows: Dict[str, List[str]] = {}
+
+    def add_location(self, iri: str, location_type: str):
+        """ Adds a collection, directory or file (rows of the Collection view).
+        """
+        self.entities.setdefault(iri, Entity('Collection')).attributes['type'] = [location_type]
+        self.backlinks = None
+
+    def add_graph(self, graph: 'Graph', labels: Dict[str, str]):
+        """ Adds the entities and links of an uploaded graph, with the labels of taxonomy terms.
+        Files must have been added with `add_location` first.
+        """
+        for subject, predicate, value in graph:
+            if str(predicate) == RDF_TYPE and str(value) in TYPES:
+                self.entities.setdefault(str(subject), Entity(TYPES[str(value)]))
+        for subject, predicate, value in graph:
+            entity = self.entities.get(str(subject))
+            if entity is None:
+                continue
+            predicate = str(predicate)
+            if predicate in ATTRIBUTES:
+                attribute = entity.attributes.setdefault(ATTRIBUTES[predicate], [])
+                value = value.toPython() if hasattr(value, 'toPython') else value
+                attribute.append(value if isinstance(value, (int, float)) else labels.get(str(value), str(value)))
+            elif predicate in LINKS:
+                entity.links.add(str(value))
+        self.backlinks = None
+
+    def mark_deleted(self, iri: str):
+        """ Marks an entity as deleted, and for a directory also everything in it.
+        """
+        entity = self.entities.get(iri)
+        if entity is None:
+            return
+        entity.deleted = True
+        if entity.attributes.get('type') == ['Directory']:
+            for path, descendant in self.entities.items():
+                if path.startswith(f'{iri}/'):
+                    descendant.deleted = True
+
+    def index(self):
+        """ Builds the reverse links and the rows per view, after entities have been added.
+        """
+        if self.backlinks is not None:
+            return
+        self.backlinks = {}
+        self.rows = {}
+        for iri, entity in self.entities.items():
+            self.rows.setdefault(entity.view, []).append(iri)
+            for target in entity.links:
+                self.backlinks.setdefault(target, set()).add(iri)
+
+    def linked(self, iri: str) -> Set[str]:
+        self.index()
+        return self.entities[iri].links | self.backlinks.get(iri, set())
+
+    @staticmethod
+    def matches(entity: Entity, filters: Iterable[Dict[str, any]]) -> bool:
+        for f in filters:
+            values = entity.attributes.get(f['field'].split('.', 1)[1], [])
+            if 'values' in f:
+                if not any(value in f['values'] for value in values):
+                    return False
+            elif not any((f.get('min') is None or value >= f['min']) and (f.get('max') is None or value <= f['max'])
+                         for value in values):
+                return False
+        return True
+
+    def row_matches(self, iri: str, view: str, filters: List[Dict[str, any]]) -> bool:
+        by_view: Dict[str, List[Dict[str, any]]] = {}
+        for f in filters:
+            by_view.setdefault(f['field'].split('.', 1)[0], []).append(f)
+        for filter_view, view_filters in by_view.items():
+            if filter_view == view:
+                candidates = [iri]
+            else:
+                candidates = [linked for linked in self.linked(iri)
+                              if linked in self.entities and self.entities[linked].view == filter_view]
+            if not any(not self.entities[candidate].deleted and self.matches(self.entities[candidate], view_filters)
+                       for candidate in candidates):
+                return False
+        return True
+
+    def count(self, view: str, filters: List[Dict[str, any]] = None) -> int:
+        """ The expected number of rows of the view that match the filters.
+        """
+        self.index()
+        return sum(1 for iri in self.rows.get(view, [])
+                   if not self.entities[iri].deleted and self.row_matches(iri, view, filters or []))
+
+    def precompute(self, queries: Iterable[any]):
+        """ Computes the expected counts of the logical queries (with a view and filters).
+        """
+        self.expected = {query.name: self.count(query.view, query.filters) for query in queries if query.view}
+
+    def expected_count(self, query) -> Optional[int]:
+        """ The precomputed count of a logical query, or the count computed now if the query has a view.
+        """
+        if query.name in self.expected:
+            return self.expected[query.name]
+        return self.count(query.view, query.filters) if query.view else None
+
+    def expected_selectivity(self, query) -> Optional[float]:
+        count = self.expected_count(query)
+        total = self.count(query.view) if query.view else 0
+        return count / total if count is not None and total > 0 else None
+
+    def selectivity(self, view: str, filters: List[Dict[str, any]] = None) -> Optional[float]:
+        """ The expected fraction of the rows of the view that match the filters.
+        """
+        total = self.count(view)
+        return self.count(view, filters) / total if total > 0 else None
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'complete': self.complete,
+            'expected': self.expected,
+            'entities': {iri: [entity.view, entity.attributes, sorted(entity.links), entity.deleted]
+                         for iri, entity in self.entities.items()}
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, any]) -> 'CardinalityOracle':
+        oracle = CardinalityOracle()
+        oracle.complete = data['complete']
+        oracle.expected = data.get('expected', {})
+        oracle.entities = {iri: Entity(view, attributes, set(links), deleted)
+                           for iri, (view, attributes, links, deleted) in data['entities'].items()}
+        return oracle
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @staticmethod
+    def load(path: str) -> 'CardinalityOracle':
+        with open(path, 'r') as f:
+            oracle = CardinalityOracle.from_dict(json.load(f))
+        if not oracle.complete:
+            log.warning(f'The oracle {path} does not cover the whole dataset, expected counts are too low.')
+        return oracle
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Optional, Sequence, Dict, List
+
+from fairspace_api.api import FairspaceApi
+from metadata_scripts.benchmark import Summary, format_ms, format_table, timed, write_results
+from metadata_scripts.oracle import CardinalityOracle
+from metadata_scripts.sparql_query import QUERIES, result_size
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('parity_benchmark')
+
+BACKENDS = ['sparql', 'sql', 'view']
+
+
+@dataclass
+class LogicalQuery:
+    """ The same logical question, expressed for each back end:
+    a count query from `sparql_query.QUERIES`, a named query from `queries/queries.sql`
+    and a view with filters for the views API.
+    """
+    name: str
+    sparql: Optional[str] = None
+    sql: Optional[str] = None
+    view: Optional[str] = None
+    filters: Optional[List[Dict[str, any]]] = None
+
+
+LOGICAL_QUERIES = [
+    LogicalQuery('All samples',
+                 sparql='Count all samples',
+                 sql='count_samples',
+                 view='Sample'),
+    LogicalQuery('Samples by nature',
+                 sparql='Count samples by nature',
+                 sql='count_samples_by_nature',
+                 view='Sample',
+                 filters=[{'field': 'Sample.nature', 'values': ['RNA']}]),
+    LogicalQuery('Samples by nature and cellularity',
+                 sparql='Count samples by nature and cellularity',
+                 sql='count_samples_by_nature_and_cellularity',
+                 view='Sample',
+                 filters=[{'field': 'Sample.nature', 'values': ['RNA']},
+                          {'field': 'Sample.tumorCellularity', 'min': 21, 'max': 89}]),
+    LogicalQuery('Samples by nature, gender and event type',
+                 sparql='Count samples by nature, gender and event type',
+                 sql='count_samples_by_nature_gender_and_event_type',
+                 view='Sample',
+                 filters=[{'field': 'Sample.nature', 'values': ['RNA']},
+                          {'field': 'Subject.gender', 'values': ['Male']},
+                          {'field': 'TumorPathologyEvent.eventType', 'values': ['Neoplasm']}]),
+    LogicalQuery('Samples by nature, event type and analysis type',
+                 sparql='Count samples by nature, event type and analysis type',
+                 sql='count_samples_by_nature_analysis_and_event_type',
+                 view='Sample',
+                 filters=[{'field': 'Sample.nature', 'values': ['RNA']},
+                          {'field': 'TumorPathologyEvent.eventType', 'values': ['Neoplasm']},
+                          {'field': 'Collection.analysisType', 'values': ['RNA-seq']}]),
+    LogicalQuery('Files',
+                 sparql='Count files',
+                 sql='count_files',
+                 view='Collection',
+                 filters=[{'field': 'Collection.type', 'values': ['File']}]),
+    LogicalQuery('Files by path prefix',
+                 sparql='Count files with path prefix (STRSTARTS)',
+                 sql='count_files_with_prefix'),
+    LogicalQuery('Files by keyword',
+                 sparql='Count files filtered by keyword',
+                 sql='count_collection_by_keyword_distinct',
+                 view='Collection',
+                 filters=[{'field': 'Collection.keywords', 'values': ['philosophy']}]),
+    LogicalQuery('Files by sample nature and analysis type',
+                 sparql='Count files filtered by sample nature, analysis type',
+                 sql='count_collection_by_nature_and_analysis',
+                 view='Collection',
+                 filters=[{'field': 'Sample.nature', 'values': ['RNA']},
+                          {'field': 'Collection.analysisType', 'values': ['RNA-seq']}])
+]
+
+
+@dataclass
+class BackendResult:
+    backend: str
+    counts: List[int] = field(default_factory=list)
+    durations_ms: List[float] = field(default_factory=list)
+    timeout: bool = False
+
+    @property
+    def count(self) -> Optional[int]:
+        return self.counts[-1] if len(self.counts) > 0 else None
+
+    @property
+    def median_ms(self) -> Optional[float]:
+        return Summary.of(self.durations_ms).median
+
+
+@dataclass
+class ParityResult:
+    query: LogicalQuery
+    backends: Dict[str, BackendResult] = field(default_factory=dict)
+    # Count and selectivity computed from the generated data, see `oracle.CardinalityOracle`
+    expected: Optional[int] = None
+    selectivity: Optional[float] = None
+
+    @property
+    def consistent(self) -> bool:
+        counts = set(result.count for result in self.backends.values() if not result.timeout)
+        return len(counts) <= 1
+
+    @property
+    def correct(self) -> Optional[bool]:
+        if self.expected is None:
+            return None
+        return all(result.count == self.expected for result in self.backends.values() if not result.timeout)
+
+    @property
+    def fastest(self) -> Optional[str]:
+        candidates = {name: result.median_ms for name, result in self.backends.items()
+                      if result.median_ms is not None and not result.timeout}
+        return min(candidates, key=candidates.get) if len(candidates) > 0 else None
+
+
+class ParityBenchmark:
+    def __init__(self, api: FairspaceApi, connection=None, sql_queries=None):
+        self.api = api
+        self.connection = connection
+        self.sql_queries = {query.name: query for query in sql_queries or []}
+
+    def run_sparql(self, query: LogicalQuery, result: BackendResult):
+        contents = QUERIES[query.sparql]
+        results, duration = timed(self.api.query_sparql, contents['query'])
+        result.counts.append(result_size(results, contents['aggregate']))
+        result.durations_ms.append(duration)
+
+    def run_sql(self, query: LogicalQuery, result: BackendResult):
+        from metadata_scripts.sql_benchmark import fetch_value
+        with self.connection.cursor() as cursor:
+            value, duration = timed(fetch_value, cursor, self.sql_queries[query.sql].sql)
+        result.counts.append(value)
+        result.durations_ms.append(duration)
+
+    def run_view(self, query: LogicalQuery, result: BackendResult):
+        count, duration = timed(self.api.count, query.view, filters=query.filters)
+        result.counts.append(count.totalElements)
+        result.durations_ms.append(duration)
+        result.timeout = result.timeout or count.timeout
+
+    def run(self, queries: Sequence[LogicalQuery], repeat: int) -> List[ParityResult]:
+        results = []
+        for query in queries:
+            log.info(f'Running {query.name} ...')
+            parity = ParityResult(query)
+            runners = {
+                'sparql': self.run_sparql if query.sparql is not None else None,
+                'sql': self.run_sql if query.sql is not None and self.connection is not None else None,
+                'view': self.run_view if query.view is not None else None
+            }
+            for backend, runner in runners.items():
+                if runner is None:
+                    continue
+                backend_result = BackendResult(backend)
+                for _ in range(repeat):
+                    runner(query, backend_result)
+                parity.backends[backend] = backend_result
+            results.append(parity)
+        return results
+
+
+def report(results: Sequence[ParityResult]):
+    header = ['Query']
+    for backend in BACKENDS:
+        header += [f'{backend} count', f'{backend} median']
+    header += ['Expected', 'Selectivity', 'Agree', 'Fastest']
+    rows = []
+    for result in results:
+        row = [result.query.name]
+        for backend in BACKENDS:
+            backend_result = result.backends.get(backend)
+            if backend_result is None:
+                row += ['-', '-']
+                continue
+            count = f'{backend_result.count:,}' if backend_result.count is not None else '?'
+            row += [count + (' (timeout)' if backend_result.timeout else ''), format_ms(backend_result.median_ms)]
+        row += [f'{result.expected:,}' if result.expected is not None else '-',
+                f'{result.selectivity:.2%}' if result.selectivity is not None else '-',
+                ('yes' if result.consistent else 'NO') + (' (wrong)' if result.correct is False else ''),
+                result.fastest or '-']
+        rows.append(row)
+    print(format_table(header, rows))
+    inconsistent = [result.query.name for result in results if not result.consistent]
+    if len(inconsistent) > 0:
+        print()
+        print(f'Counts differ between back ends for: {", ".join(inconsistent)}')
+    wrong = [result.query.name for result in results if result.correct is False]
+    if len(wrong) > 0:
+        print()
+        print(f'Counts differ from the expected count for: {", ".join(wrong)}')
+
+
+def to_dict(result: ParityResult) -> Dict[str, any]:
+    return {
+        'name': result.query.name,
+        'consistent': result.consistent,
+        'expected': result.expected,
+        'selectivity': result.selectivity,
+        'correct': result.correct,
+        'fastest': result.fastest,
+        'backends': {name: {
+            'counts': backend.counts,
+            'durations_ms': backend.durations_ms,
+            'summary': Summary.of(backend.durations_ms).to_dict(),
+            'timeout': backend.timeout
+        } for name, backend in result.backends.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare result counts and latency of the same queries in SPARQL, SQL and the views API.')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per query and back end')
+    parser.add_argument('--database-url', default=os.environ.get('VIEW_DATABASE_URL'),
+                        help='PostgreSQL connection URL of the view database (default: $VIEW_DATABASE_URL), '
+                             'the SQL back end is skipped if not set')
+    parser.add_argument('--oracle', help='oracle written by `upload_test_data --oracle` to validate the counts')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    api = FairspaceApi()
+    connection = None
+    sql_queries = None
+    if args.database_url:
+        from metadata_scripts.sql_benchmark import connect, read_queries
+        connection = connect(args.database_url)
+        sql_queries = read_queries()
+    else:
+        log.info('No view database configured, skipping SQL queries.')
+    try:
+        results = ParityBenchmark(api, connection, sql_queries).run(LOGICAL_QUERIES, args.repeat)
+    finally:
+        if connection is not None:
+            connection.close()
+    if args.oracle:
+        oracle = CardinalityOracle.load(args.oracle)
+        for result in results:
+            result.expected = oracle.expected_count(result.query)
+            result.selectivity = oracle.expected_selectivity(result.query)
+
+    report(results)
+    if args.output:
+        write_results(args.output, {'repeat': args.repeat, 'queries': [to_dict(result) for result in results]})
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
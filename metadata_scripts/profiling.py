@@ -0,0 +1,195 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from metadata_scripts.benchmark import format_table
+
+log = logging.getLogger('profiling')
+
+
+def format_bytes(size: float) -> str:
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(size) < 1024 or unit == 'GiB':
+            return f'{size:,.0f} {unit}' if unit == 'B' else f'{size:,.1f} {unit}'
+        size /= 1024
+
+
+def format_seconds(duration: float) -> str:
+    if duration >= 1:
+        return f'{duration:,.1f}s'
+    return f'{1000 * duration:,.0f}ms'
+
+
+@dataclass
+class Measurement:
+    name: str
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_memory: int = 0
+
+    @property
+    def wait(self) -> float:
+        """ Wall time not spent on the CPU in this process, i.e., mostly network and server time.
+        """
+        return max(0.0, self.wall - self.cpu)
+
+
+@dataclass
+class PhaseMeasurement(Measurement):
+    batches: List[Measurement] = field(default_factory=list)
+
+
+class _Scope:
+    def __init__(self, measurement: Measurement, profile: Optional[cProfile.Profile]):
+        self.measurement = measurement
+        self.profile = profile
+        self.child_peak = 0
+        self.child_dumps: List[str] = []
+
+
+class PhaseProfiler:
+    """ Records wall time, CPU time and peak memory per phase and per batch.
+
+    Phases are the top level steps of a run, batches are repeated units of work
+    within a phase, e.g., the upload of a single directory.
+    When `profile_dir` is set, cProfile statistics are dumped per phase
+    (and per batch, if `profile_batches` is set) to that directory.
+    """
+    def __init__(self, enabled=False, profile_dir: Optional[str] = None, profile_batches=False):
+        self.enabled = enabled or profile_dir is not None
+        self.profile_dir = profile_dir
+        self.profile_batches = profile_batches and profile_dir is not None
+        self.phases: List[PhaseMeasurement] = []
+        self._stack: List[_Scope] = []
+
+    def _active_profile(self) -> Optional[cProfile.Profile]:
+        for scope in reversed(self._stack):
+            if scope.profile is not None:
+                return scope.profile
+        return None
+
+    def _dump_path(self, name: str) -> str:
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+        return os.path.join(self.profile_dir, f'{safe_name}.pstats')
+
+    @contextmanager
+    def _measure(self, measurement: Measurement, use_cprofile: bool, dump_name: Optional[str] = None):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if hasattr(tracemalloc, 'reset_peak'):
+            if self._stack:
+                # Keep the peak of the enclosing scope so far, before resetting it for this scope
+                parent = self._stack[-1]
+                parent.child_peak = max(parent.child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        # Only one profiler can be active at a time: pause the enclosing one.
+        outer_profile = self._active_profile()
+        profile = cProfile.Profile() if use_cprofile else None
+        scope = _Scope(measurement, profile)
+        self._stack.append(scope)
+        if profile is not None:
+            if outer_profile is not None:
+                outer_profile.disable()
+            profile.enable()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield measurement
+        finally:
+            measurement.wall = time.perf_counter() - start_wall
+            measurement.cpu = time.process_time() - start_cpu
+            measurement.peak_memory = max(tracemalloc.get_traced_memory()[1], scope.child_peak)
+            self._stack.pop()
+            if profile is not None:
+                profile.disable()
+                path = self._dump_path(dump_name or measurement.name)
+                stats = pstats.Stats(profile)
+                for child_dump in scope.child_dumps:
+                    stats.add(child_dump)
+                stats.dump_stats(path)
+                if outer_profile is not None:
+                    outer_profile.enable()
+            if self._stack:
+                parent = self._stack[-1]
+                parent.child_peak = max(parent.child_peak, measurement.peak_memory)
+                if profile is not None:
+                    parent.child_dumps.append(path)
+            if len(self._stack) == 0:
+                tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield None
+            return
+        if self.profile_dir is not None:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        measurement = PhaseMeasurement(name)
+        with self._measure(measurement, use_cprofile=self.profile_dir is not None):
+            yield measurement
+        self.phases.append(measurement)
+        log.info(f'Phase {name}: wall {format_seconds(measurement.wall)}, '
+                 f'CPU {format_seconds(measurement.cpu)}, peak memory {format_bytes(measurement.peak_memory)}.')
+
+    @contextmanager
+    def batch(self, name: str):
+        if not self.enabled or len(self._stack) == 0:
+            yield None
+            return
+        phase: PhaseMeasurement = self._stack[0].measurement
+        measurement = Measurement(f'{phase.name}.{name}')
+        dump_name = f'{phase.name}.{len(phase.batches):05d}.{name}'
+        with self._measure(measurement, use_cprofile=self.profile_batches, dump_name=dump_name):
+            yield measurement
+        phase.batches.append(measurement)
+
+    def summary(self) -> str:
+        header = ['Phase', 'Batches', 'Wall', 'CPU', 'Wait', 'CPU %', 'Peak memory', 'Slowest batch']
+        rows = []
+        for phase in self.phases:
+            slowest = max(phase.batches, key=lambda b: b.wall, default=None)
+            rows.append([
+                phase.name,
+                f'{len(phase.batches):,}',
+                format_seconds(phase.wall),
+                format_seconds(phase.cpu),
+                format_seconds(phase.wait),
+                f'{100 * phase.cpu / phase.wall:.0f}%' if phase.wall > 0 else '-',
+                format_bytes(phase.peak_memory),
+                format_seconds(slowest.wall) if slowest is not None else '-'
+            ])
+        total_wall = sum(phase.wall for phase in self.phases)
+        total_cpu = sum(phase.cpu for phase in self.phases)
+        rows.append([
+            'Total',
+            f'{sum(len(phase.batches) for phase in self.phases):,}',
+            format_seconds(total_wall),
+            format_seconds(total_cpu),
+            format_seconds(max(0.0, total_wall - total_cpu)),
+            f'{100 * total_cpu / total_wall:.0f}%' if total_wall > 0 else '-',
+            format_bytes(max((phase.peak_memory for phase in self.phases), default=0)),
+            ''
+        ])
+        return format_table(header, rows)
+
+    def report(self, output: Optional[str] = None):
+        if not self.enabled:
+            return
+        log.info('Profile summary:\n' + self.summary())
+        if output is not None:
+            with open(output, 'w') as f:
+                json.dump(self.to_dict(), f, indent=2)
+            log.info(f'Profile written to {output}.')
+        if self.profile_dir is not None:
+            log.info(f'cProfile statistics written to {self.profile_dir}.')
+
+    def to_dict(self) -> Dict[str, any]:
+        return {'phases': [asdict(phase) for phase in self.phases]}
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+
+from fairspace_api.api import FairspaceApi
+from metadata_scripts.benchmark import Summary, format_ms, format_table, write_results, read_results, \
+    bootstrap_change, relative_change, format_change
+from metadata_scripts.parity_benchmark import LOGICAL_QUERIES
+from metadata_scripts.retrieve_view import time_view
+from metadata_scripts.sparql_query import time_queries
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('regression')
+
+DEFAULT_RESULTS_DIR = 'benchmark_results'
+
+
+def run_suite(api: FairspaceApi, repeat: int, collection_iri: str = None) -> Dict[str, Tuple[int, List[float]]]:
+    """ Runs the SPARQL queries and the view queries of the parity benchmark `repeat` times.
+
+    :return: the result size and durations in milliseconds per query.
+    """
+    results = {}
+    log.info('Running SPARQL queries ...')
+    for name, (size, durations) in time_queries(api, repeat, collection_iri).items():
+        results[f'sparql: {name}'] = (size, durations)
+    log.info('Running view queries ...')
+    for query in LOGICAL_QUERIES:
+        if query.view is None:
+            continue
+        timing = time_view(api, query.view, query.filters, repeat)
+        results[f'view page: {query.name}'] = (timing.count, timing.page_ms)
+        results[f'view count: {query.name}'] = (timing.count, timing.count_ms)
+    return results
+
+
+def default_size() -> str:
+    """ Describes the dataset size by the configured counts, e.g., '1000-1500-3000-5x50x500'.
+    """
+    counts = [os.environ.get(variable, default) for variable, default in [
+        ('SUBJECT_COUNT', 1000), ('EVENT_COUNT', 1500), ('SAMPLE_COUNT', 3000)]]
+    files = [os.environ.get(variable, default) for variable, default in [
+        ('COLLECTION_COUNT', 5), ('DIRS_PER_COLLECTION', 50), ('FILES_PER_DIR', 500)]]
+    return '-'.join(str(count) for count in counts) + '-' + 'x'.join(str(count) for count in files)
+
+
+@dataclass
+class RunKey:
+    """ Identifies comparable benchmark runs: the Fairspace version and the dataset they were run on.
+    """
+    version: str
+    seed: str
+    size: str
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(*[re.sub(r'[^\w.-]', '_', part) for part in [self.version, f'{self.seed}_{self.size}']])
+
+    def __str__(self):
+        return f'version {self.version}, seed {self.seed}, size {self.size}'
+
+
+class ResultsStore:
+    """ Stores benchmark runs as JSON files in `<results dir>/<version>/<seed>_<size>/<timestamp>.json`.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def save(self, key: RunKey, repeat: int, results: Dict[str, Tuple[int, List[float]]]) -> str:
+        directory = os.path.join(self.directory, key.directory)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+        write_results(path, {
+            'key': key.__dict__,
+            'repeat': repeat,
+            'queries': {name: {'count': count, 'durations_ms': durations}
+                        for name, (count, durations) in results.items()}
+        })
+        return path
+
+    def runs(self, key: RunKey) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, key.directory, '*.json')))
+
+    def latest(self, key: RunKey) -> Optional[str]:
+        runs = self.runs(key)
+        return runs[-1] if len(runs) > 0 else None
+
+
+@dataclass
+class Comparison:
+    query: str
+    baseline_ms: List[float]
+    current_ms: List[float]
+    low: Optional[float] = None
+    high: Optional[float] = None
+
+    @property
+    def change(self) -> Optional[float]:
+        return relative_change(Summary.of(self.baseline_ms).median, Summary.of(self.current_ms).median)
+
+    @property
+    def difference_ms(self) -> Optional[float]:
+        baseline, current = Summary.of(self.baseline_ms).median, Summary.of(self.current_ms).median
+        return current - baseline if baseline is not None and current is not None else None
+
+    def status(self, threshold: float, min_difference_ms: float = 0) -> str:
+        """ A regression (or improvement) if the whole confidence interval of the change exceeds the threshold,
+        and the medians differ by at least `min_difference_ms`.
+        """
+        if self.low is None:
+            return 'missing'
+        if abs(self.difference_ms) < min_difference_ms:
+            return 'ok'
+        if self.low > threshold:
+            return 'REGRESSION'
+        if self.high < -threshold:
+            return 'improved'
+        if self.low > 0 or self.high < 0:
+            return 'changed'
+        return 'ok'
+
+
+def compare(baseline: Dict[str, any], current: Dict[str, any], confidence: float) -> List[Comparison]:
+    comparisons = []
+    for name in list(baseline['queries'].keys()) + [n for n in current['queries'].keys()
+                                                     if n not in baseline['queries']]:
+        baseline_ms = baseline['queries'].get(name, {}).get('durations_ms', [])
+        current_ms = current['queries'].get(name, {}).get('durations_ms', [])
+        low, high = bootstrap_change(baseline_ms, current_ms, confidence, seed=0)
+        comparisons.append(Comparison(name, baseline_ms, current_ms, low, high))
+    return comparisons
+
+
+def report(comparisons: List[Comparison], threshold: float, confidence: float, min_difference_ms: float):
+    rows = []
+    for comparison in comparisons:
+        interval = f'{format_change(comparison.low)} .. {format_change(comparison.high)}' \
+            if comparison.low is not None else '-'
+        rows.append([comparison.query,
+                     format_ms(Summary.of(comparison.baseline_ms).median),
+                     format_ms(Summary.of(comparison.current_ms).median),
+                     format_change(comparison.change),
+                     interval,
+                     comparison.status(threshold, min_difference_ms)])
+    print(format_table(['Query', 'Baseline', 'Current', 'Change', f'{confidence:.0%} interval', 'Status'], rows))
+
+
+def add_key_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--version', default=os.environ.get('FAIRSPACE_VERSION', 'unknown'),
+                        help='Fairspace version (default: $FAIRSPACE_VERSION)')
+    parser.add_argument('--seed', default=os.environ.get('RANDOM_SEED', 'none'),
+                        help='seed the dataset was generated with (default: $RANDOM_SEED)')
+    parser.add_argument('--size', default=os.environ.get('DATASET_SIZE', default_size()),
+                        help='dataset size (default: $DATASET_SIZE or derived from the count variables)')
+    parser.add_argument('--results-dir', default=os.environ.get('RESULTS_DIR', DEFAULT_RESULTS_DIR),
+                        help=f'directory of the results store (default: $RESULTS_DIR or {DEFAULT_RESULTS_DIR})')
+
+
+def record_main():
+    parser = argparse.ArgumentParser(
+        description='Run the SPARQL and view queries repeatedly and store the latencies in the results store.')
+    add_key_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=10, help='number of measured runs per query')
+    parser.add_argument('--warmup', type=int, default=1, help='number of unmeasured runs per query')
+    parser.add_argument('--collection', help='IRI of the collection to use in the path prefix queries')
+    args = parser.parse_args()
+
+    key = RunKey(args.version, args.seed, args.size)
+    api = FairspaceApi()
+    if args.warmup > 0:
+        log.info('Warming up ...')
+        run_suite(api, args.warmup, args.collection)
+    results = run_suite(api, args.repeat, args.collection)
+    path = ResultsStore(args.results_dir).save(key, args.repeat, results)
+    log.info(f'Results for {key} written to {path}.')
+
+
+def compare_main():
+    parser = argparse.ArgumentParser(
+        description='Compare stored benchmark runs and fail on significant latency regressions.')
+    add_key_arguments(parser)
+    parser.add_argument('--baseline-version', help='Fairspace version to compare with')
+    parser.add_argument('--baseline', help='JSON file of the baseline run (instead of --baseline-version)')
+    parser.add_argument('--current', help='JSON file of the current run (default: the latest run of --version)')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative latency increase that counts as a regression (default: 0.1)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level of the intervals')
+    parser.add_argument('--min-difference-ms', type=float, default=1.0,
+                        help='ignore changes of the median smaller than this number of milliseconds (default: 1)')
+    args = parser.parse_args()
+
+    store = ResultsStore(args.results_dir)
+    current_path = args.current or store.latest(RunKey(args.version, args.seed, args.size))
+    baseline_path = args.baseline or (store.latest(RunKey(args.baseline_version, args.seed, args.size))
+                                      if args.baseline_version else None)
+    if baseline_path is None or current_path is None:
+        log.error('No stored results found to compare. Please run record_benchmark first, '
+                  'and specify --baseline-version or --baseline.')
+        sys.exit(1)
+    log.info(f'Comparing {current_path} with baseline {baseline_path} ...')
+    baseline = read_results(baseline_path)
+    current = read_results(current_path)
+    if baseline['key']['size'] != current['key']['size'] or baseline['key']['seed'] != current['key']['seed']:
+        log.warning('The runs were done on different datasets.')
+
+    comparisons = compare(baseline, current, args.confidence)
+    report(comparisons, args.threshold, args.confidence, args.min_difference_ms)
+    regressions = [c.query for c in comparisons
+                   if c.status(args.threshold, args.min_difference_ms) == 'REGRESSION']
+    if len(regressions) > 0:
+        log.error(f'{len(regressions)} queries are more than {args.threshold:.0%} slower '
+                  f'(with {args.confidence:.0%} confidence): {", ".join(regressions)}')
+        sys.exit(1)
+    log.info('No significant regressions.')
+
+
+if __name__ == '__main__':
+    compare_main()
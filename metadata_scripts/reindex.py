@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import sys
+
+from dotenv import load_dotenv
+
+from fairspace_api.api import FairspaceApi, ReindexResult
+from metadata_scripts.benchmark import format_table, write_results
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('reindex')
+
+
+def report_reindex(result: ReindexResult):
+    if not result.converged:
+        log.warning(f'Reindexing did not finish after {result.duration:,.0f}s.')
+    else:
+        log.info(f'Reindexing finished in {result.duration:,.0f}s.')
+    rows = [[view, f'{count:,}', f'{result.rows_per_second(view):,.0f}'] for view, count in result.counts.items()]
+    total = sum(result.counts.values())
+    rows.append(['Total', f'{total:,}', f'{total / result.duration if result.duration > 0 else 0:,.0f}'])
+    log.info('Reindex throughput:\n' + format_table(['View', 'Rows', 'Rows/s'], rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recreate the view database and wait until it is consistent.')
+    parser.add_argument('--no-wait', action='store_true', help='only trigger reindexing')
+    parser.add_argument('--poll-interval', type=float, default=5, help='seconds between status polls')
+    parser.add_argument('--stable-polls', type=int, default=3,
+                        help='number of polls with unchanged view counts after which reindexing is considered '
+                             'finished, if the server does not report a maintenance status')
+    parser.add_argument('--grace-period', type=float, default=60,
+                        help='seconds during which view counts equal to those before reindexing are not accepted '
+                             'as finished, if the server does not report a maintenance status (default: 60)')
+    parser.add_argument('--timeout', type=float, default=3600, help='maximum number of seconds to wait')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    load_dotenv()
+    api = FairspaceApi()
+    log.info('Triggering recreation of a view database from the RDF database...')
+    result = api.reindex(wait=not args.no_wait,
+                         poll_interval=args.poll_interval,
+                         stable_polls=args.stable_polls,
+                         grace_period=args.grace_period,
+                         timeout=args.timeout)
+    if result is None:
+        log.info('Reindexing started!')
+        return
+    report_reindex(result)
+    if args.output:
+        write_results(args.output, {
+            'duration': result.duration,
+            'converged': result.converged,
+            'views': {view: {'rows': count, 'rows_per_second': result.rows_per_second(view)}
+                      for view, count in result.counts.items()}
+        })
+    if not result.converged:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
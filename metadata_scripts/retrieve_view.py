@@ -2,6 +2,8 @@
 import json
 import sys
 import time
+from dataclasses import dataclass, field
+from typing import List, Optional
 
 from fairspace_api.api import FairspaceApi, Page
 
@@ -26,6 +28,32 @@ def display_page(page: Page):
         print('More results available ...')
 
 
+@dataclass
+class ViewTiming:
+    view: str
+    filters: Optional[list] = None
+    count: Optional[int] = None
+    timeout: bool = False
+    page_ms: List[float] = field(default_factory=list)
+    count_ms: List[float] = field(default_factory=list)
+
+
+def time_view(api: FairspaceApi, view: str, filters=None, repeat=1, size=20) -> ViewTiming:
+    """ Retrieves the first page and the count of a view `repeat` times, measuring the durations in milliseconds.
+    """
+    timing = ViewTiming(view, filters)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        api.retrieve_view_page(view, page=1, size=size, filters=filters)
+        timing.page_ms.append(1000 * (time.perf_counter() - start))
+        start = time.perf_counter()
+        count = api.count(view, filters=filters)
+        timing.count_ms.append(1000 * (time.perf_counter() - start))
+        timing.count = count.totalElements
+        timing.timeout = timing.timeout or count.timeout
+    return timing
+
+
 def main():
     view = sys.argv[1] if len(sys.argv) > 1 else 'config'
     api = FairspaceApi()
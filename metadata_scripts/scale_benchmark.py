@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import List, Dict, Sequence, Optional
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+from metadata_scripts.benchmark import Summary, format_ms, format_table, write_results
+from metadata_scripts.regression import run_suite
+from metadata_scripts.upload_test_data import TestData
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('scale_benchmark')
+
+
+@dataclass
+class ScaleStep:
+    scale: float
+    subjects: int
+    events: int
+    samples: int
+    files: int
+    durations: Dict[str, List[float]] = field(default_factory=dict)
+    counts: Dict[str, Optional[int]] = field(default_factory=dict)
+
+    def median(self, query: str) -> Optional[float]:
+        return Summary.of(self.durations.get(query, [])).median
+
+
+@dataclass
+class ScaleFit:
+    query: str
+    exponent: Optional[float]
+    r_squared: Optional[float]
+
+    def is_superlinear(self, threshold: float) -> bool:
+        return self.exponent is not None and self.exponent > threshold
+
+
+def fit_power_law(sizes: Sequence[float], latencies: Sequence[float]) -> (Optional[float], Optional[float]):
+    """ Fits latency = a * size^k by least squares on a log-log scale.
+
+    :return: the exponent k and the coefficient of determination, or None if there are fewer than 2 points.
+    """
+    points = [(math.log(size), math.log(latency)) for size, latency in zip(sizes, latencies)
+              if size > 0 and latency is not None and latency > 0]
+    if len(points) < 2:
+        return None, None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    if sxx == 0:
+        return None, None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / sxx
+    intercept = mean_y - slope * mean_x
+    ss_total = sum((y - mean_y) ** 2 for _, y in points)
+    ss_residual = sum((y - (intercept + slope * x)) ** 2 for x, y in points)
+    r_squared = 1 - ss_residual / ss_total if ss_total > 0 else 1.0
+    return slope, r_squared
+
+
+class ScaleBenchmark:
+    def __init__(self, base: TestData, manifest_path: str, repeat: int):
+        self.base = base
+        self.manifest_path = manifest_path
+        self.repeat = repeat
+        self.steps: List[ScaleStep] = []
+
+    def load(self, previous_scale: float, scale: float) -> TestData:
+        """ Grows the dataset from `previous_scale` to `scale` times the base configuration.
+        """
+        testdata = TestData()
+        testdata.append = previous_scale > 0
+        testdata.manifest_path = self.manifest_path
+        testdata.wait_for_reindex = True
+        factor = scale - previous_scale
+        testdata.subject_count = round(self.base.subject_count * factor)
+        testdata.event_count = round(self.base.event_count * factor)
+        testdata.sample_count = round(self.base.sample_count * factor)
+        testdata.collection_count = round(self.base.collection_count * factor)
+        testdata.dirs_per_collection = self.base.dirs_per_collection
+        testdata.files_per_dir = self.base.files_per_dir
+        testdata.tree_depth = self.base.tree_depth
+        testdata.tree_fan_out = self.base.tree_fan_out
+        testdata.file_distribution = self.base.file_distribution
+        testdata.file_skew = self.base.file_skew
+        log.info(f'Growing the dataset to scale {scale:g} ...')
+        testdata.run()
+        return testdata
+
+    def measure(self, testdata: TestData, scale: float) -> ScaleStep:
+        step = ScaleStep(
+            scale=scale,
+            subjects=len(testdata.subject_ids),
+            events=len(testdata.event_ids),
+            samples=len(testdata.sample_ids),
+            files=len(testdata.collection_names) * self.base.tree_shape().total_files
+        )
+        # Use the first collection in the path prefix queries
+        collection_iri = str(testdata.root[quote(testdata.collection_names[0])]) \
+            if len(testdata.collection_names) > 0 else None
+        log.info(f'Running queries at scale {scale:g} ...')
+        for name, (count, durations) in run_suite(testdata.api, self.repeat, collection_iri).items():
+            step.durations[name] = durations
+            step.counts[name] = count
+        return step
+
+    def run(self, scales: Sequence[float], current_scale: float = 0):
+        previous_scale = current_scale
+        for scale in scales:
+            testdata = self.load(previous_scale, scale)
+            self.steps.append(self.measure(testdata, scale))
+            previous_scale = scale
+
+    def fits(self) -> List[ScaleFit]:
+        queries = list(self.steps[0].durations.keys()) if len(self.steps) > 0 else []
+        fits = []
+        for query in queries:
+            exponent, r_squared = fit_power_law([step.files for step in self.steps],
+                                                [step.median(query) for step in self.steps])
+            fits.append(ScaleFit(query, exponent, r_squared))
+        return fits
+
+
+def report(benchmark: ScaleBenchmark, threshold: float):
+    steps = benchmark.steps
+    print(format_table(['Scale', 'Subjects', 'Events', 'Samples', 'Files'],
+                       [[f'{step.scale:g}', f'{step.subjects:,}', f'{step.events:,}', f'{step.samples:,}',
+                         f'{step.files:,}'] for step in steps]))
+    print()
+    header = ['Query'] + [f'x{step.scale:g}' for step in steps] + ['Exponent', 'R²', '']
+    rows = []
+    for fit in benchmark.fits():
+        rows.append([fit.query] +
+                    [format_ms(step.median(fit.query)) for step in steps] +
+                    [f'{fit.exponent:.2f}' if fit.exponent is not None else '-',
+                     f'{fit.r_squared:.2f}' if fit.r_squared is not None else '-',
+                     'SUPERLINEAR' if fit.is_superlinear(threshold) else ''])
+    print(format_table(header, rows))
+    superlinear = [fit.query for fit in benchmark.fits() if fit.is_superlinear(threshold)]
+    if len(superlinear) > 0:
+        print()
+        print(f'Queries with latency growing faster than size^{threshold:g}:')
+        for query in superlinear:
+            print(f'  {query}')
+
+
+def write_csv(path: str, benchmark: ScaleBenchmark):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['query', 'scale', 'files', 'samples', 'count', 'median_ms', 'p95_ms'])
+        for step in benchmark.steps:
+            for query, durations in step.durations.items():
+                summary = Summary.of(durations)
+                writer.writerow([query, step.scale, step.files, step.samples, step.counts.get(query),
+                                 summary.median, summary.p95])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Grow the dataset in steps and measure how query latency scales with data size.')
+    parser.add_argument('--scales', default='1,2,5',
+                        help='comma separated, increasing multiples of the configured counts '
+                             '(SUBJECT_COUNT, SAMPLE_COUNT, COLLECTION_COUNT, ...) to measure at')
+    parser.add_argument('--current-scale', type=float, default=0,
+                        help='scale of the dataset in the manifest, 0 to start with a new dataset')
+    parser.add_argument('--manifest', default='scale_benchmark_manifest.json',
+                        help='manifest of the dataset that is grown')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per query and step')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='flag queries for which latency grows faster than size to this power')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--csv', help='CSV file with the median latency per query and step, e.g., for plotting')
+    args = parser.parse_args()
+
+    load_dotenv()
+    scales = [float(scale) for scale in args.scales.split(',')]
+    if scales != sorted(scales) or scales[0] <= args.current_scale:
+        parser.error('Scales must be increasing and larger than the current scale.')
+    benchmark = ScaleBenchmark(TestData(), args.manifest, args.repeat)
+    benchmark.run(scales, args.current_scale)
+
+    report(benchmark, args.threshold)
+    if args.csv:
+        write_csv(args.csv, benchmark)
+    if args.output:
+        write_results(args.output, {
+            'steps': [step.__dict__ for step in benchmark.steps],
+            'fits': [fit.__dict__ for fit in benchmark.fits()]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import logging
+import re
 import time
+from typing import Dict, List, Tuple
 
 from fairspace_api.api import FairspaceApi
 
@@ -8,14 +10,17 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(me
 log = logging.getLogger('sparql')
 
 
-def sparql_query():
-    api = FairspaceApi()
+# Collection used in the path prefix queries
+EXAMPLE_COLLECTION = 'http://localhost:8080/api/webdav/collection%202020-11-16-2'
+
+# Filter on deleted entities, included in every query
+DELETION_FILTER = re.compile(r'^\s*FILTER NOT EXISTS \{ \?\w+ fs:dateDeleted \?anyDateDeleted \}\s*\n', re.MULTILINE)
 
-    # Query for samples
-    queries = {
+# Query for samples
+QUERIES = {
 
-        'First 500 samples': {
-            'query': """
+    'First 500 samples': {
+        'query': """
     PREFIX curie: <https://institut-curie.org/ontology#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
 
@@ -27,11 +32,11 @@ def sparql_query():
     # ORDER BY ?sample
     LIMIT 500
     """,
-            'aggregate': False
-        },
+        'aggregate': False
+    },
 
-        'Count all samples': {
-            'query': """
+    'Count all samples': {
+        'query': """
     PREFIX curie: <https://institut-curie.org/ontology#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
 
@@ -41,11 +46,11 @@ def sparql_query():
       FILTER NOT EXISTS { ?sample fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True
-        },
+        'aggregate': True
+    },
 
-        'Select samples by nature, gender and event type': {
-            'query': """
+    'Select samples by nature, gender and event type': {
+        'query': """
     PREFIX curie:  <https://institut-curie.org/ontology#>
     PREFIX fs:     <https://fairspace.nl/ontology#>
     PREFIX ncit:   <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
@@ -64,11 +69,11 @@ def sparql_query():
     # ORDER BY ?sample
     LIMIT 500
     """,
-            'aggregate': False
-        },
+        'aggregate': False
+    },
 
-        'Count samples by nature, gender and event type': {
-            'query': """
+    'Count samples by nature, gender and event type': {
+        'query': """
     PREFIX curie:  <https://institut-curie.org/ontology#>
     PREFIX fs:     <https://fairspace.nl/ontology#>
     PREFIX ncit:   <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
@@ -85,11 +90,11 @@ def sparql_query():
       FILTER NOT EXISTS { ?sample fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True
-        },
+        'aggregate': True
+    },
 
-        'First 500 samples by nature': {
-            'query': """
+    'First 500 samples by nature': {
+        'query': """
     PREFIX curie: <https://institut-curie.org/ontology#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX ncit: <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
@@ -103,11 +108,11 @@ def sparql_query():
     # ORDER BY ?sample
     LIMIT 500
     """,
-            'aggregate': False
-        },
+        'aggregate': False
+    },
 
-        'Count samples by nature': {
-            'query': """
+    'Count samples by nature': {
+        'query': """
     PREFIX curie: <https://institut-curie.org/ontology#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX ncit: <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
@@ -119,11 +124,11 @@ def sparql_query():
       FILTER NOT EXISTS { ?sample fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True
-        },
+        'aggregate': True
+    },
 
-        'First 500 samples by nature and cellularity': {
-            'query': """
+    'First 500 samples by nature and cellularity': {
+        'query': """
     PREFIX curie: <https://institut-curie.org/ontology#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX ncit: <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
@@ -139,11 +144,11 @@ def sparql_query():
     # ORDER BY ?sample
     LIMIT 500
     """,
-            'aggregate': False
-        },
+        'aggregate': False
+    },
 
-        'Count samples by nature and cellularity': {
-            'query': """
+    'Count samples by nature and cellularity': {
+        'query': """
     PREFIX curie: <https://institut-curie.org/ontology#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX ncit: <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
@@ -157,15 +162,15 @@ def sparql_query():
       FILTER NOT EXISTS { ?sample fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True
-        },
+        'aggregate': True
+    },
 
-        'First 500 samples by nature, event type and analysis type': {
-            'query': """
+    'First 500 samples by nature, event type and analysis type': {
+        'query': """
     PREFIX curie: <https://institut-curie.org/ontology#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX ncit: <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
-    PREFIX analysis: <https://institut-curie.org/analysis#>
+    PREFIX osiris: <https://institut-curie.org/osiris#>
 
     SELECT DISTINCT ?sample
     WHERE {
@@ -174,22 +179,22 @@ def sparql_query():
       ?sample curie:diagnosis ?event .
       ?event curie:eventType ncit:C3262 .
       ?location curie:sample ?sample .
-      ?location curie:analysisType analysis:O6-12 .
+      ?location curie:analysisType osiris:O6-12 .
       FILTER NOT EXISTS { ?sample fs:dateDeleted ?anyDateDeleted }
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     # ORDER BY ?sample
     LIMIT 500
     """,
-            'aggregate': False
-        },
+        'aggregate': False
+    },
 
-        'Count samples by nature, event type and analysis type': {
-            'query': """
+    'Count samples by nature, event type and analysis type': {
+        'query': """
     PREFIX curie: <https://institut-curie.org/ontology#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX ncit: <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
-    PREFIX analysis: <https://institut-curie.org/analysis#>
+    PREFIX osiris: <https://institut-curie.org/osiris#>
 
     SELECT COUNT(DISTINCT ?sample)
     WHERE {
@@ -198,16 +203,16 @@ def sparql_query():
       ?sample curie:diagnosis ?event .
       ?event curie:eventType ncit:C3262 .
       ?location curie:sample ?sample .
-      ?location curie:analysisType analysis:O6-12 .
+      ?location curie:analysisType osiris:O6-12 .
       FILTER NOT EXISTS { ?sample fs:dateDeleted ?anyDateDeleted }
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True
-        },
+        'aggregate': True
+    },
 
-        'First 500 files': {
-            'query': """
+    'First 500 files': {
+        'query': """
     PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
 
@@ -219,12 +224,12 @@ def sparql_query():
     # ORDER BY ?location
     LIMIT 500
     """,
-            'aggregate': False,
-            'skip': False
-        },
+        'aggregate': False,
+        'skip': False
+    },
 
-        'Count files': {
-            'query': """
+    'Count files': {
+        'query': """
     PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX dcat:  <http://www.w3.org/ns/dcat#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
@@ -235,12 +240,12 @@ def sparql_query():
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True,
-            'skip': False
-        },
+        'aggregate': True,
+        'skip': False
+    },
 
-        'First 500 files with path prefix (STRSTARTS)': {
-            'query': """
+    'First 500 files with path prefix (STRSTARTS)': {
+        'query': """
     PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
 
@@ -253,12 +258,12 @@ def sparql_query():
     # ORDER BY ?location
     LIMIT 500
     """,
-            'aggregate': False,
-            'skip': False
-        },
+        'aggregate': False,
+        'skip': False
+    },
 
-        'Count files with path prefix (STRSTARTS)': {
-            'query': """
+    'Count files with path prefix (STRSTARTS)': {
+        'query': """
     PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
 
@@ -269,12 +274,12 @@ def sparql_query():
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True,
-            'skip': False
-        },
+        'aggregate': True,
+        'skip': False
+    },
 
-        'First 500 files with path prefix (belongsTo)': {
-            'query': """
+    'First 500 files with path prefix (belongsTo)': {
+        'query': """
     PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
 
@@ -287,12 +292,12 @@ def sparql_query():
     # ORDER BY ?location
     LIMIT 500
     """,
-            'aggregate': False,
-            'skip': False
-        },
+        'aggregate': False,
+        'skip': False
+    },
 
-        'Count files with path prefix (belongsTo)': {
-            'query': """
+    'Count files with path prefix (belongsTo)': {
+        'query': """
     PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX dcat:  <http://www.w3.org/ns/dcat#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
@@ -304,15 +309,15 @@ def sparql_query():
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True,
-            'skip': False
-        },
+        'aggregate': True,
+        'skip': False
+    },
 
-        'Files filtered by sample nature, analysis type': {
-            'query': """
+    'Files filtered by sample nature, analysis type': {
+        'query': """
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX curie: <https://institut-curie.org/ontology#>
-    PREFIX analysis: <https://institut-curie.org/analysis#>
+    PREFIX osiris: <https://institut-curie.org/osiris#>
     PREFIX ncit: <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
 
     SELECT DISTINCT ?location
@@ -320,20 +325,20 @@ def sparql_query():
       ?location a fs:File .
       ?location curie:sample ?sample .
       ?sample curie:isOfNature ncit:C812 .
-      ?location curie:analysisType analysis:O6-12 .
+      ?location curie:analysisType osiris:O6-12 .
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     # ORDER BY ?location
     LIMIT 500
     """,
-            'aggregate': False
-        },
+        'aggregate': False
+    },
 
-        'Count files filtered by sample nature, analysis type': {
-            'query': """
+    'Count files filtered by sample nature, analysis type': {
+        'query': """
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX curie: <https://institut-curie.org/ontology#>
-    PREFIX analysis: <https://institut-curie.org/analysis#>
+    PREFIX osiris: <https://institut-curie.org/osiris#>
     PREFIX ncit: <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
 
     SELECT count(DISTINCT ?location)
@@ -341,15 +346,15 @@ def sparql_query():
       ?location a fs:File .
       ?location curie:sample ?sample .
       ?sample curie:isOfNature ncit:C812 .
-      ?location curie:analysisType analysis:O6-12 .
+      ?location curie:analysisType osiris:O6-12 .
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True
-        },
+        'aggregate': True
+    },
 
-        'Files filtered by keyword': {
-            'query': """
+    'Files filtered by keyword': {
+        'query': """
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX dcat:  <http://www.w3.org/ns/dcat#>
 
@@ -362,11 +367,11 @@ def sparql_query():
     # ORDER BY ?location
     LIMIT 500
     """,
-            'aggregate': False
-        },
+        'aggregate': False
+    },
 
-        'Count files filtered by keyword': {
-            'query': """
+    'Count files filtered by keyword': {
+        'query': """
     PREFIX fs:    <https://fairspace.nl/ontology#>
     PREFIX dcat:  <http://www.w3.org/ns/dcat#>
 
@@ -377,11 +382,11 @@ def sparql_query():
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True
-        },
+        'aggregate': True
+    },
 
-        'Count files linked to samples': {
-            'query': """
+    'Count files linked to samples': {
+        'query': """
     PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX dcat:  <http://www.w3.org/ns/dcat#>
     PREFIX fs:    <https://fairspace.nl/ontology#>
@@ -397,11 +402,42 @@ def sparql_query():
       FILTER NOT EXISTS { ?location fs:dateDeleted ?anyDateDeleted }
     }
     """,
-            'aggregate': True
-        },
+        'aggregate': True
+    },
+
+    'Count sample ancestors': {
+        'query': """
+    PREFIX curie: <https://institut-curie.org/ontology#>
+    PREFIX fs:    <https://fairspace.nl/ontology#>
+
+    SELECT COUNT(?ancestor)
+    WHERE {
+      ?sample a curie:BiologicalSample .
+      ?sample curie:isChildOf+ ?ancestor .
+      FILTER NOT EXISTS { ?sample fs:dateDeleted ?anyDateDeleted }
+    }
+    """,
+        'aggregate': True
+    },
 
-        'Sample topographies': {
-            'query': """
+    'Count samples derived from blood': {
+        'query': """
+    PREFIX curie: <https://institut-curie.org/ontology#>
+    PREFIX fs:    <https://fairspace.nl/ontology#>
+    PREFIX ncit:  <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
+
+    SELECT COUNT(DISTINCT ?sample)
+    WHERE {
+      ?ancestor curie:isOfNature ncit:C12434 .
+      ?sample curie:isChildOf+ ?ancestor .
+      FILTER NOT EXISTS { ?sample fs:dateDeleted ?anyDateDeleted }
+    }
+    """,
+        'aggregate': True
+    },
+
+    'Sample topographies': {
+        'query': """
     PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX curie: <https://institut-curie.org/ontology#>
 
@@ -411,11 +447,63 @@ def sparql_query():
       ?topography rdfs:label ?label
     }
     """,
-            'aggregate': False
-        }
+        'aggregate': False
     }
+}
+
+
+def result_size(results, aggregate: bool) -> int:
+    """ Returns the aggregate value of an aggregate query, or the number of results otherwise.
+    """
+    bindings = results['results']['bindings']
+    if aggregate:
+        if len(bindings) == 0:
+            return 0
+        return int(next(iter(bindings[0].values()))['value'])
+    return len(bindings)
+
+
+def query_for_collection(query: str, collection_iri: str) -> str:
+    """ Replaces the example collection in a path prefix query by the given collection.
+    """
+    return query.replace(EXAMPLE_COLLECTION, collection_iri)
+
+
+def without_deletion_filter(query: str) -> str:
+    """ Removes the filters on deleted entities from a query, which then also matches deleted entities.
+    """
+    return DELETION_FILTER.sub('', query)
+
+
+def time_queries(api: FairspaceApi, repeat=1, collection_iri: str = None,
+                 deletion_filter=True) -> Dict[str, Tuple[int, List[float]]]:
+    """ Runs each query that is not skipped `repeat` times.
+
+    :return: the result size and durations in milliseconds per query.
+    """
+    results = {}
+    for name, contents in QUERIES.items():
+        if contents.get('skip', False):
+            continue
+        query = contents['query']
+        if collection_iri is not None:
+            query = query_for_collection(query, collection_iri)
+        if not deletion_filter:
+            query = without_deletion_filter(query)
+        durations = []
+        size = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            size = result_size(api.query_sparql(query), contents['aggregate'])
+            durations.append(1000 * (time.perf_counter() - start))
+        results[name] = (size, durations)
+    return results
+
+
+def sparql_query():
+    api = FairspaceApi()
 
-    for name, contents in queries.items():
+    for name, contents in QUERIES.items():
         print(name)
         if 'skip' in contents and contents['skip']:
             print('(Skipped)\n')
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import logging
+import math
+import random
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Sequence, Tuple
+
+from fairspace_api.api import FairspaceApi
+from metadata_scripts.benchmark import Summary, format_ms, format_table, timed, write_results
+from metadata_scripts.sparql_query import EXAMPLE_COLLECTION, result_size
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('sparql_variants')
+
+PREFIXES = """
+PREFIX rdfs:   <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX dcat:   <http://www.w3.org/ns/dcat#>
+PREFIX fs:     <https://fairspace.nl/ontology#>
+PREFIX curie:  <https://institut-curie.org/ontology#>
+PREFIX osiris: <https://institut-curie.org/osiris#>
+PREFIX ncit:   <http://ncicb.nci.nih.gov/xml/owl/EVS/Thesaurus.owl#>
+PREFIX gender: <http://hl7.org/fhir/administrative-gender#>
+"""
+
+VARIABLE = re.compile(r'\?\w+')
+
+
+@dataclass
+class PatternQuery:
+    """ A logical query: the distinct values of the target variable that match the triple patterns and filters,
+    and optionally are in a collection (path prefix).
+    """
+    name: str
+    target: str
+    patterns: List[str]
+    filters: List[str] = field(default_factory=list)
+    path_prefix: bool = False
+
+
+PATTERN_QUERIES = [
+    PatternQuery('Samples by nature', '?sample',
+                 ['?sample a curie:BiologicalSample', '?sample curie:isOfNature ncit:C812']),
+    PatternQuery('Samples by nature and cellularity', '?sample',
+                 ['?sample a curie:BiologicalSample', '?sample curie:isOfNature ncit:C812',
+                  '?sample curie:tumorCellularity ?cellularity'],
+                 ['?cellularity > 20 && ?cellularity < 90']),
+    PatternQuery('Samples by nature, gender and event type', '?sample',
+                 ['?sample a curie:BiologicalSample', '?sample curie:isOfNature ncit:C812',
+                  '?sample curie:subject ?subject', '?subject curie:isOfGender gender:male',
+                  '?sample curie:diagnosis ?event', '?event curie:eventType ncit:C3262']),
+    PatternQuery('Samples by nature, event type and analysis type', '?sample',
+                 ['?sample a curie:BiologicalSample', '?sample curie:isOfNature ncit:C812',
+                  '?sample curie:diagnosis ?event', '?event curie:eventType ncit:C3262',
+                  '?location curie:sample ?sample', '?location curie:analysisType osiris:O6-12']),
+    PatternQuery('Files by sample nature and analysis type', '?location',
+                 ['?location a fs:File', '?location curie:sample ?sample', '?sample curie:isOfNature ncit:C812',
+                  '?location curie:analysisType osiris:O6-12']),
+    PatternQuery('Files by keyword', '?location',
+                 ['?location a fs:File', "?location dcat:keyword 'philosophy'"]),
+    PatternQuery('Files by path prefix', '?location',
+                 ['?location a fs:File'], path_prefix=True)
+]
+
+# Ways to formulate a query, per dimension. The first option is the formulation as written.
+DIMENSIONS = {
+    'order': ['as written', 'reversed', 'constants first'],
+    'join': ['join', 'exists', 'subquery'],
+    'constants': ['inline', 'values'],
+    'path': ['strstarts', 'belongsTo'],
+    'form': ['select', 'ordered', 'limit subquery', 'count']
+}
+
+
+def split_pattern(pattern: str) -> Tuple[str, str, str]:
+    subject, predicate, value = pattern.split(None, 2)
+    return subject, predicate, value
+
+
+def is_constant(value: str) -> bool:
+    return not value.startswith('?')
+
+
+def order_patterns(patterns: List[str], order: str) -> List[str]:
+    if order == 'reversed':
+        return list(reversed(patterns))
+    if order == 'constants first':
+        # Patterns with a constant value (except type patterns) are usually the most selective
+        def rank(pattern):
+            _, predicate, value = split_pattern(pattern)
+            return 0 if is_constant(value) and predicate != 'a' else 1 if predicate != 'a' else 2
+        return sorted(patterns, key=rank)
+    return list(patterns)
+
+
+def inline_values(patterns: List[str], first: int = 0) -> Tuple[List[str], List[str]]:
+    """ Replaces the constant values of the patterns (except types) by variables bound with VALUES.
+    """
+    replaced = []
+    values = []
+    for pattern in patterns:
+        subject, predicate, value = split_pattern(pattern)
+        if predicate != 'a' and is_constant(value):
+            variable = f'?value{first + len(values)}'
+            values.append(f'VALUES {variable} {{ {value} }}')
+            pattern = f'{subject} {predicate} {variable}'
+        replaced.append(pattern)
+    return replaced, values
+
+
+def variant_dimensions(query: PatternQuery) -> Dict[str, List[str]]:
+    """ The dimensions that apply to the query.
+    """
+    dimensions = dict(DIMENSIONS)
+    if not query.path_prefix:
+        del dimensions['path']
+    if all(set(VARIABLE.findall(pattern)) <= {query.target} for pattern in query.patterns):
+        del dimensions['join']
+    if not any(predicate != 'a' and is_constant(value)
+               for _, predicate, value in map(split_pattern, query.patterns)):
+        del dimensions['constants']
+    if len(query.patterns) < 2:
+        del dimensions['order']
+    return dimensions
+
+
+def formulate(query: PatternQuery, options: Dict[str, str], collection: str, limit: int) -> str:
+    """ Writes the query in SPARQL, formulated according to the options per dimension.
+    """
+    target = query.target
+    patterns = order_patterns(query.patterns, options.get('order', 'as written'))
+    # Patterns on the target only, and patterns that join other entities
+    own = [p for p in patterns if set(VARIABLE.findall(p)) <= {target}]
+    joined = [p for p in patterns if p not in own]
+    own_filters = [f for f in query.filters if set(VARIABLE.findall(f)) <= {target}]
+    joined_filters = [f for f in query.filters if f not in own_filters]
+    own_values = []
+    joined_values = []
+    if options.get('constants') == 'values':
+        own, own_values = inline_values(own)
+        joined, joined_values = inline_values(joined, len(own_values))
+
+    def block(block_patterns, block_filters, block_values):
+        return [f'{p} .' for p in block_patterns] + block_values + [f'FILTER ({f})' for f in block_filters]
+
+    join = options.get('join', 'join')
+    if join == 'join' or len(joined) == 0:
+        body = block(own + joined, own_filters + joined_filters, own_values + joined_values)
+    elif join == 'exists':
+        body = block(own, own_filters, own_values) + \
+            ['FILTER EXISTS {'] + ['  ' + line for line in block(joined, joined_filters, joined_values)] + ['}']
+    else:
+        body = block(own, own_filters, own_values) + \
+            [f'{{ SELECT DISTINCT {target} WHERE {{'] + \
+            ['    ' + line for line in block(joined, joined_filters, joined_values)] + ['} }']
+    if query.path_prefix:
+        if options.get('path') == 'belongsTo':
+            body.append(f'{target} fs:belongsTo* <{collection}> .')
+        else:
+            body.append(f"FILTER ( STRSTARTS(STR({target}), '{collection}') )")
+    body.append(f'FILTER NOT EXISTS {{ {target} fs:dateDeleted ?anyDateDeleted }}')
+    where = 'WHERE {\n' + '\n'.join(f'  {line}' for line in body) + '\n}'
+
+    form = options.get('form', 'select')
+    if form == 'count':
+        return f'{PREFIXES}\nSELECT (COUNT(DISTINCT {target}) AS ?count)\n{where}\n'
+    if form == 'ordered':
+        return f'{PREFIXES}\nSELECT DISTINCT {target}\n{where}\nORDER BY {target}\nLIMIT {limit}\n'
+    if form == 'limit subquery':
+        inner = '\n'.join(f'    {line}' for line in where.splitlines())
+        return f'{PREFIXES}\nSELECT {target}\nWHERE {{\n  {{ SELECT DISTINCT {target}\n{inner}\n' \
+               f'    LIMIT {limit} }}\n}}\nORDER BY {target}\n'
+    return f'{PREFIXES}\nSELECT DISTINCT {target}\n{where}\nLIMIT {limit}\n'
+
+
+@dataclass
+class Variant:
+    query: PatternQuery
+    options: Dict[str, str]
+    sparql: str
+    sizes: List[int] = field(default_factory=list)
+    durations_ms: List[float] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return ', '.join(self.options.values())
+
+    @property
+    def aggregate(self) -> bool:
+        return self.options['form'] == 'count'
+
+    @property
+    def median_ms(self) -> Optional[float]:
+        return Summary.of(self.durations_ms).median
+
+
+def generate_variants(query: PatternQuery, collection: str, limit: int, forms: Sequence[str],
+                      max_variants: int = None) -> List[Variant]:
+    """ All combinations of the options of the dimensions that apply to the query.
+    If there are more than `max_variants`, the formulations as written are kept and the rest is sampled.
+    """
+    dimensions = variant_dimensions(query)
+    dimensions['form'] = [form for form in dimensions['form'] if form in forms]
+    names = list(dimensions.keys())
+    variants = [Variant(query, dict(zip(names, options)), '')
+                for options in itertools.product(*dimensions.values())]
+    if max_variants is not None and len(variants) > max_variants:
+        baselines = [v for v in variants if all(v.options[name] == dimensions[name][0]
+                                                for name in names if name != 'form')]
+        others = [v for v in variants if v not in baselines]
+        variants = baselines + random.sample(others, max(0, max_variants - len(baselines)))
+    for variant in variants:
+        variant.sparql = formulate(query, variant.options, collection, limit)
+    return variants
+
+
+def benchmark_variants(api: FairspaceApi, variants: List[Variant], repeat: int, warmup: int = 1):
+    """ Runs the variants in a random order in every round, so that caching affects all variants alike.
+    """
+    for round_number in range(warmup + repeat):
+        for variant in random.sample(variants, len(variants)):
+            results, duration = timed(api.query_sparql, variant.sparql)
+            if round_number >= warmup:
+                variant.sizes.append(result_size(results, variant.aggregate))
+                variant.durations_ms.append(duration)
+
+
+def baseline_of(variant: Variant, variants: Sequence[Variant], dimension: str = None) -> Optional[Variant]:
+    """ The variant with the same form that is formulated as written,
+    or, for a dimension, the variant that only differs in that dimension and uses its first option.
+    """
+    options = {name: DIMENSIONS[name][0] if (name == dimension or dimension is None and name != 'form') else option
+               for name, option in variant.options.items()}
+    for other in variants:
+        if other.options == options:
+            return other
+    return None
+
+
+def inconsistent(variant: Variant, variants: Sequence[Variant]) -> bool:
+    """ The variant returns a different number of results than its baseline, so it is not equivalent.
+    Listing forms are compared by their number of results (up to the limit).
+    """
+    baseline = baseline_of(variant, variants)
+    return baseline is not None and len(variant.sizes) > 0 and len(baseline.sizes) > 0 \
+        and variant.sizes[-1] != baseline.sizes[-1]
+
+
+def report(results: Dict[str, List[Variant]], top: int):
+    for name, variants in results.items():
+        ranked = sorted(variants, key=lambda variant: variant.median_ms or math.inf)
+        rows = []
+        for variant in ranked[:top]:
+            baseline = baseline_of(variant, variants)
+            ratio = variant.median_ms / baseline.median_ms \
+                if baseline is not None and variant.median_ms and baseline.median_ms else None
+            rows.append([variant.name,
+                         f'{variant.sizes[-1]:,}' if len(variant.sizes) > 0 else '?',
+                         format_ms(variant.median_ms),
+                         f'{ratio:.2f}x' if ratio is not None else '-',
+                         'NOT EQUIVALENT' if inconsistent(variant, variants) else ''])
+        print(f'{name}: {len(variants)} variants, fastest {ranked[0].name}')
+        print(format_table(['Variant', 'Results', 'Median', 'vs. as written', 'Check'], rows))
+        print()
+
+    # Effect of each option compared to the first option of its dimension, with the other options unchanged
+    rows = []
+    for dimension, options in DIMENSIONS.items():
+        for option in options[1:]:
+            ratios = []
+            for variants in results.values():
+                for variant in variants:
+                    if variant.options.get(dimension) != option:
+                        continue
+                    baseline = baseline_of(variant, variants, dimension)
+                    if baseline is not None and variant.median_ms and baseline.median_ms:
+                        ratios.append(variant.median_ms / baseline.median_ms)
+            if len(ratios) == 0:
+                continue
+            geomean = math.exp(sum(math.log(ratio) for ratio in ratios) / len(ratios))
+            rows.append([dimension, f'{option} vs. {options[0]}', f'{len(ratios):,}', f'{geomean:.2f}x',
+                         f'{sum(1 for ratio in ratios if ratio < 1) / len(ratios):.0%}'])
+    print('Effect of each formulation choice (ratio of medians, below 1 is faster)')
+    print(format_table(['Dimension', 'Option', 'Pairs', 'Geometric mean', 'Faster in'], rows, left_columns=(0, 1)))
+
+
+def to_dict(variant: Variant) -> Dict[str, any]:
+    return {
+        'options': variant.options,
+        'query': variant.sparql,
+        'sizes': variant.sizes,
+        'durations_ms': variant.durations_ms,
+        'summary': Summary.of(variant.durations_ms).to_dict()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate equivalent SPARQL formulations of logical queries, benchmark them and report '
+                    'the fastest formulation and the effect of each formulation choice.')
+    parser.add_argument('--query', action='append',
+                        help='name of a logical query to run, can be repeated (default: all)')
+    parser.add_argument('--forms', default=','.join(DIMENSIONS['form']),
+                        help=f'comma separated query forms (default: {",".join(DIMENSIONS["form"])})')
+    parser.add_argument('--max-variants', type=int, help='maximum number of variants per query (sampled)')
+    parser.add_argument('--limit', type=int, default=500, help='page size of the listing forms')
+    parser.add_argument('--collection', default=EXAMPLE_COLLECTION,
+                        help='IRI of the collection to use in the path prefix query')
+    parser.add_argument('--repeat', type=int, default=3, help='number of measured runs per variant')
+    parser.add_argument('--warmup', type=int, default=1, help='number of unmeasured runs per variant')
+    parser.add_argument('--top', type=int, default=10, help='number of fastest variants to show per query')
+    parser.add_argument('--seed', type=int, help='random seed for sampling and the order of the runs')
+    parser.add_argument('--print', action='store_true', help='print the generated queries instead of running them')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    selected = args.query or [query.name for query in PATTERN_QUERIES]
+    forms = args.forms.split(',')
+    variants = {query.name: generate_variants(query, args.collection, args.limit, forms, args.max_variants)
+                for query in PATTERN_QUERIES if query.name in selected}
+    if args.print:
+        for name, query_variants in variants.items():
+            for variant in query_variants:
+                print(f'# {name}: {variant.name}{variant.sparql}')
+        return
+
+    api = FairspaceApi()
+    for name, query_variants in variants.items():
+        log.info(f'Running {len(query_variants)} variants of {name} ...')
+        benchmark_variants(api, query_variants, args.repeat, args.warmup)
+
+    report(variants, args.top)
+    if args.output:
+        write_results(args.output, {
+            'repeat': args.repeat,
+            'queries': {name: [to_dict(variant) for variant in query_variants]
+                        for name, query_variants in variants.items()}
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+import argparse
+import importlib.resources
+import json
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Sequence
+
+from metadata_scripts.benchmark import Summary, format_ms, format_table, timed, write_results, read_results, \
+    relative_change, format_change
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('sql_benchmark')
+
+# SQL files shipped in the queries package
+DEFAULT_QUERIES_FILE = 'queries.sql'
+
+EXPLAIN_PREFIX = re.compile(r'^\s*explain(\s+analy[sz]e)?\s+', re.IGNORECASE)
+QUERY_PREFIX = re.compile(r'^\s*(select|with)\b', re.IGNORECASE)
+NAME_MARKER = re.compile(r'^--\s*name:\s*(\S+)\s*$')
+
+
+@dataclass
+class SqlQuery:
+    name: str
+    sql: str
+    notes: List[str] = field(default_factory=list)
+
+
+def parse_queries(text: str) -> List[SqlQuery]:
+    """ Parses the statements of a SQL scratchpad file.
+
+    Statements end with a semicolon at the end of a line. A statement can be named
+    with a `-- name: <name>` comment line before it, unnamed statements are named by position.
+    Other comment lines following a statement (e.g., timings) are kept as notes of that statement.
+    A leading `explain analyse` is removed, statements that are not queries (e.g., `vacuum`) are skipped.
+    """
+    queries: List[SqlQuery] = []
+    previous: Optional[SqlQuery] = None
+    pending_name = None
+    lines: List[str] = []
+    position = 0
+    for line in text.splitlines():
+        stripped = line.strip()
+        if len(lines) == 0 and stripped.startswith('--'):
+            marker = NAME_MARKER.match(stripped)
+            if marker:
+                pending_name = marker.group(1)
+            elif previous is not None:
+                previous.notes.append(stripped[2:].strip())
+            continue
+        if len(lines) == 0 and len(stripped) == 0:
+            continue
+        if stripped.startswith('--'):
+            continue
+        lines.append(line)
+        if stripped.endswith(';'):
+            statement = '\n'.join(lines).strip()[:-1].strip()
+            lines = []
+            position += 1
+            statement = EXPLAIN_PREFIX.sub('', statement, count=1)
+            if not QUERY_PREFIX.match(statement):
+                previous = None
+                pending_name = None
+                continue
+            previous = SqlQuery(pending_name or f'query_{position:02d}', statement)
+            pending_name = None
+            queries.append(previous)
+    return queries
+
+
+def read_sql_file(path: Optional[str], default: str) -> str:
+    """ Reads a SQL file, or the `default` file from the queries package if no path is given.
+    """
+    if path is None:
+        return importlib.resources.read_text('queries', default)
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def read_queries(path: str = None) -> List[SqlQuery]:
+    return parse_queries(read_sql_file(path, DEFAULT_QUERIES_FILE))
+
+
+def connect(database_url: str):
+    try:
+        import psycopg2
+    except ImportError:
+        log.error('The psycopg2 package is required for querying the view database, '
+                  'install it with: pip install ".[sql]"')
+        sys.exit(1)
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    return connection
+
+
+def plan_scans(plan: Dict[str, any]) -> List[str]:
+    """ Lists the scan nodes of a plan, e.g., 'Index Scan using collection_type_idx on collection'.
+    """
+    scans = []
+    node_type = plan['Node Type']
+    if 'Index Name' in plan:
+        scans.append(f"{node_type} using {plan['Index Name']} on {plan.get('Relation Name', '?')}")
+    elif 'Relation Name' in plan:
+        scans.append(f"{node_type} on {plan['Relation Name']}")
+    for child in plan.get('Plans', []):
+        scans.extend(plan_scans(child))
+    return scans
+
+
+def plan_shape(plan: Dict[str, any]) -> str:
+    """ Compact representation of the node types of a plan, e.g., 'Aggregate(Gather(Seq Scan))'.
+    """
+    children = plan.get('Plans', [])
+    if len(children) == 0:
+        return plan['Node Type']
+    return f"{plan['Node Type']}({', '.join(plan_shape(child) for child in children)})"
+
+
+BUFFER_KEYS = ['Shared Hit Blocks', 'Shared Read Blocks', 'Temp Read Blocks', 'Temp Written Blocks']
+
+
+@dataclass
+class QueryResult:
+    name: str
+    sql: str
+    notes: List[str]
+    execution_ms: List[float] = field(default_factory=list)
+    planning_ms: List[float] = field(default_factory=list)
+    client_ms: Optional[float] = None
+    rows: Optional[int] = None
+    result: Optional[any] = None
+    buffers: Dict[str, int] = field(default_factory=dict)
+    scans: List[str] = field(default_factory=list)
+    shape: Optional[str] = None
+    plan: Optional[Dict[str, any]] = None
+    error: Optional[str] = None
+
+    @property
+    def summary(self) -> Summary:
+        return Summary.of(self.execution_ms)
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'name': self.name,
+            'sql': self.sql,
+            'notes': self.notes,
+            'execution_ms': self.execution_ms,
+            'planning_ms': self.planning_ms,
+            'summary': self.summary.to_dict(),
+            'client_ms': self.client_ms,
+            'rows': self.rows,
+            'result': self.result,
+            'buffers': self.buffers,
+            'scans': self.scans,
+            'shape': self.shape,
+            'plan': self.plan,
+            'error': self.error
+        }
+
+
+def explain(cursor, sql: str) -> Dict[str, any]:
+    cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+    output = cursor.fetchone()[0]
+    if isinstance(output, str):
+        output = json.loads(output)
+    return output[0]
+
+
+def fetch_value(cursor, sql: str):
+    cursor.execute(sql)
+    row = cursor.fetchone()
+    return row[0] if row is not None and len(row) == 1 else None
+
+
+def benchmark_query(connection, query: SqlQuery, repeat: int, warmup: int = 1) -> QueryResult:
+    """ Runs the query with EXPLAIN ANALYZE, which executes it on the server without transferring the rows.
+    Only for single row results (e.g., counts) the query itself is run to fetch the result value.
+    """
+    result = QueryResult(query.name, query.sql, query.notes)
+    try:
+        with connection.cursor() as cursor:
+            for _ in range(warmup):
+                explain(cursor, query.sql)
+            for _ in range(max(1, repeat)):
+                output = explain(cursor, query.sql)
+                result.execution_ms.append(output['Execution Time'])
+                result.planning_ms.append(output['Planning Time'])
+            plan = output['Plan']
+            result.plan = plan
+            result.rows = plan['Actual Rows']
+            result.buffers = {key: plan.get(key, 0) for key in BUFFER_KEYS}
+            result.scans = plan_scans(plan)
+            result.shape = plan_shape(plan)
+            if result.rows == 1:
+                result.result, result.client_ms = timed(fetch_value, cursor, query.sql)
+    except Exception as e:
+        log.error(f'Error running query {query.name}: {e}')
+        result.error = str(e)
+    return result
+
+
+def run_queries(connection, queries: Sequence[SqlQuery], repeat: int, warmup: int = 1) -> List[QueryResult]:
+    results = []
+    for query in queries:
+        log.info(f'Running {query.name} ...')
+        results.append(benchmark_query(connection, query, repeat, warmup))
+    return results
+
+
+def compare_scans(old_scans: Sequence[str], new_scans: Sequence[str]) -> List[str]:
+    """ Describes the changes in scan nodes between two plans, e.g., '-Seq Scan on sample'.
+    """
+    removed = [f'-{scan}' for scan in sorted(set(old_scans) - set(new_scans))]
+    added = [f'+{scan}' for scan in sorted(set(new_scans) - set(old_scans))]
+    return removed + added
+
+
+def report(results: Sequence[QueryResult], previous: Optional[Dict[str, any]] = None):
+    previous_by_name = {q['name']: q for q in previous['queries']} if previous is not None else {}
+    header = ['Query', 'Median', 'p95', 'Planning', 'Rows', 'Result', 'Shared hit/read', 'Change', 'Notes']
+    rows = []
+    plan_changes = []
+    for result in results:
+        if result.error is not None:
+            rows.append([result.name, 'error', '', '', '', '', '', '', ''])
+            continue
+        summary = result.summary
+        change = '-'
+        if result.name in previous_by_name:
+            old = previous_by_name[result.name]
+            change = format_change(relative_change(old['summary']['median'], summary.median))
+            if old.get('shape') != result.shape:
+                plan_changes.append((result.name, compare_scans(old.get('scans', []), result.scans),
+                                     old.get('shape'), result.shape))
+        rows.append([
+            result.name,
+            format_ms(summary.median),
+            format_ms(summary.p95),
+            format_ms(Summary.of(result.planning_ms).median),
+            f'{result.rows:,}',
+            f'{result.result:,}' if isinstance(result.result, int) else '',
+            f"{result.buffers.get('Shared Hit Blocks', 0):,}/{result.buffers.get('Shared Read Blocks', 0):,}",
+            change,
+            ' / '.join(result.notes)[:60]
+        ])
+    print(format_table(header, rows, left_columns=(0, len(header) - 1)))
+    for name, scan_changes, old_shape, new_shape in plan_changes:
+        print()
+        print(f'Plan of {name} changed:')
+        for scan_change in scan_changes:
+            print(f'  {scan_change}')
+        print(f'  was: {old_shape}')
+        print(f'  now: {new_shape}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the queries from a SQL file against the view database and report EXPLAIN ANALYZE timings.')
+    parser.add_argument('names', nargs='*', help='names of the queries to run (default: all)')
+    parser.add_argument('--queries', help='SQL file with the queries (default: queries/queries.sql)')
+    parser.add_argument('--database-url', default=os.environ.get('VIEW_DATABASE_URL'),
+                        help='PostgreSQL connection URL of the view database (default: $VIEW_DATABASE_URL)')
+    parser.add_argument('--repeat', type=int, default=5, help='number of measured runs per query')
+    parser.add_argument('--warmup', type=int, default=1, help='number of unmeasured runs per query')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--compare', help='JSON file with previous results to compare with')
+    parser.add_argument('--list', action='store_true', help='only list the queries')
+    args = parser.parse_args()
+
+    queries = read_queries(args.queries)
+    if len(args.names) > 0:
+        unknown = set(args.names) - set(q.name for q in queries)
+        if len(unknown) > 0:
+            log.error(f'Unknown queries: {", ".join(sorted(unknown))}')
+            sys.exit(1)
+        queries = [q for q in queries if q.name in args.names]
+    if args.list:
+        for query in queries:
+            print(query.name)
+        return
+    if not args.database_url:
+        log.error('Please configure the VIEW_DATABASE_URL environment variable or use --database-url.')
+        sys.exit(1)
+
+    connection = connect(args.database_url)
+    try:
+        results = run_queries(connection, queries, args.repeat, args.warmup)
+    finally:
+        connection.close()
+
+    report(results, read_results(args.compare) if args.compare else None)
+    if args.output:
+        write_results(args.output, {
+            'queries_file': args.queries,
+            'repeat': args.repeat,
+            'queries': [result.to_dict() for result in results]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Callable, Sequence, Optional
+
+from dotenv import load_dotenv
+from rdflib import Graph, Literal, URIRef
+
+from fairspace_api.api import FairspaceApi
+from metadata_scripts.benchmark import format_ms, format_table, percentile, write_results
+from metadata_scripts.upload_test_data import TestData, SUBJECT, EVENT, SAMPLE
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('teardown')
+
+GRANULARITIES = ['collection', 'directory']
+# Names of the collections created by upload_test_data
+GENERATED_COLLECTION = re.compile(r'^collection \d{4}-\d{2}-\d{2}_\d{2}_\d{2}-\d+$')
+
+
+@dataclass
+class DeletionPhase:
+    name: str
+    items: int = 0
+    errors: int = 0
+    seconds: float = 0
+    durations_ms: List[float] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds > 0 else 0.0
+
+
+class Teardown:
+    """ Deletes generated collections and metadata entities in parallel, with at most `concurrency` requests
+    in flight. Deleted items are marked as deleted by Fairspace; with `purge` they are removed permanently.
+    """
+    def __init__(self, api: FairspaceApi, concurrency: int, purge: bool, granularity: str = 'collection'):
+        self.api = api
+        self.concurrency = concurrency
+        self.purge = purge
+        self.granularity = granularity
+
+    def run_phase(self, name: str, items: Sequence[any], delete: Callable[[any], None]) -> DeletionPhase:
+        phase = DeletionPhase(name)
+        if len(items) == 0:
+            return phase
+        log.info(f'Deleting {len(items):,} {name} with {self.concurrency} concurrent requests ...')
+
+        def timed_delete(item) -> bool:
+            start = time.perf_counter()
+            try:
+                delete(item)
+            except (Exception, SystemExit) as e:
+                log.warning(f'Deleting {item if isinstance(item, str) else f"{len(item):,} {name}"} failed: {e}')
+                return False
+            phase.durations_ms.append(1000 * (time.perf_counter() - start))
+            return True
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            succeeded = list(executor.map(timed_delete, items))
+        phase.seconds = time.perf_counter() - start
+        phase.items = sum(succeeded)
+        phase.errors = len(items) - phase.items
+        return phase
+
+    def delete_path(self, path: str):
+        self.api.delete(path)
+        if self.purge:
+            self.api.delete(path, purge=True)
+
+    def delete_entity(self, iri: str):
+        self.api.delete_metadata_subject(iri)
+
+    def purge_entities(self, iris: Sequence[str]):
+        """ Removes all triples of the entities, which are marked as deleted already.
+        """
+        values = ' '.join(f'<{iri}>' for iri in iris)
+        bindings = self.api.query_sparql(f'SELECT ?s ?p ?o WHERE {{ VALUES ?s {{ {values} }} ?s ?p ?o }}'
+                                         )['results']['bindings']
+        graph = Graph()
+        for binding in bindings:
+            value = binding['o']
+            graph.add((URIRef(binding['s']['value']), URIRef(binding['p']['value']),
+                       URIRef(value['value']) if value['type'] == 'uri'
+                       else Literal(value['value'], datatype=value.get('datatype'), lang=value.get('xml:lang'))))
+        if len(graph) > 0:
+            self.api.delete_metadata_graph(graph)
+
+    def delete_collections(self, collections: Sequence[str]) -> List[DeletionPhase]:
+        phases = []
+        if self.granularity == 'directory':
+            # Delete the top level directories in parallel, instead of each collection tree in a single request
+            directories = [entry.path for collection in collections
+                           for entry in self.api.list_dir(collection) if entry.is_dir]
+            phases.append(self.run_phase('directories', directories, self.delete_path))
+        phases.append(self.run_phase('collections', collections, self.delete_path))
+        return phases
+
+    def delete_entities(self, kind: str, iris: Sequence[str], batch_size: int) -> List[DeletionPhase]:
+        phases = [self.run_phase(kind, iris, self.delete_entity)]
+        if self.purge:
+            batches = [iris[start:start + batch_size] for start in range(0, len(iris), batch_size)]
+            phases.append(self.run_phase(f'{kind} (purge batches)', batches, self.purge_entities))
+        return phases
+
+
+def find_collections(api: FairspaceApi, manifest: Optional[str], prefix: Optional[str]) -> List[str]:
+    """ The collections in the manifest, or the top level collections starting with `prefix`,
+    or else the ones named like the collections generated by upload_test_data.
+    """
+    if manifest:
+        with open(manifest, 'r') as f:
+            return json.load(f)['collections']
+    return [entry.path for entry in api.list_dir('') if entry.is_dir
+            and (entry.path.startswith(prefix) if prefix else GENERATED_COLLECTION.match(entry.path))]
+
+
+def confirm(question: str) -> bool:
+    if not sys.stdin.isatty():
+        return False
+    return input(f'{question} [y/N] ').strip().lower() in ['y', 'yes']
+
+
+def report(phases: Sequence[DeletionPhase]):
+    rows = [[phase.name, f'{phase.items:,}', f'{phase.errors:,}', format_ms(1000 * phase.seconds),
+             f'{phase.throughput:,.1f}', format_ms(percentile(phase.durations_ms, 50)),
+             format_ms(percentile(phase.durations_ms, 95))]
+            for phase in phases if phase.items + phase.errors > 0]
+    print(format_table(['Phase', 'Deleted', 'Errors', 'Time', 'Per second', 'p50', 'p95'], rows))
+
+
+def to_dict(phase: DeletionPhase) -> Dict[str, any]:
+    return {
+        'name': phase.name,
+        'items': phase.items,
+        'errors': phase.errors,
+        'seconds': phase.seconds,
+        'throughput': phase.throughput,
+        'percentiles': {f'p{p}': percentile(phase.durations_ms, p) for p in [50, 95, 99]}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Delete the collections and the subjects, events and samples generated by upload_test_data, '
+                    'in parallel, and report the deletion throughput.')
+    parser.add_argument('--manifest', help='delete the collections and entities in this manifest of upload_test_data; '
+                                           'otherwise they are discovered')
+    parser.add_argument('--prefix',
+                        help='without manifest, delete the collections starting with this prefix, instead of the '
+                             'collections named like generated collections ("collection YYYY-MM-DD_HH_MM-<n>")')
+    parser.add_argument('--skip-collections', action='store_true', help='do not delete collections')
+    parser.add_argument('--skip-entities', action='store_true', help='do not delete subjects, events and samples')
+    parser.add_argument('--granularity', choices=GRANULARITIES, default='collection',
+                        help='delete each collection with one request, or its top level directories in parallel first')
+    parser.add_argument('--purge', action='store_true',
+                        help='permanently remove the deleted collections and entities (requires administrator rights)')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of concurrent requests (default: 8)')
+    parser.add_argument('--batch-size', type=int, default=100, help='entities per request when purging')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be deleted')
+    parser.add_argument('--yes', action='store_true', help='do not ask for confirmation before deleting')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+    load_dotenv()
+
+    testdata = TestData()
+    testdata.manifest_path = args.manifest
+    api = testdata.api
+    collections = [] if args.skip_collections else find_collections(api, args.manifest, args.prefix)
+    entities = {}
+    if not args.skip_entities:
+        testdata.load_existing_data()
+        deleted = set(testdata.deleted['subject'] + testdata.deleted['sample'])
+        entities = {
+            'samples': [str(SAMPLE[sample_id]) for sample_id in testdata.sample_ids if sample_id not in deleted],
+            'events': [str(EVENT[event_id]) for event_id in testdata.event_ids],
+            'subjects': [str(SUBJECT[subject_id]) for subject_id in testdata.subject_ids if subject_id not in deleted]
+        }
+    log.info(f'Found {len(collections):,} collections and '
+             + ', '.join(f'{len(iris):,} {kind}' for kind, iris in entities.items()) + '.')
+    if args.dry_run:
+        for collection in collections:
+            print(collection)
+        for iris in entities.values():
+            for iri in iris:
+                print(iri)
+        return
+    if not args.yes and not confirm(f'Delete {len(collections):,} collections and '
+                                    f'{sum(len(iris) for iris in entities.values()):,} entities'
+                                    f'{" permanently" if args.purge else ""}?'):
+        log.error('Not confirmed, use --yes to delete without confirmation or --dry-run to list what would be deleted.')
+        sys.exit(1)
+
+    teardown = Teardown(api, args.concurrency, args.purge, args.granularity)
+    start = time.perf_counter()
+    # Collections first, so that no files refer to the deleted samples
+    phases = teardown.delete_collections(collections)
+    for kind, iris in entities.items():
+        phases += teardown.delete_entities(kind, iris, args.batch_size)
+    total = time.perf_counter() - start
+
+    report(phases)
+    print(f'Total: {sum(phase.items for phase in phases):,} deletions in {format_ms(1000 * total)}.')
+    if args.manifest:
+        log.info(f'The manifest {args.manifest} no longer matches the server, remove it before generating new data.')
+    if args.output:
+        write_results(args.output, {
+            'granularity': args.granularity,
+            'purge': args.purge,
+            'concurrency': args.concurrency,
+            'seconds': total,
+            'phases': [to_dict(phase) for phase in phases]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import random
+from dataclasses import dataclass
+from typing import List, Dict, Sequence
+
+from metadata_scripts.distributions import zipf_weights
+
+DISTRIBUTIONS = ['uniform', 'skewed']
+
+
+def parse_fan_out(value: str) -> List[int]:
+    """ Parses a comma separated list of the number of subdirectories per level, e.g., '10,5,2'.
+    """
+    fan_out = [int(n) for n in value.split(',') if n.strip() != '']
+    if len(fan_out) == 0 or any(n < 1 for n in fan_out):
+        raise ValueError(f'Invalid fan-out: {value}')
+    return fan_out
+
+
+def distribute(total: int, weights: Sequence[float]) -> List[int]:
+    """ Splits `total` into integer parts proportional to the weights (largest remainder method).
+    """
+    exact = [total * weight for weight in weights]
+    parts = [int(value) for value in exact]
+    remainders = sorted(range(len(exact)), key=lambda i: exact[i] - parts[i], reverse=True)
+    for i in remainders[:total - sum(parts)]:
+        parts[i] += 1
+    return parts
+
+
+@dataclass
+class TreeShape:
+    """ Shape of the directory tree of a collection: the number of subdirectories of each directory per level
+    and the distribution of the files over the directories at the deepest level.
+    With a skewed distribution the number of files per directory follows a Zipf distribution,
+    with the same total number of files as the uniform distribution.
+    """
+    fan_out: List[int]
+    files_per_dir: int
+    distribution: str = 'uniform'
+    skew: float = 1.0
+
+    def __post_init__(self):
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(f'Unknown file distribution: {self.distribution}. '
+                             f'Supported distributions: {", ".join(DISTRIBUTIONS)}')
+
+    @staticmethod
+    def of(depth: int, fan_out: Sequence[int], files_per_dir: int, distribution='uniform', skew=1.0) -> 'TreeShape':
+        """ Creates a tree shape of the given depth, repeating the last fan-out value for the deeper levels.
+        """
+        if depth < 1:
+            raise ValueError(f'Invalid depth: {depth}')
+        fan_out = list(fan_out[:depth]) + [fan_out[-1]] * (depth - len(fan_out))
+        return TreeShape(fan_out, files_per_dir, distribution, skew)
+
+    @property
+    def depth(self) -> int:
+        return len(self.fan_out)
+
+    def levels(self) -> List[List[str]]:
+        """ The relative paths of the directories, per level, from the top level down.
+        """
+        levels = []
+        parents = ['']
+        for fan_out in self.fan_out:
+            parents = [f'{parent}dir_{n}' for parent in parents for n in range(fan_out)]
+            levels.append(parents)
+            parents = [f'{parent}/' for parent in parents]
+        return levels
+
+    @property
+    def leaf_count(self) -> int:
+        count = 1
+        for fan_out in self.fan_out:
+            count *= fan_out
+        return count
+
+    @property
+    def total_files(self) -> int:
+        return self.leaf_count * self.files_per_dir
+
+    def file_counts(self) -> Dict[str, int]:
+        """ The number of files per directory at the deepest level.
+        """
+        leaves = self.levels()[-1]
+        if self.distribution == 'uniform':
+            return {leaf: self.files_per_dir for leaf in leaves}
+        counts = distribute(self.total_files, zipf_weights(len(leaves), self.skew))
+        random.shuffle(counts)
+        return dict(zip(leaves, counts))
@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
+import argparse
 import importlib
+import json
 import logging
 import os
 import random
 import sys
 import time
 import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Sequence, Dict
+from typing import Sequence, Dict, Optional, Set, List
 from urllib.parse import quote
 from rdflib import Graph, Literal, RDF, URIRef
 from rdflib.namespace import DCAT, Namespace, RDFS
@@ -16,6 +20,13 @@ from dotenv import load_dotenv
 import numpy
 
 from fairspace_api.api import FairspaceApi
+from metadata_scripts.distributions import Sampler, Selectivity, distributions_from_env
+from metadata_scripts.lineage import Lineage, LineageShape
+from metadata_scripts.oracle import CardinalityOracle
+from metadata_scripts.parity_benchmark import LOGICAL_QUERIES
+from metadata_scripts.profiling import PhaseProfiler
+from metadata_scripts.reindex import report_reindex
+from metadata_scripts.tree_shape import TreeShape, parse_fan_out
 
 CURIE = Namespace('https://institut-curie.org/ontology#')
 FS = Namespace('https://fairspace.nl/ontology#')
@@ -23,7 +34,16 @@ ANALYSIS = Namespace('https://institut-curie.org/analysis#')
 SUBJECT = Namespace('http://example.com/subjects#')
 EVENT = Namespace('http://example.com/events#')
 SAMPLE = Namespace('http://example.com/samples#')
+
+DELETABLE_KINDS = ['subject', 'sample', 'directory', 'file']
 HOMO_SAPIENS = URIRef('https://bioportal.bioontology.org/ontologies/NCBITAXON/9606')
+# Natures of samples derived from a sample of a nature, by label. Other samples derive samples of their own nature.
+CHILD_NATURES = {
+    'Paraffin Embedded Tissue (FFPE)': ['Tumor Cell Line'],
+    'Tumor Cell Line': ['DNA', 'RNA'],
+    'Blood': ['Peripheral Blood Mononuclear Cell'],
+    'Peripheral Blood Mononuclear Cell': ['RNA']
+}
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 log = logging.getLogger('testdata')
@@ -34,14 +54,40 @@ def random_subset(items, count: int):
 
 
 class TestData:
-    def __init__(self):
-        self.empty_files = True
+    def __init__(self, profiler: PhaseProfiler = None):
+        # Upload copies of an image instead of empty files, e.g., to benchmark downloads
+        self.empty_files = os.environ.get('EMPTY_FILES', 'true').lower() == 'true'
+        self.profiler = profiler or PhaseProfiler()
         self.subject_count = int(os.environ.get('SUBJECT_COUNT', 1000))
         self.event_count = int(os.environ.get('EVENT_COUNT', 1500))
         self.sample_count = int(os.environ.get('SAMPLE_COUNT', 3000))
         self.collection_count = int(os.environ.get('COLLECTION_COUNT', 5))
         self.dirs_per_collection = int(os.environ.get('DIRS_PER_COLLECTION', 50))
         self.files_per_dir = int(os.environ.get('FILES_PER_DIR', 500))
+        # Directory tree per collection: the fan-out per level defaults to DIRS_PER_COLLECTION
+        self.tree_depth = int(os.environ.get('TREE_DEPTH', 1))
+        self.tree_fan_out: Optional[List[int]] = parse_fan_out(os.environ['TREE_FAN_OUT']) \
+            if os.environ.get('TREE_FAN_OUT') else None
+        self.file_distribution = os.environ.get('FILE_DISTRIBUTION', 'uniform')
+        self.file_skew = float(os.environ.get('FILE_SKEW', 1.0))
+        self.dir_parallelism = int(os.environ.get('DIR_PARALLELISM', 4))
+        # Distribution of the values of file attributes, e.g., KEYWORD_DISTRIBUTION=zipf:1.2
+        self.distributions = distributions_from_env(['keyword', 'analysis_type', 'sample', 'subject'])
+        # Depth and branching of sample lineages, e.g., LINEAGE_FRACTION=0.5 LINEAGE_DEPTH=geometric:3
+        self.lineage_shape = LineageShape.from_env()
+        self.random_seed = int(os.environ['RANDOM_SEED']) if os.environ.get('RANDOM_SEED') else None
+        # Fraction of the generated entities to mark as deleted, e.g., DELETED_FRACTION=0.1 or DELETED_FILE_FRACTION=0.5
+        self.deleted_fractions = {kind: float(os.environ.get(f'DELETED_{kind.upper()}_FRACTION',
+                                                             os.environ.get('DELETED_FRACTION', 0)))
+                                  for kind in DELETABLE_KINDS}
+        self.wait_for_reindex = os.environ.get('WAIT_FOR_REINDEX', 'false').lower() == 'true'
+        # Extend the existing dataset (from the manifest or discovered using SPARQL) instead of creating a new one
+        self.append = False
+        self.manifest_path: Optional[str] = None
+        # Index of the generated data to compute expected query counts, only built if a path is set
+        self.oracle_path: Optional[str] = None
+        self.oracle: Optional[CardinalityOracle] = None
+        self.workspace_code = 'test'
 
         self.words = [
             'beverage',
@@ -72,6 +118,7 @@ class TestData:
         self.natures: dict = {}
         self.nature_ids: Sequence[str] = []
         self.analysis_ids: Sequence[str] = []
+        self.taxonomy_labels: Dict[str, str] = {}
 
         # Generated objects and links
         self.subject_ids: Sequence[str] = []
@@ -80,7 +127,14 @@ class TestData:
         self.sample_ids: Sequence[str] = []
         self.sample_subject: Dict[str, str] = {}
         self.sample_event: Dict[str, str] = {}
-        self.event_topography: Dict[str, str] = {}
+        self.sample_parent: Dict[str, str] = {}
+        self.event_topography: Dict[str, Set[str]] = {}
+        self.collection_names: List[str] = []
+        # Directories at the deepest level created in this run, with their number of files
+        self.new_directories: Dict[str, int] = {}
+        self.deleted: Dict[str, List[str]] = {kind: [] for kind in DELETABLE_KINDS}
+        self.samplers: Dict[str, Sampler] = {}
+        self.selectivity = Selectivity()
 
         try:
             self.api = FairspaceApi()
@@ -109,7 +163,7 @@ class TestData:
         self.api.upload_metadata_graph(graph)
 
     def query_taxonomy(self, taxonomy):
-        return {result['id']['value']: result['label']['value'] for result in self.api.query_sparql(f"""
+        labels = {result['id']['value']: result['label']['value'] for result in self.api.query_sparql(f"""
             PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
             PREFIX curie: <https://institut-curie.org/ontology#>
 
@@ -119,6 +173,8 @@ class TestData:
               ?id rdfs:label ?label
             }}
             """)['results']['bindings']}
+        self.taxonomy_labels.update(labels)
+        return labels
 
     def fetch_taxonomy_data(self):
         log.info('Fetching topographies ...')
@@ -163,6 +219,153 @@ class TestData:
         self.consent_answer_ids.sort()
 
 
+    def query_all(self, select: str, where: str, order_by: str, page_size=100000):
+        """ Fetches all results of a query, in pages of `page_size` results.
+        """
+        bindings = []
+        offset = 0
+        while True:
+            page = self.api.query_sparql(f"""
+                PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
+                PREFIX curie: <https://institut-curie.org/ontology#>
+
+                SELECT {select}
+                WHERE {{ {where} }}
+                ORDER BY {order_by}
+                LIMIT {page_size}
+                OFFSET {offset}
+                """)['results']['bindings']
+            bindings.extend(page)
+            if len(page) < page_size:
+                return bindings
+            offset += page_size
+
+    def discover_existing_data(self):
+        """ Discovers the subjects, events and samples generated by earlier runs using SPARQL.
+        """
+        def local_id(binding, variable, namespace):
+            if variable not in binding:
+                return None
+            value = binding[variable]['value']
+            return value[len(str(namespace)):] if value.startswith(str(namespace)) else None
+
+        log.info('Discovering existing subjects ...')
+        subjects = self.query_all('?subject', '?subject a curie:Subject', '?subject')
+        self.subject_ids = [subject_id for subject_id in (local_id(b, 'subject', SUBJECT) for b in subjects)
+                            if subject_id is not None]
+
+        log.info('Discovering existing tumor pathology events ...')
+        events = self.query_all('?event ?subject ?topography', """
+            ?event a curie:TumorPathologyEvent .
+            ?event curie:eventSubject ?subject .
+            OPTIONAL { ?event curie:topography ?topography }
+            """, '?event')
+        for binding in events:
+            event_id = local_id(binding, 'event', EVENT)
+            subject_id = local_id(binding, 'subject', SUBJECT)
+            if event_id is None or subject_id is None:
+                continue
+            if event_id not in self.event_subject:
+                self.event_ids.append(event_id)
+                self.event_subject[event_id] = subject_id
+                self.event_topography[event_id] = set()
+            if 'topography' in binding:
+                self.event_topography[event_id].add(binding['topography']['value'])
+
+        log.info('Discovering existing samples ...')
+        samples = self.query_all('?sample ?subject ?event ?parent', """
+            ?sample a curie:BiologicalSample .
+            OPTIONAL { ?sample curie:subject ?subject }
+            OPTIONAL { ?sample curie:diagnosis ?event }
+            OPTIONAL { ?sample curie:isChildOf ?parent }
+            """, '?sample')
+        seen = set()
+        for binding in samples:
+            sample_id = local_id(binding, 'sample', SAMPLE)
+            if sample_id is None or sample_id in seen:
+                continue
+            seen.add(sample_id)
+            self.sample_ids.append(sample_id)
+            subject_id = local_id(binding, 'subject', SUBJECT)
+            event_id = local_id(binding, 'event', EVENT)
+            if subject_id is not None:
+                self.sample_subject[sample_id] = subject_id
+            if event_id is not None and event_id in self.event_subject:
+                self.sample_event[sample_id] = event_id
+            parent_id = local_id(binding, 'parent', SAMPLE)
+            if parent_id is not None:
+                self.sample_parent[sample_id] = parent_id
+
+        log.info('Discovering existing collections ...')
+        collections = self.query_all('?label', """
+            ?collection a <https://fairspace.nl/ontology#Collection> .
+            ?collection rdfs:label ?label .
+            FILTER(STRSTARTS(?label, 'collection '))
+            """, '?label')
+        self.collection_names = [binding['label']['value'] for binding in collections]
+
+        # Keep using the topographies that existing events refer to
+        topographies = set(t for topographies in self.event_topography.values() for t in topographies)
+        if len(topographies) > 0:
+            self.topography_ids = sorted(topographies)
+
+    def to_manifest(self) -> Dict[str, any]:
+        return {
+            'url': self.api.url,
+            'workspace': self.workspace_code,
+            'topography_ids': self.topography_ids,
+            'morphology_ids': self.morphology_ids,
+            'subject_ids': self.subject_ids,
+            'event_ids': self.event_ids,
+            'event_subject': self.event_subject,
+            'event_topography': {event_id: sorted(topographies)
+                                 for event_id, topographies in self.event_topography.items()},
+            'sample_ids': self.sample_ids,
+            'sample_subject': self.sample_subject,
+            'sample_event': self.sample_event,
+            'sample_parent': self.sample_parent,
+            'collections': self.collection_names,
+            'selectivity': self.selectivity.to_dict(),
+            'deleted': self.deleted
+        }
+
+    def load_manifest(self, manifest: Dict[str, any]):
+        if manifest['url'] != self.api.url:
+            log.warning(f"The manifest was created for {manifest['url']}, not for {self.api.url}.")
+        self.workspace_code = manifest['workspace']
+        self.topography_ids = manifest['topography_ids']
+        self.morphology_ids = manifest['morphology_ids']
+        self.subject_ids = manifest['subject_ids']
+        self.event_ids = manifest['event_ids']
+        self.event_subject = manifest['event_subject']
+        self.event_topography = {event_id: set(topographies)
+                                 for event_id, topographies in manifest['event_topography'].items()}
+        self.sample_ids = manifest['sample_ids']
+        self.sample_subject = manifest['sample_subject']
+        self.sample_event = manifest['sample_event']
+        self.sample_parent = manifest.get('sample_parent', {})
+        self.collection_names = manifest['collections']
+        self.deleted.update(manifest.get('deleted', {}))
+        if 'selectivity' in manifest:
+            self.selectivity = Selectivity.from_dict(manifest['selectivity'])
+
+    def load_existing_data(self):
+        if self.manifest_path is not None and os.path.exists(self.manifest_path):
+            log.info(f'Loading existing data from {self.manifest_path} ...')
+            with open(self.manifest_path, 'r') as f:
+                self.load_manifest(json.load(f))
+        else:
+            self.discover_existing_data()
+        log.info(f'Found {len(self.subject_ids):,} subjects, {len(self.event_ids):,} events, '
+                 f'{len(self.sample_ids):,} samples and {len(self.collection_names):,} collections.')
+
+    def save_manifest(self):
+        if self.manifest_path is None:
+            return
+        log.info(f'Writing manifest to {self.manifest_path} ...')
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self.to_manifest(), f)
+
     def select_gender(self):
         """
         male:female:undifferentiated = 4:4:1
@@ -175,21 +378,12 @@ class TestData:
             return self.gender_ids[1]
         return self.gender_ids[2]
 
-    def find_child_sample_nature_for_parent(self, parent_nature_id):
-        parent_children_relations = {
-            "Paraffin Embedded Tissue (FFPE)": ["Tumor Cell Line"],
-            "Tumor Cell Line": ["DNA", "RNA"],
-            "Blood": ["Peripheral Blood Mononuclear Cell"],
-            "Peripheral Blood Mononuclear Cell": ["RNA"]
-        }
-        try:
-            parent_nature_label = self.natures[str(parent_nature_id)]
-            child_nature_label = random.choice(parent_children_relations[parent_nature_label])
-            for nature_id, nature_label in self.natures.items():
-                if nature_label == child_nature_label:
-                    return nature_id
-        except:
-            log.debug("No child sample nature found.")
+    def child_natures(self) -> Dict[str, List[str]]:
+        """ The natures of samples derived from a sample, by the nature of that sample.
+        """
+        ids = {label: nature_id for nature_id, label in self.natures.items()}
+        return {ids[label]: [ids[child] for child in children if child in ids]
+                for label, children in CHILD_NATURES.items() if label in ids}
 
     def get_unique_label(self, prefix: str, sub_id: str, graph: Graph, n: int = 5) -> str:
         new_label = f'{prefix}-{sub_id[0:n]}'
@@ -199,9 +393,10 @@ class TestData:
 
     def generate_and_upload_subjects(self):
         # Add random subjects
-        self.subject_ids = [str(uuid.uuid4()) for n in range(self.subject_count)]
+        new_subject_ids = [str(uuid.uuid4()) for n in range(self.subject_count)]
+        self.subject_ids = self.subject_ids + new_subject_ids
         graph = Graph()
-        for subject_id in self.subject_ids:
+        for subject_id in new_subject_ids:
             subject_ref = SUBJECT[subject_id]
             graph.add((subject_ref, RDF.type, CURIE.Subject))
             label = self.get_unique_label('SUBJECT', subject_id, graph)
@@ -217,24 +412,25 @@ class TestData:
                            URIRef(self.consent_answer_ids[random.randint(0, len(self.consent_answer_ids) - 1)])))
                 graph.add((subject_ref, CURIE.geneticAnalysis,
                            URIRef(self.consent_answer_ids[random.randint(0, len(self.consent_answer_ids) - 1)])))
-        log.info(f'Adding {len(self.subject_ids):,} subjects ...')
+        log.info(f'Adding {len(new_subject_ids):,} subjects ...')
         self.api.upload_metadata_graph(graph)
+        self.add_to_oracle(graph)
 
     def generate_and_upload_events(self):
         # Add random tumor pathology events
         dice = random.randint(1, 6)
-        self.event_ids = [str(uuid.uuid4()) for n in range(self.event_count)]
-        self.event_subject = {event_id: self.subject_ids[random.randint(0, len(self.subject_ids) - 1)]
-                              for event_id in self.event_ids}
-        self.event_topography = dict()
-        for event_id in self.event_ids:
+        new_event_ids = [str(uuid.uuid4()) for n in range(self.event_count)]
+        self.event_ids = self.event_ids + new_event_ids
+        self.event_subject.update({event_id: self.subject_ids[random.randint(0, len(self.subject_ids) - 1)]
+                                   for event_id in new_event_ids})
+        for event_id in new_event_ids:
             topographies = set([self.topography_ids[random.randint(0, len(self.topography_ids) - 1)]])
             if dice < 4:
                 topographies.add(self.topography_ids[random.randint(0, len(self.topography_ids) - 1)])
             self.event_topography[event_id] = topographies
 
         graph = Graph()
-        for event_id in self.event_ids:
+        for event_id in new_event_ids:
             event_ref = EVENT[event_id]
             graph.add((event_ref, RDF.type, CURIE.TumorPathologyEvent))
             label = self.get_unique_label('TPE', event_id, graph)
@@ -255,10 +451,15 @@ class TestData:
             graph.add((event_ref, CURIE.term('ageAtDiagnosis'),
                        Literal(max(0, min(int(numpy.random.standard_normal() * 15) + 50, 120)))))
 
-        log.info(f'Adding {len(self.event_ids):,} tumor pathology events ...')
+        log.info(f'Adding {len(new_event_ids):,} tumor pathology events ...')
         self.api.upload_metadata_graph(graph)
+        self.add_to_oracle(graph)
+
+    def add_sample_diagnosis_subject_topography_fragment(self, graph: Graph, sample_id: str) -> str:
+        """ Links the sample to a random event or subject and topography.
 
-    def add_sample_diagnosis_subject_topography_fragment(self, graph: Graph, sample_id: str):
+        :return: the topography.
+        """
         sample_ref = SAMPLE[sample_id]
         dice = random.randint(1, 6)
         if dice < 3:
@@ -266,40 +467,48 @@ class TestData:
             subject_id = self.event_subject[event_id]
             self.sample_event[sample_id] = event_id
             self.sample_subject[sample_id] = subject_id
+            topography = next(iter(self.event_topography[event_id]))
             graph.add((sample_ref, CURIE.subject, SUBJECT[subject_id]))
             graph.add((sample_ref, CURIE.diagnosis, EVENT[event_id]))
-            graph.add((sample_ref, CURIE.topography, URIRef(next(iter(self.event_topography[event_id])))))
-            return
+            graph.add((sample_ref, CURIE.topography, URIRef(topography)))
+            return topography
+        topography = self.topography_ids[random.randint(0, len(self.topography_ids) - 1)]
         if dice < 5:
             subject_id = self.subject_ids[random.randint(0, len(self.subject_ids) - 1)]
             self.sample_subject[sample_id] = subject_id
             graph.add((sample_ref, CURIE.subject, SUBJECT[subject_id]))
-            graph.add((sample_ref, CURIE.topography,
-                       URIRef(self.topography_ids[random.randint(0, len(self.topography_ids) - 1)])))
-            return
-        graph.add((sample_ref, CURIE.topography,
-                   URIRef(self.topography_ids[random.randint(0, len(self.topography_ids) - 1)])))
+        graph.add((sample_ref, CURIE.topography, URIRef(topography)))
+        return topography
 
-    def add_sample_fragment_based_on_parent(self, graph: Graph, sample_id: str, parent_sample_id):
+    def add_sample_fragment_based_on_parent(self, graph: Graph, sample_id: str, parent_sample_id: str,
+                                            parent_topography: str):
+        """ Links the sample to its parent, and to the event, subject and topography of the parent.
+        """
         sample_ref = SAMPLE[sample_id]
-        parent_sample_ref = SAMPLE[parent_sample_id]
-        graph.add((sample_ref, CURIE.isChildOf, parent_sample_ref))
-
-        parent_sample_event = graph.value(parent_sample_ref, CURIE.diagnosis, None)
-        if parent_sample_event:
-            graph.add((sample_ref, CURIE.diagnosis, parent_sample_event))
-        parent_sample_subject = graph.value(parent_sample_ref, CURIE.subject, None)
-        if parent_sample_subject:
-            graph.add((sample_ref, CURIE.subject, parent_sample_subject))
-        parent_sample_topography = graph.value(parent_sample_ref, CURIE.topography, None)
-        if parent_sample_topography:
-            graph.add((sample_ref, CURIE.topography, parent_sample_topography))
+        graph.add((sample_ref, CURIE.isChildOf, SAMPLE[parent_sample_id]))
+        self.sample_parent[sample_id] = parent_sample_id
+
+        if parent_sample_id in self.sample_event:
+            self.sample_event[sample_id] = self.sample_event[parent_sample_id]
+            graph.add((sample_ref, CURIE.diagnosis, EVENT[self.sample_event[sample_id]]))
+        if parent_sample_id in self.sample_subject:
+            self.sample_subject[sample_id] = self.sample_subject[parent_sample_id]
+            graph.add((sample_ref, CURIE.subject, SUBJECT[self.sample_subject[sample_id]]))
+        graph.add((sample_ref, CURIE.topography, URIRef(parent_topography)))
 
     def generate_and_upload_samples(self):
-        # Add random samples
-        self.sample_ids = [str(uuid.uuid4()) for n in range(self.sample_count)]
+        """ Adds random samples, part of them derived from other new samples (see `LineageShape`).
+        The lineage and the natures and topographies of the new samples are kept in arrays indexed like the samples.
+        """
+        new_sample_ids = [str(uuid.uuid4()) for n in range(self.sample_count)]
+        self.sample_ids = self.sample_ids + new_sample_ids
+        lineage = Lineage.generate(self.sample_count, self.lineage_shape)
+        child_natures = self.child_natures()
+        nature_index = {nature_id: n for n, nature_id in enumerate(self.nature_ids)}
+        natures = array('i')
+        topographies: List[str] = []
         graph = Graph()
-        for idx, sample_id in enumerate(self.sample_ids):
+        for idx, sample_id in enumerate(new_sample_ids):
             sample_ref = SAMPLE[sample_id]
             graph.add((sample_ref, RDF.type, CURIE.BiologicalSample))
             label = self.get_unique_label('SAMPLE', sample_id, graph)
@@ -307,47 +516,74 @@ class TestData:
             graph.add((sample_ref, CURIE.tumorCellularity,
                        Literal(max(0, min(int(numpy.random.standard_normal() * 15) + 50, 100)))))
 
-            sample_nature_id = None
-            parent_sample_id = None
-            dice = random.randint(1, 6)
-            if idx > 1 and dice > 5:
-                parent_sample_id = self.sample_ids[idx-1]
-                parent_sample_nature_id = graph.value(SAMPLE[parent_sample_id], CURIE.isOfNature, None)
-                sample_nature_id = self.find_child_sample_nature_for_parent(parent_sample_nature_id)
-            if sample_nature_id is not None:
-                graph.add((sample_ref, CURIE.parentIsOfNature, URIRef(parent_sample_nature_id)))
+            parent = lineage.parents[idx]
+            if parent >= 0:
+                parent_nature_id = self.nature_ids[natures[parent]]
+                sample_nature_id = random.choice(child_natures.get(parent_nature_id) or [parent_nature_id])
+                graph.add((sample_ref, CURIE.parentIsOfNature, URIRef(parent_nature_id)))
                 graph.add((sample_ref, CURIE.isOfNature, URIRef(sample_nature_id)))
-                self.add_sample_fragment_based_on_parent(graph, sample_id, parent_sample_id)
+                self.add_sample_fragment_based_on_parent(graph, sample_id, new_sample_ids[parent],
+                                                         topographies[parent])
+                topographies.append(topographies[parent])
             else:
                 sample_nature_id = self.nature_ids[random.randint(0, len(self.nature_ids) - 1)]
                 graph.add((sample_ref, CURIE.isOfNature, URIRef(sample_nature_id)))
-                self.add_sample_diagnosis_subject_topography_fragment(graph, sample_id)
+                topographies.append(self.add_sample_diagnosis_subject_topography_fragment(graph, sample_id))
+            natures.append(nature_index[sample_nature_id])
 
-        log.info(f'Adding {len(self.sample_ids):,} samples ...')
+        log.info(f'Sample lineage ({self.lineage_shape.depth} generations, '
+                 f'{self.lineage_shape.branching} children): {lineage.summary()}')
+        log.info(f'Adding {len(new_sample_ids):,} samples ...')
         self.api.upload_metadata_graph(graph)
+        self.add_to_oracle(graph)
+
+    def keyword_vocabulary(self) -> Sequence[str]:
+        """ The keywords, extended with generated keywords if KEYWORD_CARDINALITY exceeds the number of words.
+        """
+        cardinality = self.distributions['keyword'].cardinality or len(self.words)
+        return self.words + [f'keyword {n}' for n in range(len(self.words), cardinality)]
+
+    def prepare_samplers(self):
+        self.samplers = {
+            'keyword': Sampler(self.keyword_vocabulary(), self.distributions['keyword']),
+            'analysis_type': Sampler(self.analysis_ids, self.distributions['analysis_type']),
+            # Only samples with an event are linked to files
+            'sample': Sampler(list(self.sample_event.keys()), self.distributions['sample']),
+            'subject': Sampler(self.subject_ids, self.distributions['subject'])
+        }
+        for attribute, sampler in self.samplers.items():
+            log.info(f'Selecting {attribute} values with a {sampler.distribution} distribution '
+                     f'over {len(sampler):,} values')
 
     def select_keywords(self) -> Sequence[str]:
-        count = min(int(numpy.random.exponential(1.3)), len(self.words) - 1)
-        return [self.words[i]
-                for i in random.sample(range(0, len(self.words) - 1), count)]
+        count = min(int(numpy.random.exponential(1.3)), len(self.samplers['keyword']) - 1)
+        return self.samplers['keyword'].sample(count)
 
     def select_samples(self) -> Sequence[URIRef]:
-        count = min(int(numpy.random.exponential(1)), len(self.sample_ids) - 1)
-        return [SAMPLE[self.sample_ids[i]]
-                for i in random.sample(range(0, len(self.sample_ids) - 1), count)]
+        count = min(int(numpy.random.exponential(1)), len(self.samplers['sample']) - 1)
+        return [SAMPLE[sample_id] for sample_id in self.samplers['sample'].sample(count)]
 
     def select_analysis_types(self) -> Sequence[URIRef]:
         count = 1 if random.randint(1, 6) == 1 else 0
-        return [URIRef(self.analysis_ids[i])
-                for i in random.sample(range(0, len(self.analysis_ids) - 1), count)]
+        return [URIRef(analysis_id) for analysis_id in self.samplers['analysis_type'].sample(count)]
 
     def select_subjects(self) -> Sequence[URIRef]:
-        count = min(int(numpy.random.exponential(.9)), len(self.subject_ids) - 1)
-        return [SUBJECT[self.subject_ids[i]]
-                for i in random.sample(range(0, len(self.subject_ids) - 1), count)]
+        count = min(int(numpy.random.exponential(.9)), len(self.samplers['subject']) - 1)
+        return [SUBJECT[subject_id] for subject_id in self.samplers['subject'].sample(count)]
+
+    def record_selectivity(self, graph: Graph, ref: URIRef):
+        def local_names(predicate):
+            return [str(value).rsplit('/', 1)[-1].rsplit('#', 1)[-1] for value in graph.objects(ref, predicate)]
+
+        self.selectivity.record({
+            'keyword': [str(keyword) for keyword in graph.objects(ref, DCAT.keyword)],
+            'analysis_type': local_names(CURIE.analysisType),
+            'sample': local_names(CURIE.sample),
+            'subject': local_names(CURIE.aboutSubject)
+        })
 
     def link_sample_to_file(self, graph: Graph, ref: URIRef):
-        sample_id = list(self.sample_event.keys())[random.randint(0, len(self.sample_event) - 1)]
+        sample_id = self.samplers['sample'].choice()
         event_id = self.sample_event[sample_id]
         subject_id = self.event_subject[event_id]
         graph.add((ref, CURIE.sample, SAMPLE[sample_id]))
@@ -372,65 +608,228 @@ class TestData:
             return
         return
 
+    def tree_shape(self) -> TreeShape:
+        return TreeShape.of(self.tree_depth,
+                            self.tree_fan_out or [self.dirs_per_collection],
+                            self.files_per_dir,
+                            self.file_distribution,
+                            self.file_skew)
+
+    def create_directories(self, collection_name: str, shape: TreeShape):
+        """ Creates the directory tree level by level, the directories of a level in parallel.
+        """
+        with ThreadPoolExecutor(max_workers=self.dir_parallelism) as executor:
+            for depth, level in enumerate(shape.levels(), start=1):
+                log.info(f'Creating {len(level):,} directories at depth {depth} in {collection_name} ...')
+                with self.profiler.batch(f'{collection_name}: depth {depth}'):
+                    list(executor.map(self.api.ensure_dir, [f'{collection_name}/{path}' for path in level]))
+                for path in level:
+                    self.add_location_to_oracle(f'{collection_name}/{path}', 'Directory')
+
     def generate_and_upload_collections(self):
         log.info('Preparing workspace and collection for uploading ...')
 
-        workspace = self.api.find_or_create_workspace('test')
+        workspace = self.api.find_or_create_workspace(self.workspace_code)
 
         collection_name_prefix = f'collection {datetime.now().strftime("%Y-%m-%d_%H_%M")}'
+        # Do not reuse collection names of an earlier run in the same minute
+        offset = len([name for name in self.collection_names if name.startswith(f'{collection_name_prefix}-')])
 
-        for m in range(self.collection_count):
+        shape = self.tree_shape()
+        self.prepare_samplers()
+        for m in range(offset, offset + self.collection_count):
             collection_name = f'{collection_name_prefix}-{m}'
             self.api.ensure_dir(collection_name, workspace)
+            self.collection_names.append(collection_name)
+            self.add_location_to_oracle(collection_name, 'Collection')
+            self.create_directories(collection_name, shape)
 
             # Upload test files
-            for n in range(self.dirs_per_collection):
+            for n, (path, file_count) in enumerate(shape.file_counts().items()):
                 if n % 10 == 0:
                     time.sleep(5)
 
-                path = f'{collection_name}/dir_{n}'
-                self.api.ensure_dir(path)
-
-                files = {f'coffee_{m}.jpg': 'coffee.jpg' for m in range(self.files_per_dir)}
-
-                log.info(f'Adding {self.files_per_dir:,} files into {path} ...')
-                if self.empty_files:
-                    self.api.upload_empty_files(path, files.keys())
-                else:
-                    self.api.upload_files_by_path(path, files)
-
-                # Annotate files with metadata
-                graph = Graph()
-                for file_name in files.keys():
-                    file_id = self.root[f'{quote(path)}/{quote(file_name)}']
-                    for analysis_type in self.select_analysis_types():
-                        graph.add((file_id, CURIE.analysisType, analysis_type))
-                    for keyword in self.select_keywords():
-                        graph.add((file_id, DCAT.keyword, Literal(keyword)))
-                    self.add_file_subject_sample_event_fragment(graph, file_id)
-                log.info(f'Adding metadata for {len(files)} files to {path} ...')
-                self.api.upload_metadata_graph(graph)
+                path = f'{collection_name}/{path}'
+                self.new_directories[path] = file_count
+                with self.profiler.batch(path):
+                    self.upload_directory(path, file_count)
+
+    def upload_directory(self, path, file_count: int):
+        # Upload large directories (with a skewed file distribution) in batches of at most FILES_PER_DIR files
+        batch_size = max(self.files_per_dir, 1)
+        for start in range(0, file_count, batch_size):
+            self.upload_file_batch(path, [f'coffee_{m}.jpg' for m in range(start, min(start + batch_size, file_count))])
+
+    def upload_file_batch(self, path, file_names: Sequence[str]):
+        files = {file_name: 'coffee.jpg' for file_name in file_names}
+
+        log.info(f'Adding {len(files):,} files into {path} ...')
+        if self.empty_files:
+            self.api.upload_empty_files(path, files.keys())
+        else:
+            content = importlib.resources.read_binary('testdata', 'coffee.jpg')
+            self.api.upload_files(path, {file_name: content for file_name in files.keys()})
+
+        for file_name in files.keys():
+            self.add_location_to_oracle(f'{path}/{file_name}', 'File')
+
+        # Annotate files with metadata
+        graph = Graph()
+        for file_name in files.keys():
+            file_id = self.root[f'{quote(path)}/{quote(file_name)}']
+            for analysis_type in self.select_analysis_types():
+                graph.add((file_id, CURIE.analysisType, analysis_type))
+            for keyword in self.select_keywords():
+                graph.add((file_id, DCAT.keyword, Literal(keyword)))
+            self.add_file_subject_sample_event_fragment(graph, file_id)
+            self.record_selectivity(graph, file_id)
+        log.info(f'Adding metadata for {len(files)} files to {path} ...')
+        self.api.upload_metadata_graph(graph)
+        self.add_to_oracle(graph)
 
     def reindex(self):
         log.info('Triggering recreation of a view database from the RDF database...')
-        self.api.reindex()
-        log.info("Reindexing started!")
+        result = self.api.reindex(wait=self.wait_for_reindex)
+        if result is None:
+            log.info("Reindexing started!")
+            return
+        report_reindex(result)
+
 
+    def select_deleted(self, kind: str, items: Sequence[str]) -> List[str]:
+        return random.sample(list(items), round(self.deleted_fractions[kind] * len(items)))
+
+    def delete_entities(self):
+        """ Marks a fraction of the subjects, samples, directories and files generated in this run as deleted,
+        using the metadata API and WebDAV, to measure the cost of filtering deleted entities in queries.
+        Only directories at the deepest level are deleted, files are selected from the remaining directories.
+        """
+        if not any(fraction > 0 for fraction in self.deleted_fractions.values()):
+            return
+        subjects = self.select_deleted('subject', self.subject_ids[len(self.subject_ids) - self.subject_count:])
+        samples = self.select_deleted('sample', self.sample_ids[len(self.sample_ids) - self.sample_count:])
+        directories = self.select_deleted('directory', self.new_directories.keys())
+        deleted_directories = set(directories)
+        files = []
+        for path, file_count in self.new_directories.items():
+            if path not in deleted_directories:
+                files += [f'{path}/coffee_{m}.jpg' for m in self.select_deleted('file', range(file_count))]
+
+        deletions = [(self.api.delete_metadata_subject, str(SUBJECT[subject_id])) for subject_id in subjects] + \
+                    [(self.api.delete_metadata_subject, str(SAMPLE[sample_id])) for sample_id in samples] + \
+                    [(self.api.delete, path) for path in directories + files]
+        log.info(f'Marking {len(subjects):,} subjects, {len(samples):,} samples, {len(directories):,} directories '
+                 f'and {len(files):,} files as deleted ...')
+        with ThreadPoolExecutor(max_workers=self.dir_parallelism) as executor:
+            list(executor.map(lambda deletion: deletion[0](deletion[1]), deletions))
+        for kind, deleted in zip(DELETABLE_KINDS, [subjects, samples, directories, files]):
+            self.deleted[kind] = self.deleted[kind] + deleted
+        if self.oracle is not None:
+            for iri in [str(SUBJECT[subject_id]) for subject_id in subjects] + \
+                       [str(SAMPLE[sample_id]) for sample_id in samples] + \
+                       [str(self.root[quote(path)]) for path in directories + files]:
+                self.oracle.mark_deleted(iri)
+
+    def load_oracle(self):
+        """ Starts the oracle, or in append mode extends the existing one.
+        """
+        if self.oracle_path is None:
+            return
+        if self.append and os.path.exists(self.oracle_path):
+            log.info(f'Loading oracle from {self.oracle_path} ...')
+            self.oracle = CardinalityOracle.load(self.oracle_path)
+            return
+        self.oracle = CardinalityOracle()
+        if self.append:
+            log.warning('No oracle of the existing data found, expected counts will only cover the added data.')
+            self.oracle.complete = False
+
+    def add_to_oracle(self, graph: Graph):
+        if self.oracle is not None:
+            self.oracle.add_graph(graph, self.taxonomy_labels)
+
+    def add_location_to_oracle(self, path: str, location_type: str):
+        if self.oracle is not None:
+            self.oracle.add_location(str(self.root[quote(path)]), location_type)
+
+    def save_oracle(self):
+        if self.oracle is None:
+            return
+        log.info('Computing the expected counts of the logical queries ...')
+        self.oracle.precompute(LOGICAL_QUERIES)
+        for name, count in self.oracle.expected.items():
+            log.info(f'Expected count of {name}: {count:,}')
+        log.info(f'Writing oracle to {self.oracle_path} ...')
+        self.oracle.save(self.oracle_path)
+
+    def report_selectivity(self):
+        log.info(f'Realized selectivity of file attributes ({self.selectivity.files:,} files):\n'
+                 + self.selectivity.summary())
 
     def run(self):
-        self.update_taxonomies()
-        self.update_collection_type_labels()
-        self.fetch_taxonomy_data()
-        self.generate_and_upload_subjects()
-        self.generate_and_upload_events()
-        self.generate_and_upload_samples()
-        self.generate_and_upload_collections()
-        self.reindex()
+        if self.random_seed is not None:
+            random.seed(self.random_seed)
+            numpy.random.seed(self.random_seed)
+        phases = [
+            self.update_taxonomies,
+            self.update_collection_type_labels,
+            self.fetch_taxonomy_data,
+            *([self.load_existing_data] if self.append else []),
+            self.load_oracle,
+            self.generate_and_upload_subjects,
+            self.generate_and_upload_events,
+            self.generate_and_upload_samples,
+            self.generate_and_upload_collections,
+            self.report_selectivity,
+            self.delete_entities,
+            self.save_manifest,
+            self.save_oracle,
+            self.reindex
+        ]
+        for phase in phases:
+            with self.profiler.phase(phase.__name__):
+                phase()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate test data and upload it to Fairspace.')
+    parser.add_argument('--append', action='store_true',
+                        help='add the configured numbers of entities and files to the existing dataset, '
+                             'loaded from the manifest or discovered using SPARQL')
+    parser.add_argument('--manifest',
+                        help='JSON file with the identifiers of the generated data; '
+                             'read in append mode (if it exists) and written after uploading')
+    parser.add_argument('--oracle',
+                        help='JSON file to write an index of the generated data to, with the expected counts '
+                             'of the benchmark queries; extended in append mode (if it exists)')
+    parser.add_argument('--wait-for-reindex', action='store_true',
+                        help='wait until the view database has been recreated and report its throughput')
+    parser.add_argument('--profile', action='store_true',
+                        help='record wall time, CPU time and peak memory per phase and per batch')
+    parser.add_argument('--profile-dir',
+                        help='directory to write cProfile statistics per phase to (implies --profile)')
+    parser.add_argument('--profile-batches', action='store_true',
+                        help='also write cProfile statistics per batch (requires --profile-dir)')
+    parser.add_argument('--profile-output',
+                        help='JSON file to write the profile measurements to')
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
     load_dotenv()
-    TestData().run()
+    profiler = PhaseProfiler(enabled=args.profile,
+                             profile_dir=args.profile_dir,
+                             profile_batches=args.profile_batches)
+    testdata = TestData(profiler)
+    if args.wait_for_reindex:
+        testdata.wait_for_reindex = True
+    testdata.append = args.append
+    testdata.manifest_path = args.manifest
+    testdata.oracle_path = args.oracle
+    testdata.run()
+    log.info(testdata.api.transfer_stats.summary())
+    profiler.report(args.profile_output)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import logging
+import random
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Sequence
+
+from fairspace_api.api import FairspaceApi
+from metadata_scripts.benchmark import Summary, format_ms, format_table, write_results
+from metadata_scripts.oracle import CardinalityOracle
+from metadata_scripts.retrieve_view import time_view
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('view_filters')
+
+TERM_TYPES = ['Term', 'Set']
+NUMBER_TYPES = ['Number']
+
+# Taxonomy classes with the values of term facets, for facets without values in the view config
+TAXONOMY_CLASSES = {
+    'Subject.gender': 'Gender',
+    'Subject.availableForResearch': 'AvailabilityForResearch',
+    'Sample.nature': 'SampleNature',
+    'Sample.topography': 'Topography',
+    'TumorPathologyEvent.eventType': 'EventType',
+    'TumorPathologyEvent.topography': 'Topography',
+    'TumorPathologyEvent.morphology': 'Morphology',
+    'TumorPathologyEvent.laterality': 'Laterality',
+    'Collection.analysisType': 'AnalysisType'
+}
+
+# Numeric ranges for facets without a minimum and maximum in the view config
+DEFAULT_RANGES = {
+    'Sample.tumorCellularity': (0, 100)
+}
+
+# Part of the range of a numeric facet that is filtered on: narrow, medium and (almost) the full range
+RANGE_WIDTHS = [0.1, 0.5, 0.9]
+
+
+@dataclass
+class Facet:
+    name: str
+    type: str
+    values: List[str] = field(default_factory=list)
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+def facets_from_config(config: Dict[str, any]) -> List[Facet]:
+    """ The term and number facets of the view config, with the labels of the term values.
+    """
+    facets = []
+    for facet in config.get('facets', []):
+        name = facet.get('name')
+        facet_type = facet.get('type')
+        if name is None or facet_type not in TERM_TYPES + NUMBER_TYPES:
+            continue
+        values = [value.get('label') or value.get('value') for value in facet.get('values') or []]
+        facets.append(Facet(name, facet_type, values, facet.get('min'), facet.get('max')))
+    return facets
+
+
+def view_names(config: Dict[str, any]) -> List[str]:
+    return [view['name'] for view in config.get('views', []) if 'name' in view]
+
+
+def add_taxonomy_values(api: FairspaceApi, facets: Sequence[Facet]):
+    """ Adds the labels of the taxonomy terms to term facets without values, and default ranges to number facets.
+    """
+    labels = {}
+    for facet in facets:
+        if facet.type in TERM_TYPES and len(facet.values) == 0 and facet.name in TAXONOMY_CLASSES:
+            taxonomy = TAXONOMY_CLASSES[facet.name]
+            if taxonomy not in labels:
+                results = api.query_sparql(f"""
+                    PREFIX rdfs:  <http://www.w3.org/2000/01/rdf-schema#>
+                    PREFIX curie: <https://institut-curie.org/ontology#>
+
+                    SELECT DISTINCT ?label
+                    WHERE {{
+                      ?id a curie:{taxonomy} .
+                      ?id rdfs:label ?label
+                    }}
+                    """)
+                labels[taxonomy] = sorted(binding['label']['value'] for binding in results['results']['bindings'])
+            facet.values = labels[taxonomy]
+        if facet.type in NUMBER_TYPES and (facet.min is None or facet.max is None) and facet.name in DEFAULT_RANGES:
+            facet.min, facet.max = DEFAULT_RANGES[facet.name]
+
+
+def random_filter(facet: Facet) -> Optional[Dict[str, any]]:
+    """ A filter on one or two random values of a term facet, or a random range of a number facet.
+    """
+    if facet.type in TERM_TYPES:
+        if len(facet.values) == 0:
+            return None
+        count = 2 if len(facet.values) > 2 and random.random() < 0.25 else 1
+        return {'field': facet.name, 'values': random.sample(facet.values, count)}
+    if facet.min is None or facet.max is None:
+        return None
+    width = random.choice(RANGE_WIDTHS) * (facet.max - facet.min)
+    low = facet.min + random.random() * (facet.max - facet.min - width)
+    return {'field': facet.name, 'min': round(low), 'max': round(low + width)}
+
+
+@dataclass
+class FilterCombination:
+    view: str
+    filters: List[Dict[str, any]]
+
+    @property
+    def name(self) -> str:
+        def describe(f):
+            if 'values' in f:
+                return f'{f["field"]} in {", ".join(f["values"])}'
+            return f'{f["field"]} {f["min"]}..{f["max"]}'
+        return f'{self.view}: ' + ' & '.join(describe(f) for f in self.filters)
+
+
+def generate_combinations(views: Sequence[str], facets: Sequence[Facet], max_filters: int,
+                          limit: int) -> List[FilterCombination]:
+    """ Combinations of up to `max_filters` facets with random values per view.
+    If there are more than `limit` combinations, all single filters are kept and the rest is sampled.
+    """
+    usable = [facet for facet in facets if random_filter(facet) is not None]
+    single = []
+    multiple = []
+    for view in views:
+        for size in range(1, max_filters + 1):
+            for subset in itertools.combinations(usable, size):
+                combination = FilterCombination(view, [random_filter(facet) for facet in subset])
+                (single if size == 1 else multiple).append(combination)
+    if len(single) + len(multiple) <= limit:
+        return single + multiple
+    return (single + random.sample(multiple, max(0, limit - len(single))))[:limit]
+
+
+@dataclass
+class CombinationResult:
+    combination: FilterCombination
+    count: Optional[int]
+    timeout: bool
+    page_ms: List[float]
+    count_ms: List[float]
+    expected: Optional[int] = None
+    selectivity: Optional[float] = None
+
+    @property
+    def correct(self) -> Optional[bool]:
+        if self.expected is None or self.timeout:
+            return None
+        return self.count == self.expected
+
+    @property
+    def total_ms(self) -> float:
+        return (Summary.of(self.page_ms).median or 0) + (Summary.of(self.count_ms).median or 0)
+
+
+def benchmark_combinations(api: FairspaceApi, combinations: Sequence[FilterCombination], repeat: int,
+                           oracle: CardinalityOracle = None) -> List[CombinationResult]:
+    results = []
+    for n, combination in enumerate(combinations, start=1):
+        log.info(f'[{n}/{len(combinations)}] {combination.name}')
+        timing = time_view(api, combination.view, combination.filters, repeat)
+        result = CombinationResult(combination, timing.count, timing.timeout, timing.page_ms, timing.count_ms)
+        if oracle is not None:
+            result.expected = oracle.count(combination.view, combination.filters)
+            result.selectivity = oracle.selectivity(combination.view, combination.filters)
+        results.append(result)
+    return results
+
+
+def report(results: Sequence[CombinationResult], top: int):
+    ranked = sorted(results, key=lambda result: result.total_ms, reverse=True)
+    rows = [[f'{rank}',
+             result.combination.name,
+             f'{len(result.combination.filters)}',
+             f'{result.count:,}' if result.count is not None else '?',
+             (f'{result.expected:,}' if result.expected is not None else '-')
+             + (' (wrong)' if result.correct is False else ''),
+             f'{result.selectivity:.2%}' if result.selectivity is not None else '-',
+             format_ms(Summary.of(result.page_ms).median),
+             format_ms(Summary.of(result.count_ms).median) + (' (timeout)' if result.timeout else '')]
+            for rank, result in enumerate(ranked[:top], start=1)]
+    print(f'Slowest {min(top, len(ranked))} of {len(ranked)} filter combinations')
+    print(format_table(['#', 'Combination', 'Filters', 'Count', 'Expected', 'Selectivity', 'Page', 'Count time'], rows,
+                       left_columns=(1,)))
+    print()
+    wrong = [result for result in results if result.correct is False]
+    if len(wrong) > 0:
+        print(f'{len(wrong)} of {len(results)} counts differ from the expected count:')
+        for result in wrong:
+            print(f'  {result.combination.name}: {result.count:,} instead of {result.expected:,}')
+        print()
+    rows = []
+    for size in sorted(set(len(result.combination.filters) for result in results)):
+        totals = [result.total_ms for result in results if len(result.combination.filters) == size]
+        summary = Summary.of(totals)
+        rows.append([f'{size}', f'{summary.count:,}', format_ms(summary.median), format_ms(summary.p95),
+                     format_ms(summary.max)])
+    print('Page plus count time by number of filters')
+    print(format_table(['Filters', 'Combinations', 'Median', 'p95', 'Max'], rows))
+
+
+def to_dict(result: CombinationResult) -> Dict[str, any]:
+    return {
+        'view': result.combination.view,
+        'filters': result.combination.filters,
+        'count': result.count,
+        'timeout': result.timeout,
+        'expected': result.expected,
+        'selectivity': result.selectivity,
+        'page': Summary.of(result.page_ms).to_dict(),
+        'count_time': Summary.of(result.count_ms).to_dict()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark view pages and counts for combinations of filters on the facets of the view config.')
+    parser.add_argument('--views', help='comma separated views to benchmark (default: all views in the config)')
+    parser.add_argument('--max-filters', type=int, default=3, help='maximum number of filters per combination')
+    parser.add_argument('--limit', type=int, default=200, help='maximum number of combinations')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per combination')
+    parser.add_argument('--seed', type=int, help='random seed for the filter values')
+    parser.add_argument('--top', type=int, default=20, help='number of slowest combinations to show')
+    parser.add_argument('--oracle', help='oracle written by `upload_test_data --oracle` to validate the counts')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    api = FairspaceApi()
+    config = api.retrieve_view_config()
+    facets = facets_from_config(config)
+    add_taxonomy_values(api, facets)
+    views = args.views.split(',') if args.views else view_names(config)
+    combinations = generate_combinations(views, facets, args.max_filters, args.limit)
+    log.info(f'Benchmarking {len(combinations):,} filter combinations on {len(facets)} facets '
+             f'for views {", ".join(views)} ...')
+    oracle = CardinalityOracle.load(args.oracle) if args.oracle else None
+    results = benchmark_combinations(api, combinations, args.repeat, oracle)
+
+    report(results, args.top)
+    if args.output:
+        write_results(args.output, {
+            'repeat': args.repeat,
+            'combinations': [to_dict(result) for result in results]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from fairspace_api.api import FairspaceApi, DavEntry
+from metadata_scripts.benchmark import format_ms, format_table, percentile, write_results
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+log = logging.getLogger('webdav_benchmark')
+
+DEPTHS = ['1', 'infinity']
+
+
+@dataclass
+class Listing:
+    path: str
+    entries: int
+    duration_ms: float
+
+
+@dataclass
+class Download:
+    path: str
+    size: int
+    first_byte_ms: float
+    duration_ms: float
+
+
+class WebdavBenchmark:
+    def __init__(self, api: FairspaceApi, concurrency: int, depth: str = '1'):
+        self.api = api
+        self.concurrency = concurrency
+        self.depth = depth
+
+    def list(self, path: str) -> Tuple[Listing, List[DavEntry]]:
+        start = time.perf_counter()
+        entries = list(self.api.list_dir(path, self.depth))
+        return Listing(path, len(entries), 1000 * (time.perf_counter() - start)), entries
+
+    def walk(self, roots: Sequence[str]) -> Tuple[List[Listing], List[DavEntry], float]:
+        """ Lists the directory trees under the roots, listing up to `concurrency` directories at the same time.
+        With depth 'infinity' every root is listed with a single request.
+
+        :return: the listings, the files found and the elapsed time in seconds.
+        """
+        listings = []
+        files = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = {executor.submit(self.list, root) for root in roots}
+            while len(pending) > 0:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    listing, entries = future.result()
+                    listings.append(listing)
+                    files += [entry for entry in entries if not entry.is_dir]
+                    if self.depth == '1':
+                        pending |= {executor.submit(self.list, entry.path) for entry in entries if entry.is_dir}
+        return listings, files, time.perf_counter() - start
+
+    def download(self, path: str, range_bytes: Optional[int]) -> Download:
+        start = time.perf_counter()
+        first_byte = None
+        size = 0
+        for chunk in self.api.download(path, end=range_bytes - 1 if range_bytes else None):
+            if first_byte is None:
+                first_byte = time.perf_counter()
+            size += len(chunk)
+        end = time.perf_counter()
+        return Download(path, size, 1000 * ((first_byte or end) - start), 1000 * (end - start))
+
+    def download_all(self, paths: Sequence[str], range_bytes: Optional[int] = None) -> Tuple[List[Download], float]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            downloads = list(executor.map(lambda path: self.download(path, range_bytes), paths))
+        return downloads, time.perf_counter() - start
+
+
+def find_roots(api: FairspaceApi, collections: Optional[str], manifest: Optional[str], prefix: str) -> List[str]:
+    """ The collections to walk: the given ones, the ones in the manifest,
+    or all collections with names starting with `prefix`.
+    """
+    if collections:
+        return collections.split(',')
+    if manifest:
+        with open(manifest, 'r') as f:
+            return json.load(f)['collections']
+    return [entry.path for entry in api.list_dir('') if entry.is_dir and entry.path.startswith(prefix)]
+
+
+def report(listings: List[Listing], walk_seconds: float, downloads: List[Download], download_seconds: float):
+    entries = sum(listing.entries for listing in listings)
+    durations = [listing.duration_ms for listing in listings]
+    print(format_table(['Listings', 'Entries', 'Time', 'Entries/s', 'p50', 'p95', 'Max'],
+                       [[f'{len(listings):,}', f'{entries:,}', format_ms(1000 * walk_seconds),
+                         f'{entries / walk_seconds:,.0f}' if walk_seconds > 0 else '-',
+                         format_ms(percentile(durations, 50)), format_ms(percentile(durations, 95)),
+                         format_ms(max(durations) if len(durations) > 0 else None)]]))
+    if len(downloads) == 0:
+        return
+    print()
+    size = sum(download.size for download in downloads)
+    durations = [download.duration_ms for download in downloads]
+    print(format_table(['Downloads', 'MB', 'Time', 'MB/s', 'Files/s', 'First byte p50', 'p50', 'p95'],
+                       [[f'{len(downloads):,}', f'{size / 1e6:,.1f}', format_ms(1000 * download_seconds),
+                         f'{size / 1e6 / download_seconds:,.1f}' if download_seconds > 0 else '-',
+                         f'{len(downloads) / download_seconds:,.0f}' if download_seconds > 0 else '-',
+                         format_ms(percentile([download.first_byte_ms for download in downloads], 50)),
+                         format_ms(percentile(durations, 50)), format_ms(percentile(durations, 95))]]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Walk the generated collection trees over WebDAV and download files concurrently, '
+                    'reporting entries per second and MB per second.')
+    parser.add_argument('--collections', help='comma separated collections to walk')
+    parser.add_argument('--manifest', help='walk the collections in this manifest of upload_test_data')
+    parser.add_argument('--prefix', default='collection ',
+                        help='otherwise walk all collections starting with this prefix (default: "collection ")')
+    parser.add_argument('--depth', choices=DEPTHS, default='1',
+                        help='list directory by directory (1) or every collection with a single request (infinity)')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of concurrent requests')
+    parser.add_argument('--downloads', type=int, default=100,
+                        help='number of randomly chosen files to download, 0 to only list (default: 100)')
+    parser.add_argument('--range-bytes', type=int, help='only download the first bytes of each file')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    api = FairspaceApi()
+    benchmark = WebdavBenchmark(api, args.concurrency, args.depth)
+    roots = find_roots(api, args.collections, args.manifest, args.prefix)
+    log.info(f'Listing {len(roots):,} collections with depth {args.depth} ...')
+    listings, files, walk_seconds = benchmark.walk(roots)
+    paths = random.sample([file.path for file in files], min(args.downloads, len(files)))
+    downloads, download_seconds = [], 0.0
+    if len(paths) > 0:
+        log.info(f'Downloading {len(paths):,} of {len(files):,} files ...')
+        downloads, download_seconds = benchmark.download_all(paths, args.range_bytes)
+
+    report(listings, walk_seconds, downloads, download_seconds)
+    if args.output:
+        write_results(args.output, {
+            'depth': args.depth,
+            'concurrency': args.concurrency,
+            'range_bytes': args.range_bytes,
+            'walk_seconds': walk_seconds,
+            'listings': [listing.__dict__ for listing in listings],
+            'download_seconds': download_seconds,
+            'downloads': [download.__dict__ for download in downloads]
+        })
+        log.info(f'Results written to {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+-- Alternative index sets for the view database, used by the index_experiment command.
+-- The 'baseline' set consists of the indexes created in indexes.sql.
+-- Each set starts with a '-- set: <name>' line, and can include the indexes
+-- of another set with an '-- extends: <name>' line.
+
+-- set: none
+-- No secondary indexes at all, as reference.
+
+-- set: composite
+-- extends: baseline
+create index if not exists sample_nature_id_idx on sample(nature, id);
+create index if not exists sample_nature_tumorcellularity_idx on sample(nature, tumorcellularity);
+create index if not exists collection_type_id_idx on collection(type, id);
+create index if not exists collection_sample_sample_idx on collection_sample(sample_id, collection_id);
+create index if not exists collection_analysistype_collection_idx on collection_analysistype(collection_id, analysistype);
+
+-- set: partial
+-- extends: baseline
+create index if not exists collection_file_id_idx on collection(id) where type = 'File';
+create index if not exists collection_file_id_pattern_idx on collection(id text_pattern_ops) where type = 'File';
+create index if not exists collection_file_label_idx on collection(label) where type = 'File';
+
+-- set: covering
+-- extends: baseline
+create index if not exists keywords_collection_covering_idx on collection_keywords(keywords) include (collection_id);
+create index if not exists collection_sample_covering_idx on collection_sample(collection_id) include (sample_id);
+create index if not exists sample_nature_covering_idx on sample(nature) include (id, tumorcellularity);
+create index if not exists sample_tumorcellularity_covering_idx on sample(tumorcellularity) include (id);
@@ -1,37 +1,45 @@
 
+-- name: count_collection
 explain analyse
 select count(*) from collection;
 -- 2,295,588
 -- 194ms
 -- parallel seq scan
 
+-- name: count_tumorpathologyevent
 explain analyse
 select count(*) from tumorpathologyevent;
 -- 80,000
 -- 30 ms
 
+-- name: collection_by_label
 explain analyse
 select * from collection order by label;
 -- first 500 rows in 51ms
 -- index scan collection_label_idx
 
 
+-- name: first_collections
 select * from collection where type = 'Collection' order by id limit 500;
 
 
+-- name: first_files
 explain analyse
 select * from collection where type = 'File' order by id limit 500;
 -- 32ms
 -- index scan collection_type_idx
 
+-- name: count_files
 explain analyse
 select count(*) from collection where type = 'File';
 
+-- name: count_files_with_prefix
 select count(*) from collection
 where type = 'File'
   and id like 'http://localhost:8080/api/webdav/collection%202020-11-16-2/%'
 ;
 
+-- name: first_files_with_prefix
 explain analyse
 select * from collection
 where type = 'File'
@@ -41,6 +49,7 @@ limit 500
 ;
 
 
+-- name: collection_by_topography_and_analysis
 explain analyse
 select * from collection c where exists (
     select *
@@ -59,6 +68,7 @@ order by c.id
 ;
 -- first 500 rows in 250ms
 
+-- name: count_collection_by_topography_and_analysis
 explain analyse
 select count(*) from collection c
 where exists (
@@ -78,6 +88,7 @@ and exists(
 -- 2,382
 -- 228ms
 
+-- name: collection_by_nature_and_analysis
 select * from collection c
 where exists (
         select *
@@ -95,6 +106,7 @@ where exists (
 order by id limit 500
 ;
 
+-- name: count_collection_by_nature_and_analysis
 select count(*) from collection c
 where exists (
         select *
@@ -111,15 +123,18 @@ where exists (
     )
 ;
 
+-- name: samples_by_nature
 select * from sample
 where nature = 'RNA'
 order by id
 limit 500;
 
+-- name: count_samples_by_nature
 select count(*) from sample
 where nature = 'RNA';
 
 
+-- name: samples_by_nature_and_cellularity
 select * from sample
 where nature = 'RNA'
 and tumorcellularity > 20
@@ -127,11 +142,13 @@ and tumorcellularity < 90
 order by id
 limit 500;
 
+-- name: count_samples_by_nature_and_cellularity
 select count(*) from sample
 where nature = 'RNA'
 and tumorcellularity > 20
 and tumorcellularity < 90;
 
+-- name: samples_by_nature_gender_and_event_type
 explain analyse
 select * from sample s
 where nature = 'RNA'
@@ -150,6 +167,7 @@ where nature = 'RNA'
 order by id
 limit 500;
 
+-- name: count_samples_by_nature_gender_and_event_type
 select count(*) from sample s
 where nature = 'RNA'
   and exists (
@@ -168,6 +186,7 @@ where nature = 'RNA'
 ;
 
 
+-- name: collection_by_nature_gender_and_analysis
 explain analyse
 select * from collection c
 where exists (
@@ -194,6 +213,7 @@ order by c.id
 ;
 -- 163 rows in 298ms
 
+-- name: count_collection_by_nature_gender_and_analysis
 explain analyse
 select count(*) from collection c
 where exists (
@@ -220,6 +240,7 @@ where exists (
 -- 163
 -- 244ms
 
+-- name: samples_by_nature_analysis_and_event_type
 select * from sample s
 where nature = 'RNA'
   and exists (
@@ -239,6 +260,7 @@ where nature = 'RNA'
 order by id limit 500
 ;
 
+-- name: count_samples_by_nature_analysis_and_event_type
 select count(*) from sample s
 where nature = 'RNA'
   and exists (
@@ -257,6 +279,7 @@ where nature = 'RNA'
     )
 ;
 
+-- name: count_collection_by_keyword_exists
 explain analyse
 select count(*) from collection c
 where exists(
@@ -269,6 +292,7 @@ where exists(
 -- 161,065
 -- 1s 66 ms
 
+-- name: count_collection_by_keyword_distinct
 explain analyse
 select count(*) from (
     select distinct ck.collection_id
@@ -279,6 +303,7 @@ select count(*) from (
 -- 161,065
 -- 300 ms
 
+-- name: collection_by_keyword_distinct
 select distinct ck.collection_id
 from collection_keywords ck
 where ck.keywords = 'philosophy'
@@ -286,6 +311,7 @@ order by ck.collection_id
 limit 500
 ;
 
+-- name: count_collection_sample_by_cellularity
 explain analyse
 select count(*)
 from collection_sample cs
@@ -294,6 +320,7 @@ where s.tumorcellularity > 20 and s.tumorcellularity < 50;
 -- 336,357
 -- 260ms
 
+-- name: count_collection_by_cellularity_in
 explain analyse
 select count(*)
 from collection c
@@ -310,6 +337,7 @@ where c.id in (
 -- 146,984
 -- 941ms
 
+-- name: count_collection_by_cellularity_exists
 explain analyse
 select count(*)
 from collection c
@@ -325,6 +353,7 @@ where exists (
 ;
 -- 146984 (907ms)
 
+-- name: collection_by_cellularity_join
 select cs.collection_id
 from collection_sample cs
 join sample s on cs.sample_id = s.id
@@ -334,6 +363,7 @@ order by cs.collection_id
 ;
 -- first 500 rows in 758ms
 
+-- name: count_distinct_collection_sample
 explain analyse
 select count(distinct collection_id) from collection_sample
 ;
@@ -341,29 +371,35 @@ select count(distinct collection_id) from collection_sample
 -- total:    746,206 (88ms)
 -- distinct: 615,497 (3.3s)
 
+-- name: count_distinct_collection_sample_subquery
 explain analyse
 select count(*) from (select distinct collection_id from collection_sample) as temp;
 -- 615,497 (510ms)
 
+-- name: count_distinct_collection_sample_group_by
 explain analyse
 select count(*) from (select collection_id from collection_sample group by collection_id) as temp;
 -- 615,497 (509ms)
 
 
+-- name: distinct_collection_sample
 explain analyse
 select distinct collection_id from collection_sample
 order by collection_id
 ;
 -- first 500 rows in 26ms
 
+-- name: count_samples
 select count(*)
 from sample;
 
+-- name: first_samples
 select *
 from sample
 order by id
 limit 500;
 
+-- name: count_samples_by_cellularity
 explain analyse
 select count(*)
 from sample
@@ -373,6 +409,7 @@ where tumorcellularity > 50
 -- 75,328
 -- 31ms
 
+-- name: count_collection_by_keyword_and_cellularity
 explain analyse
 select count(*)
 from (
@@ -389,6 +426,7 @@ from (
 -- 25,045
 -- 537ms
 
+-- name: count_collection_by_keyword_and_cellularity_sample_join
 explain analyse
 select count(*) from (
     select distinct cs.collection_id
@@ -402,6 +440,7 @@ select count(*) from (
 -- 25,045
 -- 373ms
 
+-- name: count_collection_by_keyword_and_cellularity_ordered
 explain analyse
 select count(*) from (
     select ck.collection_id
@@ -25,12 +25,33 @@ setup(
     packages=[
         'fairspace_api',
         'metadata_scripts',
+        'queries',
         'testdata'
     ],
     entry_points={
         'console_scripts': ['upload_test_data=metadata_scripts.upload_test_data:main',
                             'sparql_query=metadata_scripts.sparql_query:main',
-                            'retrieve_view=metadata_scripts.retrieve_view:main'],
+                            'retrieve_view=metadata_scripts.retrieve_view:main',
+                            'check_import_time=metadata_scripts.import_time:main',
+                            'sql_benchmark=metadata_scripts.sql_benchmark:main',
+                            'index_experiment=metadata_scripts.index_experiment:main',
+                            'parity_benchmark=metadata_scripts.parity_benchmark:main',
+                            'reindex=metadata_scripts.reindex:main',
+                            'scale_benchmark=metadata_scripts.scale_benchmark:main',
+                            'deletion_benchmark=metadata_scripts.deletion_benchmark:main',
+                            'record_benchmark=metadata_scripts.regression:record_main',
+                            'compare_benchmark=metadata_scripts.regression:compare_main',
+                            'interference_benchmark=metadata_scripts.interference:main',
+                            'load_generator=metadata_scripts.load_generator:main',
+                            'view_filter_benchmark=metadata_scripts.view_filters:main',
+                            'compression_benchmark=metadata_scripts.compression_benchmark:main',
+                            'webdav_benchmark=metadata_scripts.webdav_benchmark:main',
+                            'sparql_variants=metadata_scripts.sparql_variants:main',
+                            'multi_tenant_setup=metadata_scripts.multi_tenant:setup_main',
+                            'multi_tenant_benchmark=metadata_scripts.multi_tenant:main',
+                            'churn_benchmark=metadata_scripts.churn:main',
+                            'teardown_test_data=metadata_scripts.teardown:main',
+                            'approximate_counts=metadata_scripts.approximate_counts:main'],
     },
     include_package_data=True,
     license="MIT",
@@ -47,6 +68,10 @@ setup(
     ],
     python_requires='>=3.7.0',
     install_requires=required_packages,
+    extras_require={
+        'sql': ['psycopg2-binary >= 2.8, < 3.0'],
+        'zstd': ['zstandard >= 0.15']
+    },
     setup_requires=[
         # dependency for `python setup.py bdist_wheel`
         'wheel'
@@ -0,0 +1,94 @@
+import random
+import sqlite3
+
+import pytest
+
+from metadata_scripts.approximate_counts import bernoulli_interval, exists_sql, normal_quantile, sampleable_sql, \
+    sampled_sql
+
+
+def test_samples_the_first_table_after_its_alias():
+    assert sampled_sql('select count(*) from sample', 1) == \
+        'select count(*) from sample tablesample bernoulli (1) repeatable (0)'
+    assert sampled_sql("select count(*) from collection c where c.type = 'File'", 0.1, seed=3) == \
+        "select count(*) from collection c tablesample bernoulli (0.1) repeatable (3) where c.type = 'File'"
+    assert sampled_sql("select count(*) from sample\nwhere nature = 'RNA'", 10) == \
+        "select count(*) from sample tablesample bernoulli (10) repeatable (0)\nwhere nature = 'RNA'"
+    assert sampled_sql('select count(*) from sample join subject on true', 1) == \
+        'select count(*) from sample tablesample bernoulli (1) repeatable (0) join subject on true'
+
+
+def test_does_not_sample_other_queries():
+    assert sampled_sql('select * from sample', 1) is None
+    assert sampled_sql('select count(*) from (select distinct collection_id from collection_sample) temp', 1) is None
+
+
+DISTINCT_COUNTS = [
+    'select count(distinct collection_id) from collection_sample',
+    'select count(*) from (select distinct collection_id from collection_sample) as temp',
+    'select count(*) from (select collection_id from collection_sample group by collection_id) as temp',
+    """select count(*) from (
+        select distinct ck.collection_id
+        from collection_keywords ck
+        where ck.keywords = 'philosophy' or ck.keywords = 'history'
+    ) temp""",
+    """select count(*) from (
+        select distinct c.id
+        from collection c
+            join collection_sample cs on cs.collection_id = c.id
+            join sample s on s.id = cs.sample_id
+        where s.tumorcellularity > 50
+    ) as temp""",
+]
+
+
+@pytest.fixture
+def database():
+    random.seed(1)
+    connection = sqlite3.connect(':memory:')
+    connection.executescript("""
+        create table collection (id integer);
+        create table sample (id integer, tumorcellularity integer);
+        create table collection_sample (collection_id integer, sample_id integer);
+        create table collection_keywords (collection_id integer, keywords text);
+        """)
+    connection.executemany('insert into collection values (?)', [(n,) for n in range(200)])
+    connection.executemany('insert into sample values (?, ?)', [(n, random.randint(0, 100)) for n in range(300)])
+    connection.executemany('insert into collection_sample values (?, ?)',
+                           [(random.randrange(200), random.randrange(300)) for _ in range(500)])
+    connection.executemany('insert into collection_keywords values (?, ?)',
+                           [(random.randrange(200), random.choice(['philosophy', 'history', 'art']))
+                            for _ in range(300)])
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize('sql', DISTINCT_COUNTS)
+def test_rewrites_distinct_counts_into_equivalent_exists_counts(database, sql):
+    rewritten = exists_sql(sql)
+    assert rewritten.startswith('select count(*) from collection counted where exists')
+    assert sampled_sql(rewritten, 1) is not None
+    assert database.execute(rewritten).fetchone()[0] == database.execute(sql).fetchone()[0]
+
+
+def test_does_not_rewrite_counts_of_other_subqueries():
+    assert exists_sql('select count(*) from (select ck.collection_id from collection_keywords ck '
+                      'order by ck.collection_id) as temp') is None
+    assert exists_sql('select count(distinct nature) from sample') is None
+    assert sampleable_sql('select count(*) from sample') == 'select count(*) from sample'
+
+
+def test_normal_quantile():
+    assert normal_quantile(0.5) == pytest.approx(0, abs=1e-9)
+    assert normal_quantile(0.975) == pytest.approx(1.959964, abs=1e-5)
+
+
+def test_bernoulli_interval():
+    estimate, lower, upper = bernoulli_interval(100, 0.01, 0.95)
+    assert estimate == pytest.approx(10000)
+    assert lower < estimate < upper
+    assert upper - estimate == pytest.approx(estimate - lower)
+    # The count is at least the number of sampled rows
+    assert bernoulli_interval(1, 0.5, 0.99)[1] >= 1
+    # Nothing sampled: the count is zero, or small compared to the sampled fraction
+    assert bernoulli_interval(0, 0.01, 0.95) == pytest.approx((0, 0, 299.57), abs=0.01)
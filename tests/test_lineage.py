@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from metadata_scripts.lineage import CountDistribution, Lineage, LineageShape
+
+
+def test_parses_distributions():
+    assert CountDistribution.parse('fixed:2') == CountDistribution('fixed', 2.0)
+    assert CountDistribution.parse('uniform:1-3') == CountDistribution('uniform', 1, 3)
+    assert CountDistribution.parse('poisson') == CountDistribution('poisson', 1.0)
+    assert str(CountDistribution.parse('uniform:1-3')) == 'uniform:1-3'
+
+
+def test_rejects_invalid_distributions():
+    with pytest.raises(ValueError):
+        CountDistribution.parse('normal:1')
+    with pytest.raises(ValueError):
+        CountDistribution.parse('uniform:3-1')
+
+
+def test_samples_within_bounds():
+    random.seed(1)
+    assert CountDistribution('fixed', 2).sample() == 2
+    assert all(1 <= CountDistribution('uniform', 1, 3).sample() <= 3 for _ in range(100))
+    assert CountDistribution('geometric', 0).sample() == 0
+    samples = [CountDistribution('geometric', 2).sample() for _ in range(10000)]
+    assert 1.8 < sum(samples) / len(samples) < 2.2
+    samples = [CountDistribution('poisson', 2).sample() for _ in range(10000)]
+    assert 1.8 < sum(samples) / len(samples) < 2.2
+
+
+def test_generates_the_requested_number_of_samples():
+    random.seed(1)
+    for count in [0, 1, 10, 1000]:
+        assert len(Lineage.generate(count, LineageShape())) == count
+
+
+def test_parents_precede_their_children():
+    random.seed(1)
+    lineage = Lineage.generate(1000, LineageShape(0.5, CountDistribution('fixed', 3),
+                                                  CountDistribution('uniform', 0, 3)))
+    for index, parent in enumerate(lineage.parents):
+        assert parent < index
+        assert lineage.depths[index] == (0 if parent < 0 else lineage.depths[parent] + 1)
+    assert lineage.max_depth <= 3
+
+
+def test_derived_fraction_is_respected():
+    random.seed(1)
+    for fraction in [0, 1 / 6, 0.5]:
+        lineage = Lineage.generate(10000, LineageShape(fraction, CountDistribution('fixed', 2),
+                                                       CountDistribution('fixed', 2)))
+        assert abs(lineage.derived / len(lineage) - fraction) < 0.01
+    lineage = Lineage.generate(100, LineageShape(0))
+    assert lineage.derived == 0
+    assert lineage.depth_counts() == {0: 100}
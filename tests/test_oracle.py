@@ -0,0 +1,119 @@
+from rdflib import Graph, Literal, Namespace, RDF, URIRef
+
+from metadata_scripts.oracle import CardinalityOracle
+
+CURIE = Namespace('https://institut-curie.org/ontology#')
+DATA = Namespace('http://example.com/data#')
+ROOT = 'http://localhost:8080/api/webdav/collection 1'
+
+MALE = 'Male'
+FEMALE = 'Female'
+LABELS = {str(DATA.male): MALE, str(DATA.female): FEMALE, str(DATA.rna): 'RNA', str(DATA.dna): 'DNA'}
+
+
+def build_oracle() -> CardinalityOracle:
+    """ Two subjects with a sample each, a third sample without subject, and files of the first two samples
+    in a directory and in the collection root.
+    """
+    oracle = CardinalityOracle()
+    oracle.add_location(ROOT, 'Collection')
+    oracle.add_location(f'{ROOT}/dir1', 'Directory')
+    oracle.add_location(f'{ROOT}/dir1/a.txt', 'File')
+    oracle.add_location(f'{ROOT}/dir10', 'Directory')
+    oracle.add_location(f'{ROOT}/dir10/b.txt', 'File')
+    graph = Graph()
+    for subject, gender in [(DATA.subject1, DATA.male), (DATA.subject2, DATA.female)]:
+        graph.add((subject, RDF.type, CURIE.Subject))
+        graph.add((subject, CURIE.isOfGender, gender))
+    for sample, nature, cellularity, subject in [(DATA.sample1, DATA.rna, 30, DATA.subject1),
+                                                 (DATA.sample2, DATA.dna, 60, DATA.subject2),
+                                                 (DATA.sample3, DATA.rna, 90, None)]:
+        graph.add((sample, RDF.type, CURIE.BiologicalSample))
+        graph.add((sample, CURIE.isOfNature, nature))
+        graph.add((sample, CURIE.tumorCellularity, Literal(cellularity)))
+        if subject is not None:
+            graph.add((sample, CURIE.subject, subject))
+    graph.add((URIRef(f'{ROOT}/dir1/a.txt'), CURIE.sample, DATA.sample1))
+    graph.add((URIRef(f'{ROOT}/dir10/b.txt'), CURIE.sample, DATA.sample2))
+    oracle.add_graph(graph, LABELS)
+    return oracle
+
+
+def values(field: str, *labels: str):
+    return {'field': field, 'values': list(labels)}
+
+
+def test_counts_rows_per_view():
+    oracle = build_oracle()
+    assert oracle.count('Subject') == 2
+    assert oracle.count('Sample') == 3
+    assert oracle.count('Collection') == 5
+
+
+def test_filters_on_labels_and_ranges():
+    oracle = build_oracle()
+    assert oracle.count('Sample', [values('Sample.nature', 'RNA')]) == 2
+    assert oracle.count('Sample', [values('Sample.nature', 'RNA', 'DNA')]) == 3
+    assert oracle.count('Sample', [{'field': 'Sample.tumorCellularity', 'min': 30, 'max': 60}]) == 2
+    assert oracle.count('Sample', [{'field': 'Sample.tumorCellularity', 'min': 61}]) == 1
+    assert oracle.count('Sample', [values('Sample.nature', 'RNA'),
+                                   {'field': 'Sample.tumorCellularity', 'max': 50}]) == 1
+
+
+def test_joins_direct_links():
+    oracle = build_oracle()
+    # The samples link to their subject
+    assert oracle.count('Sample', [values('Subject.gender', MALE)]) == 1
+    assert oracle.count('Sample', [values('Subject.gender', MALE, FEMALE)]) == 2
+    # The files link to their sample
+    assert oracle.count('Collection', [values('Sample.nature', 'DNA')]) == 1
+
+
+def test_joins_reverse_links():
+    oracle = build_oracle()
+    assert oracle.count('Subject', [values('Sample.nature', 'RNA')]) == 1
+    assert oracle.count('Subject', [{'field': 'Sample.tumorCellularity', 'min': 50}]) == 1
+    assert oracle.count('Sample', [values('Collection.type', 'File')]) == 2
+
+
+def test_filters_on_one_view_match_the_same_linked_entity():
+    oracle = build_oracle()
+    assert oracle.count('Subject', [values('Sample.nature', 'RNA'),
+                                    {'field': 'Sample.tumorCellularity', 'min': 50}]) == 0
+
+
+def test_deleted_entities_are_not_counted_or_joined():
+    oracle = build_oracle()
+    oracle.mark_deleted(str(DATA.sample1))
+    assert oracle.count('Sample') == 2
+    assert oracle.count('Subject', [values('Sample.nature', 'RNA')]) == 0
+    assert oracle.count('Collection', [values('Sample.nature', 'RNA')]) == 0
+    # Marking an unknown entity as deleted is ignored
+    oracle.mark_deleted(str(DATA.unknown))
+    assert oracle.count('Sample') == 2
+
+
+def test_deleting_a_directory_deletes_its_contents():
+    oracle = build_oracle()
+    oracle.mark_deleted(f'{ROOT}/dir1')
+    assert oracle.count('Collection') == 3
+    assert oracle.count('Collection', [values('Collection.type', 'File')]) == 1
+    # A sibling directory with the same prefix is not deleted
+    assert not oracle.entities[f'{ROOT}/dir10/b.txt'].deleted
+    assert oracle.count('Sample', [values('Collection.type', 'File')]) == 1
+
+
+def test_deleting_a_file_does_not_delete_other_files():
+    oracle = build_oracle()
+    oracle.mark_deleted(f'{ROOT}/dir1/a.txt')
+    assert oracle.count('Collection') == 4
+    assert oracle.count('Collection', [values('Collection.type', 'Directory')]) == 2
+
+
+def test_round_trip_keeps_counts():
+    oracle = build_oracle()
+    oracle.mark_deleted(str(DATA.sample2))
+    restored = CardinalityOracle.from_dict(oracle.to_dict())
+    for view, filters in [('Sample', []), ('Subject', [values('Sample.nature', 'DNA')]),
+                          ('Collection', [values('Sample.nature', 'RNA')])]:
+        assert restored.count(view, filters) == oracle.count(view, filters)
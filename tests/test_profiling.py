@@ -0,0 +1,32 @@
+from metadata_scripts.profiling import PhaseProfiler
+
+ALLOCATED = 10 * 1024 * 1024
+
+
+def allocate():
+    data = [bytearray(1024) for _ in range(ALLOCATED // 1024)]
+    del data
+
+
+def test_keeps_the_peak_of_a_phase_before_its_batches():
+    profiler = PhaseProfiler(enabled=True)
+    with profiler.phase('upload'):
+        allocate()
+        with profiler.batch('directory'):
+            pass
+    phase = profiler.phases[0]
+    assert phase.peak_memory >= ALLOCATED
+    assert phase.batches[0].peak_memory < ALLOCATED
+
+
+def test_includes_the_peaks_of_batches_in_the_phase():
+    profiler = PhaseProfiler(enabled=True)
+    with profiler.phase('upload'):
+        with profiler.batch('directory'):
+            allocate()
+        with profiler.batch('directory'):
+            pass
+    phase = profiler.phases[0]
+    assert phase.batches[0].peak_memory >= ALLOCATED
+    assert phase.batches[1].peak_memory < ALLOCATED
+    assert phase.peak_memory >= ALLOCATED
@@ -0,0 +1,42 @@
+from metadata_scripts.sql_benchmark import parse_queries, read_queries
+
+SCRATCHPAD = """
+-- name: count_samples
+explain analyse
+select count(*)
+from sample;
+-- 1,000 rows
+-- 12 ms
+
+vacuum analyse sample;
+-- not a query
+
+with recent as (select * from sample)
+select * from recent
+-- a comment inside the statement
+where nature = 'RNA';
+"""
+
+
+def test_parses_named_and_unnamed_statements():
+    queries = parse_queries(SCRATCHPAD)
+    assert [query.name for query in queries] == ['count_samples', 'query_03']
+
+
+def test_removes_explain_and_keeps_notes():
+    query = parse_queries(SCRATCHPAD)[0]
+    assert query.sql == 'select count(*)\nfrom sample'
+    assert query.notes == ['1,000 rows', '12 ms']
+
+
+def test_skips_statements_that_are_not_queries():
+    queries = parse_queries(SCRATCHPAD)
+    assert all('vacuum' not in query.sql for query in queries)
+    assert queries[1].notes == []
+    assert queries[1].sql == "with recent as (select * from sample)\nselect * from recent\nwhere nature = 'RNA'"
+
+
+def test_reads_the_packaged_queries():
+    names = [query.name for query in read_queries()]
+    assert 'count_collection' in names
+    assert len(names) == len(set(names))
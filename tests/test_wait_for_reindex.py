@@ -0,0 +1,83 @@
+import pytest
+
+import fairspace_api.api
+from fairspace_api.api import FairspaceApi
+
+VIEWS = ['Sample', 'Subject']
+BASELINE = {'Sample': 100, 'Subject': 0}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class PollingApi(FairspaceApi):
+    """ Returns the given view counts per poll, and the last ones once they run out, without maintenance status.
+    """
+    def __init__(self, counts):
+        self.counts = list(counts)
+        self.polls = 0
+
+    def maintenance_status(self):
+        return None
+
+    def try_counts(self, views):
+        self.polls += 1
+        return self.counts.pop(0) if len(self.counts) > 1 else self.counts[0]
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(fairspace_api.api, 'time', clock)
+    return clock
+
+
+def wait(api: PollingApi, clock: FakeClock, baseline=BASELINE, **options):
+    return api.wait_for_reindex(clock.now, VIEWS, baseline, poll_interval=5, stable_polls=3, **options)
+
+
+def test_unchanged_counts_are_accepted_after_the_grace_period(clock):
+    api = PollingApi([BASELINE])
+    result = wait(api, clock, grace_period=60, timeout=3600)
+    assert result.converged
+    assert result.counts == BASELINE
+    # The counts were final at the first poll, but only accepted after the grace period
+    assert result.duration == 5
+    assert 60 <= clock.now - 1000 < 70
+
+
+def test_changed_counts_are_accepted_when_stable(clock):
+    api = PollingApi([BASELINE, None, {'Sample': 40, 'Subject': 0}, {'Sample': 120, 'Subject': 0}])
+    result = wait(api, clock)
+    assert result.converged
+    assert result.counts == {'Sample': 120, 'Subject': 0}
+    assert result.duration == 20
+    assert api.polls == 6
+
+
+def test_empty_views_do_not_block(clock):
+    api = PollingApi([{'Sample': 0, 'Subject': 0}, {'Sample': 120, 'Subject': 0}])
+    result = wait(api, clock)
+    assert result.converged
+    assert result.counts['Subject'] == 0
+
+
+def test_views_that_were_non_zero_have_to_be_non_zero_again(clock):
+    api = PollingApi([{'Sample': 0, 'Subject': 0}])
+    result = wait(api, clock, timeout=300)
+    assert not result.converged
+
+
+def test_without_baseline_the_counts_only_have_to_be_stable(clock):
+    api = PollingApi([{'Sample': 5, 'Subject': 0}])
+    result = wait(api, clock, baseline=None)
+    assert result.converged
+    assert api.polls == 3